@@ -0,0 +1,259 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import pandas as pd
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Make sure src imports work
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.context_builder import build_context
+from src.embedding_utils import create_or_load_chroma, retrieve_similar_with_vectors
+from src.gemini_utils import FakeGeminiModel, get_gemini_model
+
+OUTPUT_DIR = "outputs/batch_insights"
+
+# ============================================================
+# 1. Scheduling primitives
+# ============================================================
+
+class TokenBucket:
+    """
+    Async token bucket: allows `rate` requests per second on average with bursts up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+RETRYABLE_STATUS_CODES = {429, 500, 503, 504}
+
+
+def is_retryable(error):
+    """
+    Rate-limit / transient server errors worth retrying: google.api_core's ResourceExhausted (429),
+    InternalServerError (500), ServiceUnavailable (503) and DeadlineExceeded (504), timeouts, and
+    any other error carrying one of those HTTP status codes. Matched on type and status code,
+    never on message text (which for other errors can mention "rate", "resource", ...).
+    """
+    if isinstance(error, TimeoutError):
+        return True
+    try:
+        from google.api_core import exceptions as api_errors
+    except ImportError:
+        api_errors = None
+    if api_errors is not None and isinstance(error, (
+        api_errors.ResourceExhausted,
+        api_errors.InternalServerError,
+        api_errors.ServiceUnavailable,
+        api_errors.DeadlineExceeded,
+    )):
+        return True
+    status = getattr(error, "code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return isinstance(status, int) and status in RETRYABLE_STATUS_CODES
+
+
+async def with_retries(fn, bucket=None, retries=5, base_delay=1.0, max_delay=30.0):
+    """
+    Runs `fn` in a worker thread, retrying retryable errors with exponential backoff + jitter.
+    Every attempt (including retries) takes a token from `bucket` first. Returns (result, attempts).
+    """
+    for attempt in range(1, retries + 2):
+        if bucket is not None:
+            await bucket.acquire()
+        try:
+            return await asyncio.to_thread(fn), attempt
+        except Exception as e:
+            if attempt > retries or not is_retryable(e):
+                raise
+            delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+            await asyncio.sleep(delay * (0.5 + random.random() / 2))
+
+# ============================================================
+# 2. Runner
+# ============================================================
+
+def question_key(question, property_name=""):
+    return hashlib.sha1(f"{property_name}\x00{question}".encode("utf-8")).hexdigest()[:16]
+
+
+def load_questions(path):
+    """
+    Reads questions from a .txt file (one per line) or a CSV with a `question`
+    column and an optional `property` column.
+    """
+    if path.lower().endswith(".csv"):
+        df = pd.read_csv(path)
+        if "question" not in df.columns:
+            raise ValueError("Questions CSV needs a 'question' column.")
+        props = df["property"].fillna("").astype(str) if "property" in df.columns else [""] * len(df)
+        return [{"question": q, "property": p} for q, p in zip(df["question"].astype(str), props)]
+    with open(path, encoding="utf-8") as f:
+        return [{"question": line.strip(), "property": ""} for line in f if line.strip()]
+
+
+def completed_keys(results_path):
+    """
+    Keys already answered successfully in a previous (possibly interrupted) run.
+    """
+    if not os.path.exists(results_path):
+        return set()
+    done = set()
+    with open(results_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # partially written last line
+            if record.get("status") == "ok":
+                done.add(record["key"])
+    return done
+
+
+async def run_batch(questions, collection, model, results_path, concurrency=4, rate=1.0,
+                    burst=None, retries=5, base_delay=1.0, n_results=10):
+    """
+    Answers every question not already in `results_path`, appending one JSON line per
+    question as it finishes. Questions with a `property` only retrieve that property's
+    reviews. Returns a summary dict.
+    """
+    done = completed_keys(results_path)
+    pending = [q for q in questions if question_key(q["question"], q["property"]) not in done]
+    print(f"🗂️ {len(questions)} questions, {len(questions) - len(pending)} already done, {len(pending)} to run")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = TokenBucket(rate, burst)
+    write_lock = asyncio.Lock()
+    summary = {"ok": 0, "failed": 0, "retries": 0, "prompt_tokens": 0, "prompt_tokens_saved": 0}
+    started = time.perf_counter()
+
+    os.makedirs(os.path.dirname(results_path) or ".", exist_ok=True)
+    out = open(results_path, "a", encoding="utf-8")
+
+    async def answer(item):
+        key = question_key(item["question"], item["property"])
+        record = {"key": key, "question": item["question"], "property": item["property"]}
+        async with semaphore:
+            t0 = time.perf_counter()
+            try:
+                docs, doc_vectors, query_vector = await asyncio.to_thread(
+                    retrieve_similar_with_vectors, collection, item["question"], n_results,
+                    property_name=item["property"] or None,
+                )
+                context = build_context(item["question"], docs, doc_vectors, query_vector)
+                response, attempts = await with_retries(
+                    lambda: model.generate_content(context["prompt"]), bucket, retries=retries, base_delay=base_delay
+                )
+                record.update(
+                    status="ok",
+                    response=(getattr(response, "text", "") or "").strip(),
+                    n_docs=len(context["docs"]),
+                    prompt_tokens=context["prompt_tokens"],
+                    prompt_tokens_saved=context["tokens_saved"],
+                    attempts=attempts,
+                )
+                summary["ok"] += 1
+                summary["retries"] += attempts - 1
+                summary["prompt_tokens"] += context["prompt_tokens"]
+                summary["prompt_tokens_saved"] += context["tokens_saved"]
+            except Exception as e:
+                record.update(status="failed", error=str(e))
+                summary["failed"] += 1
+            record["latency_s"] = round(time.perf_counter() - t0, 3)
+            record["finished_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        async with write_lock:
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            finished = summary["ok"] + summary["failed"]
+            print(f"   ↳ {finished}/{len(pending)} {record['status']}: {item['question'][:60]}")
+
+    try:
+        await asyncio.gather(*(answer(q) for q in pending))
+    finally:
+        out.close()
+
+    summary["elapsed_s"] = round(time.perf_counter() - started, 2)
+    summary["questions_per_min"] = round(60 * len(pending) / summary["elapsed_s"], 1) if summary["elapsed_s"] else 0.0
+    return summary
+
+
+def export_csv(results_path):
+    """
+    Writes the latest successful answer per question next to the JSONL results.
+    """
+    records = pd.read_json(results_path, lines=True)
+    latest = records[records["status"] == "ok"].drop_duplicates("key", keep="last")
+    csv_path = os.path.splitext(results_path)[0] + ".csv"
+    latest.to_csv(csv_path, index=False)
+    return csv_path
+
+# ============================================================
+# 3. CLI
+# ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Run canned insight questions through retrieval + Gemini concurrently.")
+    parser.add_argument("questions", help="Questions file (.txt one per line, or .csv with question[,property]).")
+    parser.add_argument("--run-name", default=None, help="Results file name; reuse it to resume an interrupted run.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Max questions in flight.")
+    parser.add_argument("--rate", type=float, default=1.0, help="Gemini requests per second (token bucket rate).")
+    parser.add_argument("--burst", type=int, default=None, help="Token bucket capacity (defaults to the rate).")
+    parser.add_argument("--retries", type=int, default=5, help="Retries per question on rate-limit/transient errors.")
+    parser.add_argument("--fake-model", action="store_true", help="Use the local FakeGeminiModel stub instead of the API.")
+    parser.add_argument("--fake-delay", type=float, default=0.2, help="Seconds per fake generation call.")
+    parser.add_argument("--fake-error-rate", type=float, default=0.0, help="Fraction of fake calls that raise a 429.")
+    args = parser.parse_args()
+
+    if args.fake_model:
+        model = FakeGeminiModel(delay=args.fake_delay, error_rate=args.fake_error_rate)
+        base_delay = 0.05
+    else:
+        load_dotenv()
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            raise EnvironmentError("❌ GOOGLE_API_KEY not found in .env file")
+        model = get_gemini_model(api_key)
+        base_delay = 1.0
+
+    run_name = args.run_name or f"insights_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    results_path = os.path.join(OUTPUT_DIR, f"{run_name}.jsonl")
+
+    questions = load_questions(args.questions)
+    collection = create_or_load_chroma()
+    summary = asyncio.run(run_batch(
+        questions, collection, model, results_path,
+        concurrency=args.concurrency, rate=args.rate, burst=args.burst,
+        retries=args.retries, base_delay=base_delay,
+    ))
+
+    print("\n📋 Batch Summary:")
+    for k, v in summary.items():
+        print(f"   {k}: {v}")
+    if os.path.exists(results_path):
+        print(f"\n✅ Saved results to {results_path} and {export_csv(results_path)}")
+
+
+if __name__ == "__main__":
+    main()
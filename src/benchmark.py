@@ -0,0 +1,275 @@
+import os
+import sys
+import ast
+import json
+import time
+import shutil
+import platform
+import argparse
+import subprocess
+import tempfile
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+# Make sure src imports work
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+
+BENCH_DIR = "outputs/bench"
+DATA_DIR = "data/bench"
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+BATCH_SIZE = 32
+
+# ============================================================
+# 1. Measurement helpers
+# ============================================================
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB (None where it can't be measured).
+    """
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+            return round(psutil.Process().memory_info().peak_wset / 1e6, 1)
+        except Exception:
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1e6 if sys.platform == "darwin" else 1e3), 1)
+
+
+def percentiles(timings_ms):
+    t = np.asarray(timings_ms)
+    return {
+        "p50_ms": round(float(np.percentile(t, 50)), 3),
+        "p95_ms": round(float(np.percentile(t, 95)), 3),
+        "p99_ms": round(float(np.percentile(t, 99)), 3),
+        "mean_ms": round(float(t.mean()), 3),
+    }
+
+
+def bench_queries(n):
+    """
+    `n` distinct, deterministic queries (distinct so the embedder's LRU cache doesn't flatter them).
+    """
+    from src.synthetic_reviews import ASPECTS
+    phrases = [s for good, bad in ASPECTS.values() for s in good + bad]
+    qualifiers = ["complaints about", "praise for", "issues with", "feedback on", "comments on",
+                  "guests mention", "recent reviews of", "problems with"]
+    queries = [f"{q} {p.lower().rstrip('.!')}" for q in qualifiers for p in phrases]
+    while len(queries) < n:
+        queries += [f"{q} #{len(queries)}" for q in queries[: n - len(queries)]]
+    return queries[:n]
+
+# ============================================================
+# 2. Cases (each runs in its own subprocess so peak RSS is per case)
+# ============================================================
+
+def case_pipeline(csv_path, rows, n_queries, workdir):
+    """
+    Ingest `csv_path` with load_and_embed_csv into a fresh collection, then time
+    single and batched retrieve_similar on both retrieval backends.
+    """
+    from src.embedding_utils import (EmbeddingCache, create_or_load_chroma, get_embedder, load_and_embed_csv,
+                                     retrieve_similar, retrieve_similar_batch)
+    from src.vector_index import NumpyIndex
+
+    collection = create_or_load_chroma(path=os.path.join(workdir, "chroma"), name=f"bench_{rows}")
+    cache_dir = os.path.join(workdir, "cache")
+    t0 = time.perf_counter()
+    df, _ = load_and_embed_csv(csv_path, collection, cache_dir=cache_dir)
+    ingest_s = time.perf_counter() - t0
+    encoded = len(EmbeddingCache(cache_dir=cache_dir))  # fresh cache: everything in it was encoded by this ingest
+    results = [{
+        "case": "ingest", "rows": rows, "seconds": round(ingest_s, 3),
+        "rows_per_s": round(len(df) / ingest_s, 1), "encoded_rows": encoded,
+        "encoded_per_s": round(encoded / ingest_s, 1), "peak_rss_mb": peak_rss_mb(),
+    }]
+    del df
+
+    queries = bench_queries(n_queries)
+    index = NumpyIndex.build_from_collection(collection, os.path.join(workdir, "index"))
+    backends = {
+        "chroma": lambda q: retrieve_similar(collection, q, backend="chroma"),
+        "numpy": lambda q: index.query(query_texts=[q], n_results=10)["documents"][0],
+    }
+    for name, single in backends.items():
+        get_embedder().clear()  # each backend embeds the queries from a cold LRU, not the previous backend's
+        timings = []
+        for q in queries:
+            t = time.perf_counter()
+            single(q)
+            timings.append((time.perf_counter() - t) * 1000)
+        results.append({"case": f"retrieve_single_{name}", "rows": rows, **percentiles(timings)})
+
+    # Batched queries repeat the single-query texts; start from a cold LRU so they are embedded again
+    get_embedder().clear()
+    timings = []
+    for start in range(0, len(queries), BATCH_SIZE):
+        t = time.perf_counter()
+        retrieve_similar_batch(collection, queries[start:start + BATCH_SIZE], backend="chroma")
+        timings.append((time.perf_counter() - t) * 1000)
+    results.append({
+        "case": "retrieve_batch_chroma", "rows": rows, "batch_size": BATCH_SIZE,
+        **percentiles(timings), "per_query_ms": round(float(np.mean(timings)) / BATCH_SIZE, 3),
+    })
+    for r in results:
+        r.setdefault("peak_rss_mb", peak_rss_mb())
+    return results
+
+
+def app_import_statements(app_path=os.path.join(ROOT, "ui", "rag_app.py")):
+    """
+    The top-level import statements of the Streamlit app, so their cost can be timed
+    without running the app itself.
+    """
+    with open(app_path, encoding="utf-8") as f:
+        source = f.read()
+    return [ast.get_source_segment(source, node)
+            for node in ast.parse(source).body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def case_cold_start(repeats=3):
+    """
+    Wall time for a fresh interpreter to run ui/rag_app.py's imports (median of `repeats`).
+    """
+    code = "import sys, time; sys.path.insert(0, %r); t = time.perf_counter()\n" % ROOT
+    code += "\n".join(app_import_statements())
+    code += "\nprint(time.perf_counter() - t)"
+    timings = []
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=ROOT)
+        if out.returncode != 0:
+            return [{"case": "cold_start_app_imports", "error": out.stderr.strip().splitlines()[-1]}]
+        timings.append(float(out.stdout.strip().splitlines()[-1]))
+    return [{"case": "cold_start_app_imports", "seconds": round(float(np.median(timings)), 3),
+             "min_s": round(min(timings), 3), "max_s": round(max(timings), 3)}]
+
+
+def run_case_subprocess(args, cwd=None):
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), *args], capture_output=True, text=True,
+                         cwd=cwd or os.getcwd())
+    if out.returncode != 0:
+        raise RuntimeError(f"Benchmark case {args} failed:\n{out.stderr[-2000:]}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+# ============================================================
+# 3. Run-over-run comparison
+# ============================================================
+
+METRICS = ["seconds", "rows_per_s", "encoded_per_s", "p50_ms", "p95_ms", "p99_ms", "per_query_ms", "peak_rss_mb"]
+
+
+def compare_runs(previous, current):
+    """
+    Per-metric deltas between two runs, matched on (case, rows).
+    """
+    def keyed(run):
+        return {(r["case"], r.get("rows")): r for r in run["results"]}
+    before, after = keyed(previous), keyed(current)
+    rows = []
+    for key, new in after.items():
+        old = before.get(key)
+        if not old:
+            continue
+        for metric in METRICS:
+            if metric in new and metric in old and old[metric]:
+                rows.append({
+                    "case": key[0], "rows": key[1], "metric": metric,
+                    "previous": old[metric], "current": new[metric],
+                    "change_pct": round(100 * (new[metric] - old[metric]) / old[metric], 1),
+                })
+    return pd.DataFrame(rows)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=ROOT).stdout.strip()
+    except OSError:
+        return None
+
+# ============================================================
+# 4. CLI
+# ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproducible performance benchmarks for the RAG pipeline.")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma-separated review counts to benchmark (default 10000,100000,1000000).")
+    parser.add_argument("--queries", type=int, default=200, help="Distinct queries per retrieval benchmark.")
+    parser.add_argument("--seed", type=int, default=42, help="Synthetic data seed.")
+    parser.add_argument("--skip-cold-start", action="store_true")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--csv", help=argparse.SUPPRESS)
+    parser.add_argument("--rows", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # --- child process: run one case and print its JSON ---
+    if args.case == "pipeline":
+        print(json.dumps(case_pipeline(args.csv, args.rows, args.queries, args.workdir)))
+        return
+
+    from src.synthetic_reviews import GENERATOR_VERSION, write_reviews_csv
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results = []
+    for rows in sizes:
+        csv_path = os.path.join(DATA_DIR, f"synthetic_reviews_{rows}_seed{args.seed}_v{GENERATOR_VERSION}.csv")
+        if not os.path.exists(csv_path):
+            print(f"🧪 Generating {rows:,} synthetic reviews → {csv_path}")
+            write_reviews_csv(csv_path, rows, seed=args.seed)
+        workdir = tempfile.mkdtemp(prefix=f"bench_{rows}_")
+        try:
+            print(f"⏱️ Benchmarking ingest + retrieval at {rows:,} rows...")
+            # The case runs inside the workdir, so the state the pipeline keeps under data/
+            # (collection versions, trend store, sentiment cache, ...) never touches the real one
+            results += run_case_subprocess([
+                "--case", "pipeline", "--csv", os.path.abspath(csv_path), "--rows", str(rows),
+                "--queries", str(args.queries), "--workdir", workdir,
+            ], cwd=workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if not args.skip_cold_start:
+        print("⏱️ Measuring cold start of ui/rag_app.py imports...")
+        results += case_cold_start()
+
+    run = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "queries": args.queries,
+        "results": results,
+    }
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    latest_path = os.path.join(BENCH_DIR, "latest.json")
+    previous = None
+    if os.path.exists(latest_path):
+        with open(latest_path, encoding="utf-8") as f:
+            previous = json.load(f)
+    for path in (os.path.join(BENCH_DIR, f"run_{stamp}.json"), latest_path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+    pd.DataFrame(results).to_csv(os.path.join(BENCH_DIR, f"run_{stamp}.csv"), index=False)
+
+    print("\n📊 Results:\n")
+    print(pd.DataFrame(results).to_string(index=False))
+    if previous:
+        comparison = compare_runs(previous, run)
+        comparison.to_csv(os.path.join(BENCH_DIR, f"comparison_{stamp}.csv"), index=False)
+        print(f"\n🔁 Compared with previous run ({previous['timestamp']}, {previous.get('git_commit')}):\n")
+        print(comparison.to_string(index=False) if not comparison.empty else "   (no overlapping cases)")
+    print(f"\n✅ Saved results to {BENCH_DIR}/run_{stamp}.json")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import os
 import sys
+import argparse
 import pandas as pd
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
@@ -7,7 +8,50 @@ from datetime import datetime
 
 # Make sure src imports work
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from src.embedding_utils import create_or_load_chroma, load_and_embed_csv, retrieve_similar
+from src.embedding_utils import EmbeddingCache, create_or_load_chroma, get_embedder, load_and_embed_csv, retrieve_similar
+from src.vector_stats import (
+    DUPLICATE_THRESHOLD,
+    SAMPLE_SIZE,
+    STATS_CHUNK_ROWS,
+    iter_cache_vectors,
+    iter_collection_vectors,
+    vector_health_stats,
+)
+
+parser = argparse.ArgumentParser(description="Embedding health statistics for the review collection.")
+parser.add_argument("--stored", choices=["collection", "cache"],
+                    help="Scan the vectors already stored in the Chroma collection or embedding cache "
+                         "(no ingest, no model load) instead of the sampled re-embedding report.")
+parser.add_argument("--sample", type=int, default=SAMPLE_SIZE, help="Vectors sampled for pairwise similarity.")
+parser.add_argument("--chunk-rows", type=int, default=STATS_CHUNK_ROWS, help="Vectors read per chunk.")
+parser.add_argument("--dup-threshold", type=float, default=DUPLICATE_THRESHOLD,
+                    help="Cosine similarity at or above which two vectors count as near-duplicates.")
+args = parser.parse_args()
+
+# ------------------------------------------------------------
+# 0. Stored-vector mode: stream what's already on disk, then exit
+# ------------------------------------------------------------
+if args.stored:
+    if args.stored == "collection":
+        collection = create_or_load_chroma()
+        chunks = iter_collection_vectors(collection, args.chunk_rows)
+    else:
+        chunks = iter_cache_vectors(EmbeddingCache(), args.chunk_rows)
+    print(f"🔎 Scanning stored vectors from the {args.stored} in chunks of {args.chunk_rows:,}...")
+    health, norm_histogram = vector_health_stats(chunks, args.sample, args.dup_threshold)
+    health = {"timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "source": args.stored, **health}
+
+    print("\n📋 Stored-vector health report:")
+    for k, v in health.items():
+        print(f"   {k}: {v}")
+
+    os.makedirs("outputs", exist_ok=True)
+    pd.DataFrame([health]).to_csv("outputs/chroma_health_stats.csv", index=False)
+    pd.DataFrame(norm_histogram).query("count > 0").to_csv("outputs/chroma_norm_histogram.csv", index=False)
+    print("\n✅ Saved:")
+    print("   - outputs/chroma_health_stats.csv")
+    print("   - outputs/chroma_norm_histogram.csv")
+    sys.exit(0)
 
 # ------------------------------------------------------------
 # 1. Load the ChromaDB collection and dataset
@@ -36,18 +80,8 @@ sample_texts = df[text_col].sample(min(10, len(df))).tolist()
 # ------------------------------------------------------------
 # 4. Compute embedding health statistics
 # ------------------------------------------------------------
-from chromadb.utils import embedding_functions
-embedder = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
-
-def flatten(vec):
-    arr = np.array(vec)
-    if arr.ndim == 3:
-        arr = arr.squeeze(0)
-    if arr.ndim == 1:
-        arr = arr.reshape(1, -1)
-    return arr
-
-sample_vecs = np.vstack([flatten(embedder(t)) for t in sample_texts])
+embedder = get_embedder()
+sample_vecs = embedder.embed(sample_texts)
 pairwise_sims = cosine_similarity(sample_vecs)
 
 avg_sim = np.mean(pairwise_sims[np.triu_indices_from(pairwise_sims, k=1)])
@@ -86,6 +120,7 @@ report = {
     "avg_similarity": round(avg_sim, 3),
     "std_similarity": round(std_sim, 3),
     "avg_recall": round(recall_df["recall_score"].mean(), 3),
+    "embedder_cache_hit_rate": embedder.stats()["hit_rate"],
 }
 
 print("\n📋 Summary Report:")
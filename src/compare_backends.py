@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+# Make sure src imports work
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.embedding_utils import create_or_load_chroma, get_embedder, load_and_embed_csv, retrieve_similar_batch
+from src.vector_index import get_numpy_index
+
+# ------------------------------------------------------------
+# 1. Setup
+# ------------------------------------------------------------
+csv_path = "data/customer_reviews.csv"
+collection = create_or_load_chroma()
+load_and_embed_csv(csv_path, collection)
+index = get_numpy_index(collection)
+print(f"✅ Chroma: {collection.count()} docs | NumPy index: {index.count()} docs")
+
+queries = [
+    "room cleanliness",
+    "customer service",
+    "breakfast quality",
+    "check-in experience",
+    "location satisfaction",
+    "noisy air conditioning",
+    "friendly staff",
+    "pool area",
+]
+k = 10
+repeats = 50
+
+# Pre-embed queries so both backends are timed on search alone
+query_vecs = get_embedder().embed(queries)
+
+# ------------------------------------------------------------
+# 2. Time single-query and batched search
+# ------------------------------------------------------------
+def time_calls(fn, n):
+    timings = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return np.array(timings)
+
+rows = []
+for name, backend in [("chroma", collection), ("numpy", index)]:
+    single = np.concatenate([
+        time_calls(lambda v=v: backend.query(query_embeddings=[v.tolist()], n_results=k), repeats)
+        for v in query_vecs
+    ])
+    batch = time_calls(lambda: backend.query(query_embeddings=query_vecs.tolist(), n_results=k), repeats)
+    for mode, t in [("single", single), ("batch", batch)]:
+        rows.append({
+            "backend": name,
+            "mode": mode,
+            "queries_per_call": 1 if mode == "single" else len(queries),
+            "p50_ms": round(float(np.percentile(t, 50)), 3),
+            "p95_ms": round(float(np.percentile(t, 95)), 3),
+            "mean_ms": round(float(t.mean()), 3),
+        })
+
+# ------------------------------------------------------------
+# 3. Check both backends return the same neighbours
+# ------------------------------------------------------------
+chroma_docs = retrieve_similar_batch(collection, queries, k, backend="chroma")
+numpy_docs = retrieve_similar_batch(collection, queries, k, backend="numpy")
+overlap = np.mean([len(set(a) & set(b)) / max(1, len(a)) for a, b in zip(chroma_docs, numpy_docs)])
+
+# ------------------------------------------------------------
+# 4. Report + save
+# ------------------------------------------------------------
+results_df = pd.DataFrame(rows)
+print("\n⏱️ Retrieval latency (search only, query vectors precomputed):\n")
+print(results_df)
+print(f"\n🔁 Top-{k} overlap between backends: {overlap:.3f}")
+
+os.makedirs("outputs", exist_ok=True)
+results_df.to_csv("outputs/backend_latency.csv", index=False)
+print("\n✅ Saved metrics to outputs/backend_latency.csv")
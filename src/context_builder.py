@@ -0,0 +1,103 @@
+import os
+
+import numpy as np
+
+from src.gemini_utils import build_insight_prompt
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))  # tokens of review text per prompt
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))  # 1.0 = pure relevance, 0.0 = pure diversity
+DUPLICATE_SIMILARITY = 0.95
+CHARS_PER_TOKEN = 4  # rough Gemini/SentencePiece average for English text
+
+
+def estimate_tokens(text):
+    """
+    Cheap local token estimate (no count_tokens() round trip to the API).
+    """
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _unit(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def mmr_order(query_vector, doc_vectors, lambda_=MMR_LAMBDA, duplicate_similarity=DUPLICATE_SIMILARITY):
+    """
+    Maximal marginal relevance over the retrieved reviews. Returns (order, duplicates):
+    review positions in MMR order, and the positions dropped because they are at least
+    `duplicate_similarity` cosine-similar to a review already picked.
+    Relevance and the doc x doc similarity matrix are computed once; each pick is one
+    vectorised update of every candidate's max similarity to the selection.
+    """
+    docs = _unit(doc_vectors)
+    relevance = docs @ _unit(query_vector)[0]
+    similarity = docs @ docs.T
+    redundancy = np.zeros(len(docs), dtype=np.float32)
+    available = np.ones(len(docs), dtype=bool)
+    order, duplicates = [], []
+    while available.any():
+        scores = np.where(available, lambda_ * relevance - (1 - lambda_) * redundancy, -np.inf)
+        i = int(np.argmax(scores))
+        available[i] = False
+        if order and redundancy[i] >= duplicate_similarity:
+            duplicates.append(i)
+            continue
+        order.append(i)
+        redundancy = np.maximum(redundancy, similarity[i])
+    return order, duplicates
+
+
+def pack_to_budget(docs, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Keeps reviews in the given order while they fit in `token_budget` (a review that doesn't
+    fit is skipped so a shorter one further down can still go in). The first review is
+    truncated rather than dropped if it is over budget on its own.
+    Returns (packed docs, skipped count).
+    """
+    packed, used, skipped = [], 0, 0
+    for doc in docs:
+        cost = estimate_tokens(doc) + 1  # +1 for the blank-line separator
+        if used + cost <= token_budget:
+            packed.append(doc)
+            used += cost
+        elif not packed:
+            packed.append(doc[:max(0, token_budget - 1) * CHARS_PER_TOKEN])
+            used = token_budget
+        else:
+            skipped += 1
+    return packed, skipped
+
+
+def build_context(query, docs, doc_vectors=None, query_vector=None, token_budget=CONTEXT_TOKEN_BUDGET,
+                  lambda_=MMR_LAMBDA):
+    """
+    Insight prompt built from the retrieved reviews: MMR-reranked, near-duplicates dropped
+    and packed to `token_budget`. Without stored vectors the reviews and query are embedded
+    with the shared (LRU-cached) embedder.
+    Returns a dict with the prompt, the reviews used and token accounting against the
+    unpacked prompt (the first MAX_CONTEXT_DOCS retrieved reviews, verbatim).
+    """
+    docs = [str(d) for d in docs]
+    baseline_tokens = estimate_tokens(build_insight_prompt(query, docs))
+    duplicates = []
+    if len(docs) > 1:
+        if doc_vectors is None or query_vector is None:
+            from src.embedding_utils import get_embedder
+            vectors = get_embedder().embed([query] + docs)
+            query_vector, doc_vectors = vectors[:1], vectors[1:]
+        order, duplicates = mmr_order(query_vector, doc_vectors, lambda_)
+        docs = [docs[i] for i in order]
+    packed, over_budget = pack_to_budget(docs, token_budget)
+    prompt = build_insight_prompt(query, packed, max_docs=len(packed))
+    prompt_tokens = estimate_tokens(prompt)
+    return {
+        "prompt": prompt,
+        "docs": packed,
+        "prompt_tokens": prompt_tokens,
+        "baseline_tokens": baseline_tokens,
+        "tokens_saved": max(0, baseline_tokens - prompt_tokens),
+        "duplicates_dropped": len(duplicates),
+        "over_budget_dropped": over_budget,
+    }
@@ -0,0 +1,229 @@
+import os
+import re
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0")) or None  # e.g. 0.9; unset/0 disables the stage
+DEDUP_DIR = "data/dedup"
+NUM_PERM = 64
+SHINGLE_SIZE = 5
+_PRIME = np.uint64(4294967291)  # largest prime below 2**32, so signatures fit in uint32
+_SIGNATURE_BATCH = 64
+
+
+def _normalise(text):
+    """
+    Lowercase, punctuation -> space, collapsed whitespace (syndicated copies often differ only here).
+    """
+    return " ".join(re.sub(r"[^\w\s]", " ", str(text).lower()).split())
+
+
+def _optimal_bands(threshold, num_perm):
+    """
+    (bands, rows) for the LSH banding scheme whose S-curve 1 - (1 - s^r)^b best separates
+    Jaccard similarities below/above `threshold` (equal weight on false positives/negatives).
+    """
+    best, best_error = (1, num_perm), np.inf
+    below = np.linspace(0.0, threshold, 200)
+    above = np.linspace(threshold, 1.0, 200)
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        false_pos = np.mean(1 - (1 - below ** rows) ** bands) * threshold
+        false_neg = np.mean((1 - above ** rows) ** bands) * (1 - threshold)
+        if false_pos + false_neg < best_error:
+            best, best_error = (bands, rows), false_pos + false_neg
+    return best
+
+
+class NearDuplicateIndex:
+    """
+    MinHash signatures over character shingles + an LSH band index.
+    Texts are added in order; a text whose estimated Jaccard similarity to an earlier
+    (canonical) text is >= `threshold` is linked to it instead of being indexed itself.
+    """
+
+    def __init__(self, threshold=0.9, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE, seed=1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_PRIME), num_perm, dtype=np.uint64)[:, None]
+        self._b = rng.integers(0, int(_PRIME), num_perm, dtype=np.uint64)[:, None]
+        self.bands, self.rows = _optimal_bands(threshold, num_perm)
+        self._buckets = [{} for _ in range(self.bands)]
+        self._signatures = []
+        self._ids = []
+        self._indexed = set()
+
+    def signatures(self, texts):
+        """
+        (len(texts), num_perm) uint32 MinHash signatures, computed a batch of texts at a time:
+        every k-byte window is hashed with a vectorised polynomial hash, permuted with
+        (a*x + b) mod p, and min-reduced per text.
+        """
+        k = self.shingle_size
+        out = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        for start in range(0, len(texts), _SIGNATURE_BATCH):
+            encoded = [_normalise(t).encode("utf-8").ljust(k) for t in texts[start:start + _SIGNATURE_BATCH]]
+            windows = np.array([len(e) - k + 1 for e in encoded])
+            text_starts = np.cumsum([0] + [len(e) for e in encoded[:-1]])
+            window_starts = np.cumsum(np.concatenate([[0], windows[:-1]]))
+            buf = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+            positions = np.arange(windows.sum()) + np.repeat(text_starts - window_starts, windows)
+            shingles = np.zeros(len(positions), dtype=np.uint64)
+            for j in range(k):
+                shingles = shingles * np.uint64(257) + buf[positions + j]
+            shingles &= np.uint64(0xFFFFFFFF)
+            permuted = (self._a * shingles[None, :] + self._b) % _PRIME
+            out[start:start + len(encoded)] = np.minimum.reduceat(permuted, window_starts, axis=1).T
+        return out
+
+    def _band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def _is_indexed(self, doc_id):
+        return doc_id in self._indexed
+
+    def _candidates(self, keys):
+        """
+        (canonical id, signature) of every indexed text sharing at least one band with `keys`.
+        """
+        rows = {row for band, key in enumerate(keys) for row in self._buckets[band].get(key, ())}
+        return [(self._ids[row], self._signatures[row]) for row in sorted(rows)]
+
+    def _add(self, doc_id, signature, keys):
+        row = len(self._ids)
+        self._ids.append(doc_id)
+        self._indexed.add(doc_id)
+        self._signatures.append(signature)
+        for band, key in enumerate(keys):
+            self._buckets[band].setdefault(key, []).append(row)
+
+    def link(self, ids, texts):
+        """
+        Adds texts in order and returns {duplicate id: (canonical id, estimated similarity)}
+        for every text that matched an earlier canonical one.
+        """
+        links = {}
+        for doc_id, signature in zip(ids, self.signatures(texts)):
+            if self._is_indexed(doc_id):  # re-added (e.g. replayed after a resume): still canonical
+                continue
+            keys = self._band_keys(signature)
+            best_id, best_sim = None, 0.0
+            for canonical_id, candidate in self._candidates(keys):
+                sim = float(np.mean(candidate == signature))
+                if sim > best_sim:
+                    best_id, best_sim = canonical_id, sim
+            if best_id is not None and best_sim >= self.threshold:
+                links[doc_id] = (best_id, round(best_sim, 4))
+                continue
+            self._add(doc_id, signature, keys)
+        return links
+
+
+class PersistentNearDuplicateIndex(NearDuplicateIndex):
+    """
+    NearDuplicateIndex whose signatures and LSH buckets live in SQLite at `path` instead of in
+    memory, so deduplicating a very large file keeps memory flat. The index survives restarts:
+    a resumed ingest reopens it instead of re-hashing the rows it already went through.
+    """
+
+    def __init__(self, path, threshold=0.9, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE, seed=1):
+        super().__init__(threshold, num_perm, shingle_size, seed)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS canonical (doc_id TEXT PRIMARY KEY, signature BLOB NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS buckets (key BLOB NOT NULL, doc_id TEXT NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_buckets_key ON buckets(key)")
+        settings = repr((threshold, num_perm, shingle_size, seed))
+        stored = self._conn.execute("SELECT value FROM settings WHERE name = 'params'").fetchone()
+        if stored and stored[0] != settings:  # built with other parameters: start over
+            self._conn.execute("DELETE FROM canonical")
+            self._conn.execute("DELETE FROM buckets")
+        self._conn.execute("INSERT OR REPLACE INTO settings VALUES ('params', ?)", (settings,))
+        self._conn.commit()
+
+    def _band_keys(self, signature):
+        # One bucket table for all bands: the band number is part of the key
+        return [bytes([band]) + key for band, key in enumerate(super()._band_keys(signature))]
+
+    def _is_indexed(self, doc_id):
+        return self._conn.execute("SELECT 1 FROM canonical WHERE doc_id = ?", (doc_id,)).fetchone() is not None
+
+    def _candidates(self, keys):
+        marks = ", ".join("?" for _ in keys)
+        rows = self._conn.execute(
+            f"SELECT doc_id, signature FROM canonical WHERE doc_id IN "
+            f"(SELECT doc_id FROM buckets WHERE key IN ({marks})) ORDER BY rowid", keys,
+        )
+        return [(doc_id, np.frombuffer(signature, dtype=np.uint32)) for doc_id, signature in rows]
+
+    def _add(self, doc_id, signature, keys):
+        self._conn.execute("INSERT INTO canonical VALUES (?, ?)", (doc_id, signature.tobytes()))
+        self._conn.executemany("INSERT INTO buckets VALUES (?, ?)", [(key, doc_id) for key in keys])
+
+    def link(self, ids, texts):
+        links = super().link(ids, texts)
+        self._conn.commit()
+        return links
+
+    def close(self):
+        self._conn.close()
+
+
+def duplicate_links_path(source, dedup_dir=DEDUP_DIR):
+    return os.path.join(dedup_dir, f"{os.path.splitext(source)[0]}_duplicates.csv")
+
+
+def _links_frame(links):
+    return pd.DataFrame(
+        [(doc_id, canonical, sim) for doc_id, (canonical, sim) in links.items()],
+        columns=["review_id", "canonical_id", "similarity"],
+    )
+
+
+def append_duplicate_links(path, links):
+    """
+    Appends links to a duplicates CSV (header written when the file is new/empty) and returns
+    the file's size afterwards, so a streaming ingest can checkpoint how much of it is final.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    is_new = not os.path.exists(path) or not os.path.getsize(path)
+    if links or is_new:
+        _links_frame(links).to_csv(path, mode="a", header=is_new, index=False)
+    return os.path.getsize(path)
+
+
+def truncate_duplicate_links(path, size):
+    """
+    Cuts a duplicates CSV back to `size` bytes (links appended after the last checkpoint).
+    """
+    if os.path.exists(path):
+        with open(path, "r+b") as f:
+            f.truncate(size)
+
+
+def read_duplicate_ids(path, chunksize=100_000):
+    """
+    Sorted array of the duplicate review ids in a duplicates CSV, read in chunks.
+    """
+    if not os.path.exists(path) or not os.path.getsize(path):
+        return np.empty(0, dtype=str)
+    parts = [chunk["review_id"].astype(str).to_numpy(dtype=str)
+             for chunk in pd.read_csv(path, usecols=["review_id"], dtype=str, chunksize=chunksize)]
+    return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=str)
+
+
+def save_duplicate_links(source, links, dedup_dir=DEDUP_DIR):
+    """
+    Writes the duplicate -> canonical review id links for one ingested file to
+    <dedup_dir>/<source name>_duplicates.csv (rewritten on every ingest of that file).
+    """
+    os.makedirs(dedup_dir, exist_ok=True)
+    path = duplicate_links_path(source, dedup_dir)
+    _links_frame(links).to_csv(path, index=False)
+    return path
@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import argparse
+import pandas as pd
+
+# Make sure src imports work
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.embedding_utils import DEFAULT_BATCH_SIZE, CachedEmbedder, embed_in_batches
+from src.parallel_embed import ParallelEmbedder
+from src.synthetic_reviews import generate_reviews
+
+
+def scaling_texts(n_texts, seed=42):
+    """
+    `n_texts` distinct synthetic reviews (each names its own booking number).
+    """
+    return generate_reviews(n_texts, seed=seed)["review_text"].tolist()
+
+
+def time_embedding(embedder, texts, batch_size):
+    started = time.perf_counter()
+    rows = sum(end - start for start, end, _ in embed_in_batches(texts, embedder, batch_size))
+    return rows / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding throughput from 1 to N worker processes.")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--texts", type=int, default=4_000, help="Texts encoded per configuration.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Texts per shard.")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="Intra-op threads per worker (default: cores // workers).")
+    args = parser.parse_args()
+
+    texts = scaling_texts(args.texts)
+    rows = []
+
+    # --- Baseline: the in-process embedder used by single-worker ingest ---
+    single = CachedEmbedder(max_entries=0)
+    single.embed(["warm up"])
+    rate = time_embedding(single, texts, args.batch_size)
+    rows.append({"workers": 0, "mode": "in-process", "threads_per_worker": os.cpu_count(), "texts_per_s": round(rate, 1)})
+    print(f"⏱️ in-process: {rate:,.0f} texts/s")
+
+    # --- 1..N worker processes ---
+    for workers in range(1, args.max_workers + 1):
+        with ParallelEmbedder(workers, threads_per_worker=args.threads_per_worker) as embedder:
+            embedder.warm_up()  # process start + model load are not part of steady-state throughput
+            rate = time_embedding(embedder, texts, args.batch_size)
+        rows.append({
+            "workers": workers, "mode": "process-pool",
+            "threads_per_worker": embedder.threads_per_worker, "texts_per_s": round(rate, 1),
+        })
+        print(f"⏱️ {workers} worker(s) × {embedder.threads_per_worker} thread(s): {rate:,.0f} texts/s")
+
+    report_df = pd.DataFrame(rows)
+    base = report_df.loc[report_df["workers"] == 1, "texts_per_s"].iloc[0]
+    report_df["speedup_vs_1_worker"] = (report_df["texts_per_s"] / base).round(2)
+    report_df["efficiency"] = (report_df["speedup_vs_1_worker"] / report_df["workers"].clip(lower=1)).round(2)
+
+    print("\n📈 Embedding scaling report:\n")
+    print(report_df.to_string(index=False))
+    os.makedirs("outputs", exist_ok=True)
+    report_df.to_csv("outputs/embedding_scaling.csv", index=False)
+    print("\n✅ Saved report to outputs/embedding_scaling.csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,989 @@
+import hashlib
+import json
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
-from chromadb.utils import embedding_functions
 
-# Existing create_or_load_chroma() remains unchanged
+from src.dedup import (
+    DEDUP_THRESHOLD,
+    NearDuplicateIndex,
+    PersistentNearDuplicateIndex,
+    append_duplicate_links,
+    duplicate_links_path,
+    read_duplicate_ids,
+    save_duplicate_links,
+    truncate_duplicate_links,
+)
+from src.quantization import dequantize, quantize
+from src.sentiment import SENTIMENT_AT_INGEST, add_sentiment
+from src.tracing import span
+from src.trends import open_trend_store
 
-def load_and_embed_csv(csv_path, collection):
+CHROMA_PATH = "data/chroma_db"
+COLLECTION_NAME = "customer_reviews"
+MODEL_NAME = "all-MiniLM-L6-v2"
+DEFAULT_BATCH_SIZE = 256
+CACHE_DIR = "data/embedding_cache"
+CACHE_QUANTIZATION = os.getenv("EMBEDDING_CACHE_QUANTIZATION", "float32")  # float32 | float16 | int8 (opt-in, lossy)
+CACHE_MAX_SEGMENTS = 64  # saved segments before they are compacted into one
+LRU_MAX_ENTRIES = 10_000
+VERSIONS_PATH = "data/collection_versions.json"
+CHECKPOINT_DIR = "data/ingest_checkpoints"
+DEFAULT_CHUNK_ROWS = 5_000
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "chroma")  # "chroma" or "numpy"
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))  # >1 shards ingest embedding across processes
+ISSUES_AT_INGEST = os.getenv("ISSUES_AT_INGEST", "0") != "0"  # feed upserted reviews to the issue clusters
+
+
+class CachedEmbedder:
     """
-    Loads a CSV, embeds its text column, and caches embeddings locally to speed up future runs.
+    Process-wide embedder: loads the SentenceTransformer model on first use and keeps a bounded
+    LRU cache of text -> vector so repeated reviews and queries are never re-encoded.
+    Callable like a Chroma embedding function, so it can be passed straight to a collection.
     """
-    df = pd.read_csv(csv_path)
-    text_col = next((c for c in df.columns if "review" in c.lower() or "text" in c.lower()), None)
 
+    def __init__(self, model_name=MODEL_NAME, max_entries=LRU_MAX_ENTRIES):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._model = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def _load(self):
+        with self._load_lock:
+            if self._model is None:
+                from chromadb.utils import embedding_functions  # pulls in sentence_transformers/torch
+                self._model = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=self.model_name)
+        return self._model
+
+    def embed(self, texts):
+        """
+        Returns a float32 array of shape (len(texts), dim); only cache misses reach the model.
+        """
+        texts = [str(t) for t in texts]
+        vectors = [None] * len(texts)
+        pending = OrderedDict()
+        with self._lock:
+            for i, text in enumerate(texts):
+                if text in self._cache:
+                    self._cache.move_to_end(text)
+                    vectors[i] = self._cache[text]
+                    self.hits += 1
+                else:
+                    pending.setdefault(text, []).append(i)
+            self.misses += len(pending)
+
+        if pending:
+            encoded = np.asarray(self._load()(list(pending)), dtype=np.float32)
+            with self._lock:
+                for (text, positions), vec in zip(pending.items(), encoded):
+                    for i in positions:
+                        vectors[i] = vec
+                    self._cache[text] = vec
+                    self._cache.move_to_end(text)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+
+        if not vectors:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.vstack(vectors)
+
+    def __call__(self, input):
+        return self.embed(input).tolist()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "cached_texts": len(self._cache),
+            "max_entries": self.max_entries,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = self.misses = 0
+
+
+_EMBEDDERS = {}
+_EMBEDDERS_LOCK = threading.Lock()
+
+
+def get_embedder(model_name=MODEL_NAME):
+    """
+    Returns the shared CachedEmbedder for `model_name`, creating it on first use.
+    """
+    with _EMBEDDERS_LOCK:
+        if model_name not in _EMBEDDERS:
+            _EMBEDDERS[model_name] = CachedEmbedder(model_name)
+        return _EMBEDDERS[model_name]
+
+
+def warm_up(model_name=MODEL_NAME):
+    """
+    Loads the embedding model and runs one tiny encode so the first real query doesn't pay for it.
+    """
+    embedder = get_embedder(model_name)
+    embedder._load()(["warm-up"])
+    return embedder
+
+
+def create_or_load_chroma(path=CHROMA_PATH, name=COLLECTION_NAME):
+    """
+    Opens (or creates) the persistent ChromaDB collection used by the app and scripts.
+    """
+    import chromadb
+    client = chromadb.PersistentClient(path=path)
+    return client.get_or_create_collection(name=name, embedding_function=get_embedder())
+
+
+def get_retrieval_backend(collection, backend=None):
+    """
+    Object that serves queries for `collection`: the Chroma collection itself, or (with
+    RETRIEVAL_BACKEND=numpy) an in-process memory-mapped index mirroring it.
+    A ShardedCollection (src/sharding.py) serves itself and picks the backend per shard.
+    """
+    if hasattr(collection, "shards"):
+        return collection
+    backend = backend or RETRIEVAL_BACKEND
+    if backend == "chroma":
+        return collection
+    if backend == "numpy":
+        from src.vector_index import get_numpy_index
+        return get_numpy_index(collection)
+    raise ValueError(f"Unknown retrieval backend '{backend}'. Expected 'chroma' or 'numpy'.")
+
+
+def retrieve_similar(collection, query, n_results=10, backend=None, min_rating=None, max_rating=None,
+                     start_date=None, end_date=None, property_name=None):
+    """
+    Returns the documents most similar to the query, best match first.
+    Rating/date/property filters are applied inside the index, before similarity scoring.
+    """
+    where = build_where(min_rating, max_rating, start_date, end_date, property_name)
+    with span("embed_query"):
+        query_embeddings = get_embedder().embed([query]).tolist()
+    with span("retrieve"):
+        results = get_retrieval_backend(collection, backend).query(
+            query_embeddings=query_embeddings, n_results=n_results, where=where
+        )
+    return results["documents"][0] if results["documents"] else []
+
+
+def retrieve_similar_with_vectors(collection, query, n_results=10, backend=None, min_rating=None, max_rating=None,
+                                  start_date=None, end_date=None, property_name=None):
+    """
+    retrieve_similar() that also returns the hits' stored embeddings and the query vector:
+    (docs, doc_vectors (n x dim float32), query_vector (1 x dim)). Nothing is re-encoded.
+    """
+    where = build_where(min_rating, max_rating, start_date, end_date, property_name)
+    with span("embed_query"):
+        query_vector = get_embedder().embed([query])
+    with span("retrieve"):
+        results = get_retrieval_backend(collection, backend).query(
+            query_embeddings=query_vector.tolist(), n_results=n_results, where=where,
+            include=["documents", "embeddings"]
+        )
+    docs = results["documents"][0] if results["documents"] else []
+    vectors = np.asarray(results["embeddings"][0], dtype=np.float32) if docs else np.empty((0, query_vector.shape[1]))
+    return docs, vectors, query_vector
+
+
+def retrieve_similar_batch(collection, queries, n_results=10, backend=None, min_rating=None, max_rating=None,
+                           start_date=None, end_date=None, property_name=None):
+    """
+    Multi-query version of retrieve_similar: embeds all queries in one pass and runs a single
+    collection query, returning one document list per query (same order as `queries`).
+    """
+    if not queries:
+        return []
+    where = build_where(min_rating, max_rating, start_date, end_date, property_name)
+    with span("embed_query"):
+        query_embeddings = get_embedder().embed(queries).tolist()
+    with span("retrieve"):
+        results = get_retrieval_backend(collection, backend).query(
+            query_embeddings=query_embeddings, n_results=n_results, where=where
+        )
+    return results["documents"] or [[] for _ in queries]
+
+
+def _read_versions(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def get_collection_version(collection, path=VERSIONS_PATH):
+    """
+    Monotonic counter bumped every time the collection's contents change (0 if never bumped).
+    For a ShardedCollection it is the sum over its shards, so it moves whenever any shard changes.
+    """
+    versions = _read_versions(path)
+    if hasattr(collection, "shards"):
+        return sum(int(versions.get(shard.name, 0)) for shard in collection.shards.values())
+    return int(versions.get(collection.name, 0))
+
+
+def bump_collection_version(collection, path=VERSIONS_PATH):
+    """
+    Marks the collection as changed so version-keyed caches stop serving old results.
+    """
+    versions = _read_versions(path)
+    versions[collection.name] = int(versions.get(collection.name, 0)) + 1
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(versions, f)
+    return versions[collection.name]
+
+
+_PARALLEL_EMBEDDERS = {}
+
+
+def get_ingest_embedder(workers=None):
+    """
+    Embedder for bulk ingest: the shared in-process embedder, or for `workers` > 1 (default
+    EMBED_WORKERS) a process-wide ParallelEmbedder whose worker pool is reused across calls.
+    """
+    workers = EMBED_WORKERS if workers is None else workers
+    if workers <= 1:
+        return get_embedder()
+    from src.parallel_embed import ParallelEmbedder
+    with _EMBEDDERS_LOCK:
+        if workers not in _PARALLEL_EMBEDDERS:
+            _PARALLEL_EMBEDDERS[workers] = ParallelEmbedder(workers)
+        return _PARALLEL_EMBEDDERS[workers]
+
+
+def embed_in_batches(texts, embedder, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Encodes texts in fixed-size batches, yielding (start, end, vectors) for each batch.
+    """
+    if hasattr(embedder, "iter_embed"):  # ParallelEmbedder: shards run concurrently, still yielded in order
+        yield from embedder.iter_embed(texts, batch_size)
+        return
+    for start in range(0, len(texts), batch_size):
+        end = min(start + batch_size, len(texts))
+        if isinstance(embedder, CachedEmbedder):
+            vectors = embedder.embed(texts[start:end])
+        else:
+            vectors = np.asarray(embedder(texts[start:end]), dtype=np.float32)
+        yield start, end, vectors
+
+
+def content_hash(text, model_name=MODEL_NAME):
+    """
+    Stable cache key for a review: the same text embedded by the same model always maps to the same key.
+    """
+    return hashlib.sha1(f"{model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Per-row embedding cache keyed by content_hash(), shared by every CSV embedded with the same model.
+    Append-only and segmented: each save() writes only the new rows as one more segment of
+    fixed-width .npy arrays (hashes, vectors, optional int8 scales) and commits it in meta.json,
+    so it is cheap enough to run at every ingest checkpoint. Segments are memory-mapped on load
+    (zero-copy) and looked up through one sorted hash index. `quantization` picks float32,
+    float16 or int8 storage.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, cache_dir=CACHE_DIR, quantization=CACHE_QUANTIZATION):
+        self.path = os.path.join(cache_dir, model_name.replace("/", "_"))
+        self.quantization = quantization
+        self._segments = []  # (name, hashes, data, scales) per segment, memory-mapped
+        self._starts = np.zeros(1, dtype=np.int64)  # first global row of each segment, then the total
+        self._index_keys = np.empty(0, dtype="S40")  # sorted hashes -> self._index_rows (global rows)
+        self._index_rows = np.empty(0, dtype=np.int64)
+        self._next_segment = 0
+        self._pending_keys = []
+        self._pending = []
+        self._pending_row = {}
+        self._load()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        if os.path.exists(self._file("meta.json")):
+            with open(self._file("meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            self.quantization = meta["quantization"]
+            if "segments" not in meta:
+                meta = self._migrate_single_file()
+            self._next_segment = meta["next_segment"]
+            for name in meta["segments"]:
+                self._map_segment(name)
+            self._starts = np.cumsum([0] + [len(hashes) for _, hashes, _, _ in self._segments], dtype=np.int64)
+            keys = np.concatenate([hashes for _, hashes, _, _ in self._segments]) if self._segments else self._index_keys
+            order = np.argsort(keys, kind="stable")
+            self._index_keys, self._index_rows = keys[order], order.astype(np.int64)
+            return
+        legacy = f"{self.path}.parquet"  # list-column cache written by earlier versions
+        if os.path.exists(legacy):
+            cached = pd.read_parquet(legacy)
+            self.put(cached["hash"].tolist(), np.vstack(cached["embedding"].to_numpy()))
+
+    def _migrate_single_file(self):
+        """
+        Earlier versions kept the whole cache in one hashes/vectors/scales set: it becomes segment 0.
+        """
+        for part in ("hashes", "vectors", "scales"):
+            if os.path.exists(self._file(f"{part}.npy")):
+                os.replace(self._file(f"{part}.npy"), self._file(f"seg_000000.{part}.npy"))
+        segments = ["seg_000000"] if os.path.exists(self._file("seg_000000.hashes.npy")) else []
+        self._write_meta(segments, next_segment=1)
+        return {"segments": segments, "next_segment": 1}
+
+    def _write_meta(self, segments, next_segment):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file("meta.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump({"quantization": self.quantization, "next_segment": next_segment, "segments": segments}, f)
+        os.replace(self._file("meta.json.tmp"), self._file("meta.json"))
+
+    def _map_segment(self, name):
+        hashes = np.load(self._file(f"{name}.hashes.npy"), mmap_mode="r")
+        data = np.load(self._file(f"{name}.vectors.npy"), mmap_mode="r")
+        scales_file = self._file(f"{name}.scales.npy")
+        scales = np.load(scales_file, mmap_mode="r") if os.path.exists(scales_file) else None
+        self._segments.append((name, hashes, data, scales))
+
+    def _lookup(self, keys):
+        """
+        Global row of each key in the saved segments (-1 when not saved).
+        """
+        wanted = np.asarray(keys, dtype="S40")
+        if not len(self._index_keys):
+            return np.full(len(wanted), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._index_keys, wanted), len(self._index_keys) - 1)
+        return np.where(self._index_keys[pos] == wanted, self._index_rows[pos], -1)
+
+    def _read(self, rows):
+        """
+        Dequantized vectors for saved global rows, gathered segment by segment.
+        """
+        segment_of = np.searchsorted(self._starts, rows, side="right") - 1
+        out = None
+        for s in np.unique(segment_of):
+            where = np.flatnonzero(segment_of == s)
+            _, _, data, scales = self._segments[s]
+            local = rows[where] - self._starts[s]
+            vectors = dequantize(data[local], None if scales is None else scales[local])
+            if out is None:
+                out = np.empty((len(rows), vectors.shape[1]), dtype=np.float32)
+            out[where] = vectors
+        return out
+
+    def __len__(self):
+        return int(self._starts[-1]) + len(self._pending_keys)
+
+    def __contains__(self, key):
+        return key in self._pending_row or self._lookup([key])[0] >= 0
+
+    def contains_many(self, keys):
+        """
+        Boolean mask of which keys are cached (saved or pending), in one vectorised lookup.
+        """
+        return (self._lookup(keys) >= 0) | np.array([k in self._pending_row for k in keys], dtype=bool)
+
+    def get(self, key):
+        """
+        Float32 vector for `key` (dequantized), or None.
+        """
+        pending = self._pending_row.get(key)
+        if pending is not None:
+            return self._pending[pending]
+        row = self._lookup([key])
+        return None if row[0] < 0 else self._read(row)[0]
+
+    def get_many(self, keys):
+        """
+        Float32 matrix of shape (len(keys), dim) for keys that are all present in the cache.
+        """
+        if not keys:
+            return np.empty((0, 0), dtype=np.float32)
+        rows = self._lookup(keys)
+        saved = rows >= 0
+        if saved.all():
+            return self._read(rows)
+        pending = np.vstack([self._pending[self._pending_row[keys[i]]] for i in np.flatnonzero(~saved)])
+        out = np.empty((len(keys), pending.shape[1]), dtype=np.float32)
+        out[~saved] = pending
+        if saved.any():
+            out[saved] = self._read(rows[saved])
+        return out
+
+    def put(self, keys, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        for key, vec, cached in zip(keys, vectors, self.contains_many(keys)):
+            if not cached and key not in self._pending_row:
+                self._pending_row[key] = len(self._pending_keys)
+                self._pending_keys.append(key)
+                self._pending.append(vec)
+
+    def segments(self):
+        """
+        Zero-copy view of the saved cache: one (hashes, data, scales) memory-mapped tuple per segment.
+        """
+        return [(hashes, data, scales) for _, hashes, data, scales in self._segments]
+
+    def save(self):
+        """
+        Appends the pending rows as a new segment; earlier segments are never rewritten. The segment
+        only counts once meta.json lists it, so a save interrupted half-way leaves the cache as it was.
+        """
+        if not self._pending_keys:
+            return
+        data, scales = quantize(np.vstack(self._pending), self.quantization)
+        hashes = np.array(self._pending_keys, dtype="S40")
+        name = f"seg_{self._next_segment:06d}"
+        os.makedirs(self.path, exist_ok=True)
+        np.save(self._file(f"{name}.hashes.npy"), hashes)
+        np.save(self._file(f"{name}.vectors.npy"), data)
+        if scales is not None:
+            np.save(self._file(f"{name}.scales.npy"), scales)
+        self._next_segment += 1
+        self._write_meta([s[0] for s in self._segments] + [name], self._next_segment)
+
+        first_row = int(self._starts[-1])
+        self._map_segment(name)
+        self._starts = np.append(self._starts, first_row + len(hashes))
+        order = np.argsort(hashes)
+        pos = np.searchsorted(self._index_keys, hashes[order])
+        self._index_keys = np.insert(self._index_keys, pos, hashes[order])
+        self._index_rows = np.insert(self._index_rows, pos, first_row + order)
+        self._pending_keys, self._pending, self._pending_row = [], [], {}
+        if len(self._segments) > CACHE_MAX_SEGMENTS:
+            self.compact()
+
+    def _write_merged(self, name, total):
+        _, hashes, data, scales = self._segments[0]
+        parts = [("hashes", 1, hashes), ("vectors", 2, data)] + ([("scales", 3, scales)] if scales is not None else [])
+        for part, field, sample in parts:
+            merged = np.lib.format.open_memmap(self._file(f"{name}.{part}.npy"), mode="w+", dtype=sample.dtype,
+                                               shape=(total, *sample.shape[1:]))
+            for segment, start, stop in zip(self._segments, self._starts[:-1], self._starts[1:]):
+                merged[start:stop] = segment[field]
+            merged.flush()
+
+    def compact(self):
+        """
+        Merges all segments into one, streamed through memory-mapped output files so memory stays
+        flat, then deletes the old segment files. Global rows keep their order, so the hash index
+        is still valid afterwards.
+        """
+        if len(self._segments) < 2:
+            return
+        name = f"seg_{self._next_segment:06d}"
+        total = int(self._starts[-1])
+        self._write_merged(name, total)
+        self._next_segment += 1
+        self._write_meta([name], self._next_segment)
+
+        old = [s[0] for s in self._segments]
+        self._segments = []  # drop the old memmaps before deleting their files (Windows can't delete mapped files)
+        for old_name in old:
+            for part in ("hashes", "vectors", "scales"):
+                if os.path.exists(self._file(f"{old_name}.{part}.npy")):
+                    os.remove(self._file(f"{old_name}.{part}.npy"))
+        self._map_segment(name)
+        self._starts = np.array([0, total], dtype=np.int64)
+
+
+def _is_id_column(name):
+    """
+    `id`, `review_id`, `Review ID`, `reviewId`, `ReviewID`... but not words that merely end in "id".
+    """
+    return re.search(r"(^|[^a-zA-Z])[iI][dD]$|[a-z]I[dD]$", str(name).strip()) is not None
+
+
+def detect_text_column(columns):
+    """
+    First column whose name mentions 'review' or 'text', skipping id columns: `review_id`
+    (the first column of customer_reviews.csv) would otherwise be embedded as the text.
+    """
+    candidates = [c for c in columns if "review" in c.lower() or "text" in c.lower()]
+    text_col = next((c for c in candidates if not _is_id_column(c)), None)
     if not text_col:
         raise ValueError("No text column found in CSV. Expected a column containing 'review' or 'text'.")
+    return text_col
+
+
+def detect_metadata_columns(columns, text_col=None):
+    """
+    Rating / date / property columns worth storing as filterable metadata (None when absent).
+    """
+    def find(*names):
+        return next((c for c in columns if c != text_col and any(n in c.lower() for n in names)), None)
+    return {"rating": find("rating", "stars"), "date": find("date"), "property": find("property", "hotel")}
+
+
+def review_metadata(df, meta_cols):
+    """
+    Per-row filter metadata: `rating` (float), `date` (ISO string) + `date_num` (YYYYMMDD int)
+    and `property`. Missing or unparseable values are left out (Chroma rejects None).
+    """
+    columns = {}
+    if meta_cols.get("rating"):
+        columns["rating"] = pd.to_numeric(df[meta_cols["rating"]], errors="coerce")
+    if meta_cols.get("date"):
+        dates = pd.to_datetime(df[meta_cols["date"]], errors="coerce")
+        columns["date"] = dates.dt.strftime("%Y-%m-%d")
+        columns["date_num"] = pd.to_numeric(dates.dt.strftime("%Y%m%d"), errors="coerce")
+    if meta_cols.get("property"):
+        columns["property"] = df[meta_cols["property"]].astype("string").str.strip()
+
+    rows = [{} for _ in range(len(df))]
+    for name, values in columns.items():
+        for row, value in zip(rows, values.tolist()):
+            if value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value)):
+                continue
+            if name == "rating":
+                value = float(value)
+            elif name == "date_num":
+                value = int(value)
+            row[name] = value
+    return rows
+
+
+def _to_date_num(value):
+    return int(pd.Timestamp(value).strftime("%Y%m%d"))
+
+
+def build_where(min_rating=None, max_rating=None, start_date=None, end_date=None, property_name=None):
+    """
+    Chroma `where` clause for the metadata stored at ingest (None when no filter is set).
+    Dates are inclusive and accept strings or datetimes.
+    """
+    clauses = []
+    if min_rating is not None:
+        clauses.append({"rating": {"$gte": float(min_rating)}})
+    if max_rating is not None:
+        clauses.append({"rating": {"$lte": float(max_rating)}})
+    if start_date is not None:
+        clauses.append({"date_num": {"$gte": _to_date_num(start_date)}})
+    if end_date is not None:
+        clauses.append({"date_num": {"$lte": _to_date_num(end_date)}})
+    if property_name is not None:
+        clauses.append({"property": {"$eq": str(property_name)}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _existing_metadata(collection, source):
+    """
+    Maps id -> stored metadata for everything previously ingested from `source`.
+    """
+    existing = collection.get(where={"source": source}, include=["metadatas"])
+    return {doc_id: meta or {} for doc_id, meta in zip(existing["ids"], existing["metadatas"])}
+
+
+def _open_issue_clusterer(collection):
+    if not ISSUES_AT_INGEST:
+        return None
+    from src.issues import IssueClusterer
+    return IssueClusterer.open(collection.name)
+
+
+def _save_issues(clusterer):
+    from src.issues import save_issue_report
+    clusterer.save()
+    print(f"🧩 Top issues updated: {save_issue_report(clusterer)}")
+
+
+def _last_rows(ids):
+    """
+    Positions of the last row for each id, in order. A bulk upsert rejects repeated ids, so
+    when a review_id repeats, the file's last row for it is the one stored.
+    """
+    return sorted({doc_id: i for i, doc_id in enumerate(ids)}.values())
+
+
+def _embed_calls_saved(links, ids, hashes, cache, kept_hashes):
+    """
+    How many encodes the dedup stage avoided: distinct duplicate texts that are neither cached
+    nor identical to a text that is embedded anyway.
+    """
+    duplicate_hashes = list({h for doc_id, h in zip(ids, hashes) if doc_id in links} - kept_hashes)
+    return int((~cache.contains_many(duplicate_hashes)).sum())
+
+
+def load_and_embed_csv(csv_path, collection, batch_size=DEFAULT_BATCH_SIZE, cache_dir=CACHE_DIR,
+                       dedup_threshold=DEDUP_THRESHOLD, workers=None):
+    """
+    Loads a CSV, embeds its text column, and caches embeddings locally to speed up future runs.
+    Only rows whose text is not already in the embedding cache are encoded; the collection is then
+    brought in sync with the CSV (new/changed rows upserted, rows no longer in the file deleted;
+    when a review_id repeats, its last row is stored).
+    With `dedup_threshold` (MinHash Jaccard estimate, e.g. 0.9), near-duplicate reviews are linked
+    to the first matching (canonical) review and neither embedded nor stored; the returned df gets
+    a `canonical_id` column and duplicates reuse their canonical review's embedding.
+    `workers` > 1 encodes cache misses on a process pool (see get_ingest_embedder()).
+    Each stored review's TextBlob polarity is kept as `sentiment` metadata (scored once per
+    distinct text, see src/sentiment.py) and the collection's daily trend aggregates are updated.
+    With ISSUES_AT_INGEST=1, upserted reviews also update the online issue clusters (src/issues.py).
+    """
+    df = pd.read_csv(csv_path)
+    text_col = detect_text_column(df.columns)
+
+    texts = df[text_col].astype(str).tolist()
+    ids = (df["review_id"] if "review_id" in df.columns else df.index.to_series()).astype(str).tolist()
+    hashes = [content_hash(t) for t in texts]
+    source = os.path.basename(csv_path)
+    metadatas = [
+        {**meta, "source": source, "content_hash": h}
+        for meta, h in zip(review_metadata(df, detect_metadata_columns(df.columns, text_col)), hashes)
+    ]
 
-    cache_file = f"{csv_path}.embedded.parquet"
+    # --- Near-duplicate stage: syndicated copies are linked to a canonical review, not embedded ---
+    cache = EmbeddingCache(cache_dir=cache_dir)
+    links = {}
+    if dedup_threshold:
+        links = NearDuplicateIndex(dedup_threshold).link(ids, texts)
+        save_duplicate_links(source, links)
+    kept = [i for i, doc_id in enumerate(ids) if doc_id not in links]
+    if dedup_threshold:
+        saved = _embed_calls_saved(links, ids, hashes, cache, {hashes[i] for i in kept})
+        print(f"🪞 {len(links)} near-duplicate reviews linked to canonical ids ({saved} embed calls saved)")
+    if SENTIMENT_AT_INGEST:
+        with span("ingest_sentiment"):
+            add_sentiment([metadatas[i] for i in kept], [texts[i] for i in kept], [hashes[i] for i in kept])
 
-    if os.path.exists(cache_file):
-        print(f"⚡ Using cached embeddings from {cache_file}")
-        return pd.read_parquet(cache_file), text_col
+    # --- Embed only rows missing from the cache ---
+    cached = cache.contains_many([hashes[i] for i in kept])
+    missing = list(dict.fromkeys(hashes[i] for i, hit in zip(kept, cached) if not hit))
+    text_by_hash = dict(zip(hashes, texts))
+    if missing:
+        embedder = get_ingest_embedder(workers)
+        missing_texts = [text_by_hash[h] for h in missing]
+        started = time.perf_counter()
+        for start, end, vectors in embed_in_batches(missing_texts, embedder, batch_size):
+            cache.put(missing[start:end], vectors)
+            rate = end / max(time.perf_counter() - started, 1e-9)
+            print(f"   ↳ {end}/{len(missing_texts)} new rows embedded ({rate:,.0f} rows/s)")
+        cache.save()
+        print(f"✅ Cached {len(missing)} new embeddings in {cache.path}")
+    else:
+        print(f"⚡ All {len(kept)} embeddings served from {cache.path}")
 
-    # --- Embed if not cached ---
-    embedder = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
-    df["embedding"] = df[text_col].apply(lambda x: embedder(str(x)))
-    df.to_parquet(cache_file, index=False)
-    print(f"✅ Cached embeddings saved to {cache_file}")
+    # --- Sync the collection with the CSV (duplicates count as gone) ---
+    latest = set(_last_rows(ids))
+    stored_rows = [i for i in kept if i in latest]
+    if len(stored_rows) < len(kept):
+        print(f"⚠️ {len(kept) - len(stored_rows)} rows repeat an earlier review_id; the last row per id is stored")
+    existing = _existing_metadata(collection, source)
+    trends = open_trend_store(collection)
+    current_ids = {ids[i] for i in stored_rows}
+    stale = [doc_id for doc_id in existing if doc_id not in current_ids]
+    if stale:
+        collection.delete(ids=stale)
+        print(f"🧹 Removed {len(stale)} stale ids from the collection")
 
-    # --- Store in ChromaDB ---
-    for idx, row in df.iterrows():
-        collection.add(
-            ids=[str(row.get("review_id", idx))],
-            documents=[str(row[text_col])],
-            embeddings=[row["embedding"]]
+    # A row is re-upserted when its text (content hash) or any filter metadata changed
+    changed = [i for i in stored_rows if existing.get(ids[i]) != metadatas[i]]
+    for start in range(0, len(changed), batch_size):
+        rows = changed[start:start + batch_size]
+        collection.upsert(
+            ids=[ids[i] for i in rows],
+            documents=[texts[i] for i in rows],
+            embeddings=cache.get_many([hashes[i] for i in rows]).tolist(),
+            metadatas=[metadatas[i] for i in rows]
         )
+    print(f"📦 Upserted {len(changed)} rows, {len(stored_rows) - len(changed)} already up to date")
+    if changed or stale:
+        bump_collection_version(collection)
+        trends.apply(
+            added=[metadatas[i] for i in changed],
+            removed=[existing[ids[i]] for i in changed if ids[i] in existing] + [existing[doc_id] for doc_id in stale],
+        )
+        trends.save()
+    issues = _open_issue_clusterer(collection)
+    if issues and changed:
+        issues.partial_fit([hashes[i] for i in changed], [texts[i] for i in changed],
+                           cache.get_many([hashes[i] for i in changed]), [metadatas[i] for i in changed])
+        _save_issues(issues)
 
+    if dedup_threshold:
+        hash_of_id = dict(zip(ids, hashes))
+        df["canonical_id"] = [links[doc_id][0] if doc_id in links else None for doc_id in ids]
+        hashes = [hash_of_id[links[doc_id][0]] if doc_id in links else h for doc_id, h in zip(ids, hashes)]
+    df["embedding"] = list(cache.get_many(hashes)) if hashes else []
     return df, text_col
+
+
+# ------------------------------------------------------------
+# Streaming ingest for very large CSVs
+# ------------------------------------------------------------
+
+_FINGERPRINTS = {}
+
+
+def _file_fingerprint(path):
+    """
+    Size + BLAKE2 digest of the file's content (read in 1 MB blocks), so an edit that keeps the
+    size and lands in the same mtime second is still noticed. Memoised per (size, mtime_ns).
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _FINGERPRINTS:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _FINGERPRINTS[key] = f"{stat.st_size}:{digest.hexdigest()}"
+    return _FINGERPRINTS[key]
+
+
+def _checkpoint_path(csv_path, checkpoint_dir):
+    return os.path.join(checkpoint_dir, f"{os.path.basename(csv_path)}.json")
+
+
+def _load_checkpoint(csv_path, checkpoint_dir):
+    path = _checkpoint_path(csv_path, checkpoint_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    return checkpoint if checkpoint.get("fingerprint") == _file_fingerprint(csv_path) else None
+
+
+def _save_checkpoint(csv_path, checkpoint_dir, checkpoint):
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    path = _checkpoint_path(csv_path, checkpoint_dir)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def iter_csv_chunks(csv_path, text_col, chunk_rows=DEFAULT_CHUNK_ROWS, skip_rows=0):
+    """
+    Reads + cleans the CSV `chunk_rows` at a time, yielding (row_offset, ids, texts, metadatas).
+    Rows with empty text are dropped; ids come from `review_id` or the global row number.
+    """
+    reader = pd.read_csv(csv_path, chunksize=chunk_rows, skiprows=range(1, skip_rows + 1))
+    meta_cols = None
+    row_offset = skip_rows
+    for chunk in reader:
+        chunk.index = pd.RangeIndex(row_offset, row_offset + len(chunk))
+        row_offset += len(chunk)
+        texts = chunk[text_col].astype("string").str.strip()
+        keep = texts.notna() & (texts != "")
+        chunk = chunk[keep]
+        ids = (chunk["review_id"] if "review_id" in chunk.columns else chunk.index.to_series()).astype(str).tolist()
+        meta_cols = meta_cols or detect_metadata_columns(chunk.columns, text_col)
+        yield row_offset, ids, texts[keep].tolist(), review_metadata(chunk, meta_cols)
+
+
+def _dedup_index_path(csv_path, checkpoint_dir):
+    return os.path.join(checkpoint_dir, f"{os.path.basename(csv_path)}.lsh.sqlite")
+
+
+def _csv_ids(csv_path, chunk_rows):
+    """
+    Every id in the CSV as a sorted string array (far smaller than a set of str), read from
+    the id column only.
+    """
+    header = pd.read_csv(csv_path, nrows=0).columns
+    if "review_id" not in header:
+        rows = sum(len(c) for c in pd.read_csv(csv_path, usecols=[0], chunksize=chunk_rows))
+        return np.sort(np.arange(rows).astype(str))
+    parts = [chunk["review_id"].astype(str).to_numpy(dtype=str)
+             for chunk in pd.read_csv(csv_path, usecols=["review_id"], chunksize=chunk_rows)]
+    return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=str)
+
+
+def _in_sorted(sorted_values, values):
+    """
+    Boolean mask of which `values` occur in the sorted array `sorted_values`.
+    """
+    values = np.asarray(values, dtype=str)
+    if not len(sorted_values):
+        return np.zeros(len(values), dtype=bool)
+    pos = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+    return sorted_values[pos] == values
+
+
+def _iter_source_id_pages(collection, source, page_size):
+    """
+    Pages through the ids ingested from `source` without loading them all at once.
+    """
+    offset = 0
+    while True:
+        page = collection.get(where={"source": source}, include=[], limit=page_size, offset=offset)
+        if not page["ids"]:
+            return
+        yield page["ids"]
+        offset += len(page["ids"])
+
+
+def stream_embed_csv(csv_path, collection, chunk_rows=DEFAULT_CHUNK_ROWS, batch_size=DEFAULT_BATCH_SIZE,
+                     cache_dir=CACHE_DIR, checkpoint_dir=CHECKPOINT_DIR, progress=None,
+                     dedup_threshold=DEDUP_THRESHOLD, workers=None):
+    """
+    Bounded-memory ingest: read chunk -> clean -> dedup -> embed (cache misses only) -> upsert -> checkpoint.
+    Only one chunk of rows is held at a time. If interrupted, calling again on the same
+    (unchanged) file resumes after the last checkpointed chunk. `progress(rows_done)` is
+    called after each chunk. Returns a summary dict rather than the full DataFrame.
+    With `dedup_threshold`, near-duplicates of earlier rows (see load_and_embed_csv) are skipped;
+    `workers` > 1 embeds each chunk's cache misses on a process pool. Sentiment metadata and
+    trend aggregates (and, with ISSUES_AT_INGEST=1, issue clusters) are maintained per chunk,
+    as in load_and_embed_csv.
+    """
+    text_col = detect_text_column(pd.read_csv(csv_path, nrows=0).columns)
+    source = os.path.basename(csv_path)
+    checkpoint = _load_checkpoint(csv_path, checkpoint_dir) or {
+        "fingerprint": _file_fingerprint(csv_path), "rows_done": 0, "embedded": 0, "upserted": 0,
+        "duplicates": 0, "embed_calls_saved": 0,
+    }
+    if checkpoint["rows_done"]:
+        print(f"↩️ Resuming {source} after row {checkpoint['rows_done']:,}")
+
+    # Dedup state lives on disk (LSH index in SQLite, links appended to the duplicates CSV),
+    # so memory stays flat however many rows the file has
+    dedup = None
+    links_path = duplicate_links_path(source)
+    if dedup_threshold:
+        index_path = _dedup_index_path(csv_path, checkpoint_dir)
+        resumable = checkpoint["rows_done"] and "links_bytes" in checkpoint and os.path.exists(index_path)
+        if not resumable:
+            for path in (index_path, links_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        dedup = PersistentNearDuplicateIndex(index_path, dedup_threshold)
+        if resumable:
+            truncate_duplicate_links(links_path, checkpoint["links_bytes"])
+        else:
+            checkpoint["links_bytes"] = append_duplicate_links(links_path, {})
+            if checkpoint["rows_done"]:
+                # Rebuild the LSH index over the rows already ingested (cheap: no embedding)
+                for rows_done, ids, texts, _ in iter_csv_chunks(csv_path, text_col, chunk_rows):
+                    checkpoint["links_bytes"] = append_duplicate_links(links_path, dedup.link(ids, texts))
+                    if rows_done >= checkpoint["rows_done"]:
+                        break
+
+    cache = EmbeddingCache(cache_dir=cache_dir)
+    embedder = get_ingest_embedder(workers)
+    trends = open_trend_store(collection)
+    issues = _open_issue_clusterer(collection)
+    started = time.perf_counter()
+    rows_this_run = 0
+
+    try:
+        for rows_done, ids, texts, metas in iter_csv_chunks(csv_path, text_col, chunk_rows, checkpoint["rows_done"]):
+            hashes = [content_hash(t) for t in texts]
+            saved = 0
+            if dedup:
+                chunk_links = dedup.link(ids, texts)
+                checkpoint["links_bytes"] = append_duplicate_links(links_path, chunk_links)
+                kept = [k for k, doc_id in enumerate(ids) if doc_id not in chunk_links]
+                saved = _embed_calls_saved(chunk_links, ids, hashes, cache, {hashes[k] for k in kept})
+                ids, texts, metas, hashes = ([seq[k] for k in kept] for seq in (ids, texts, metas, hashes))
+            latest = _last_rows(ids)
+            if len(latest) < len(ids):
+                print(f"   ⚠️ {len(ids) - len(latest)} rows repeat an earlier review_id; the last row per id is stored")
+                ids, texts, metas, hashes = ([seq[k] for k in latest] for seq in (ids, texts, metas, hashes))
+            metadatas = [{**m, "source": source, "content_hash": h} for m, h in zip(metas, hashes)]
+            existing = collection.get(ids=ids, include=["metadatas"]) if ids else {"ids": [], "metadatas": []}
+            stored = {i: m or {} for i, m in zip(existing["ids"], existing["metadatas"])}
+            if SENTIMENT_AT_INGEST:
+                with span("ingest_sentiment"):
+                    add_sentiment(metadatas, texts, hashes)
+            changed = [k for k, (doc_id, meta) in enumerate(zip(ids, metadatas)) if stored.get(doc_id) != meta]
+
+            cached = cache.contains_many([hashes[k] for k in changed])
+            missing = list(dict.fromkeys(hashes[k] for k, hit in zip(changed, cached) if not hit))
+            if missing:
+                text_by_hash = {hashes[k]: texts[k] for k in changed}
+                missing_texts = [text_by_hash[h] for h in missing]
+                with span("ingest_embed"):
+                    for start, end, vectors in embed_in_batches(missing_texts, embedder, batch_size):
+                        cache.put(missing[start:end], vectors)
+
+            with span("ingest_upsert"):
+                for start in range(0, len(changed), batch_size):
+                    rows = changed[start:start + batch_size]
+                    collection.upsert(
+                        ids=[ids[k] for k in rows],
+                        documents=[texts[k] for k in rows],
+                        embeddings=cache.get_many([hashes[k] for k in rows]).tolist(),
+                        metadatas=[metadatas[k] for k in rows]
+                    )
+            if changed:
+                trends.apply(
+                    added=[metadatas[k] for k in changed],
+                    removed=[stored[ids[k]] for k in changed if ids[k] in stored],
+                )
+                trends.save()
+            if issues and changed:
+                with span("ingest_issues"):
+                    issues.partial_fit([hashes[k] for k in changed], [texts[k] for k in changed],
+                                       cache.get_many([hashes[k] for k in changed]), [metadatas[k] for k in changed])
+
+            rows_this_run += rows_done - checkpoint["rows_done"]
+            checkpoint.update(
+                rows_done=rows_done,
+                embedded=checkpoint["embedded"] + len(missing),
+                upserted=checkpoint["upserted"] + len(changed),
+                duplicates=checkpoint["duplicates"] + (len(chunk_links) if dedup else 0),
+                embed_calls_saved=checkpoint.get("embed_calls_saved", 0) + saved,
+            )
+            cache.save()  # one new segment per chunk, so the checkpoint never points past saved vectors
+            _save_checkpoint(csv_path, checkpoint_dir, checkpoint)
+            rate = rows_this_run / max(time.perf_counter() - started, 1e-9)
+            print(f"   ↳ {rows_done:,} rows processed, {checkpoint['embedded']:,} embedded ({rate:,.0f} rows/s)")
+            if progress:
+                progress(rows_done)
+    finally:
+        cache.save()  # keep vectors embedded since the last checkpoint, even if interrupted
+        if issues:
+            _save_issues(issues)
+
+    if dedup:
+        dedup.close()
+        print(f"🪞 {checkpoint['duplicates']:,} near-duplicate reviews linked to canonical ids "
+              f"({checkpoint['embed_calls_saved']:,} embed calls saved)")
+
+    # --- Drop ids that were ingested from this file before but are gone now (or are duplicates) ---
+    current_ids = _csv_ids(csv_path, chunk_rows)
+    duplicate_ids = read_duplicate_ids(links_path) if dedup else np.empty(0, dtype=str)
+    stale = []
+    for page in _iter_source_id_pages(collection, source, chunk_rows):
+        gone = ~_in_sorted(current_ids, page) | _in_sorted(duplicate_ids, page)
+        stale.extend(doc_id for doc_id, is_gone in zip(page, gone) if is_gone)
+    for start in range(0, len(stale), batch_size):
+        batch = stale[start:start + batch_size]
+        trends.apply(removed=[m or {} for m in collection.get(ids=batch, include=["metadatas"])["metadatas"]])
+        collection.delete(ids=batch)
+    if stale:
+        trends.save()
+    if stale:
+        print(f"🧹 Removed {len(stale)} stale ids from the collection")
+
+    if checkpoint["upserted"] or stale:
+        bump_collection_version(collection)
+    for path in (_checkpoint_path(csv_path, checkpoint_dir), _dedup_index_path(csv_path, checkpoint_dir)):
+        if os.path.exists(path):
+            os.remove(path)
+
+    summary = {
+        "text_col": text_col,
+        "rows": checkpoint["rows_done"],
+        "embedded": checkpoint["embedded"],
+        "upserted": checkpoint["upserted"],
+        "deleted": len(stale),
+    }
+    if dedup:
+        summary.update(duplicates=checkpoint["duplicates"], embed_calls_saved=checkpoint["embed_calls_saved"])
+    print(f"✅ Streamed {summary['rows']:,} rows from {source}: {summary}")
+    return summary
@@ -0,0 +1,161 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+# Make sure src imports work
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.embedding_utils import create_or_load_chroma, get_embedder, get_retrieval_backend
+
+K_VALUES = [1, 5, 10]
+
+# ------------------------------------------------------------
+# qrels file: one row per (query, relevant review) pair
+#   query,review_id[,relevance]
+# `relevance` defaults to 1; graded values (e.g. 1-3) are used by nDCG.
+# ------------------------------------------------------------
+
+def load_qrels(path):
+    qrels = pd.read_csv(path)
+    missing = {"query", "review_id"} - set(qrels.columns)
+    if missing:
+        raise ValueError(f"qrels file {path} is missing column(s): {sorted(missing)}")
+    if "relevance" not in qrels.columns:
+        qrels["relevance"] = 1.0
+    qrels = qrels.dropna(subset=["query", "review_id"])
+    qrels["review_id"] = qrels["review_id"].astype(str)
+    qrels["relevance"] = pd.to_numeric(qrels["relevance"], errors="coerce").fillna(0.0)
+    qrels = qrels[qrels["relevance"] > 0]
+    return qrels.groupby(["query", "review_id"], as_index=False, sort=False)["relevance"].max()
+
+
+def batch_retrieve(collection, queries, n_results, backend=None):
+    """
+    One embedding pass and one retrieval call for every query. Returns the hit ids
+    (Q x n_results, "" where fewer hits came back) and the hits' stored vectors
+    (Q x n_results x dim, zeros for padding) pulled with the results - nothing is re-encoded.
+    """
+    query_vectors = get_embedder().embed(queries)
+    results = get_retrieval_backend(collection, backend).query(
+        query_embeddings=query_vectors.tolist(), n_results=n_results, include=["embeddings", "distances"]
+    )
+    dim = query_vectors.shape[1]
+    ids = np.full((len(queries), n_results), "", dtype=object)
+    vectors = np.zeros((len(queries), n_results, dim), dtype=np.float32)
+    for q, (hit_ids, hit_vectors) in enumerate(zip(results["ids"], results["embeddings"])):
+        ids[q, :len(hit_ids)] = hit_ids
+        if len(hit_ids):
+            vectors[q, :len(hit_ids)] = np.asarray(hit_vectors, dtype=np.float32)
+    return query_vectors, ids, vectors
+
+
+def relevance_matrices(qrels, queries, retrieved_ids):
+    """
+    Vectorised joins of the results against the qrels:
+    - gains (Q x K): relevance of each retrieved id (0 if not labelled relevant)
+    - ideal (Q x K): each query's labelled relevances sorted best-first (for IDCG)
+    - n_relevant (Q,): labelled relevant reviews per query (recall denominator)
+    """
+    n_queries, k = retrieved_ids.shape
+    query_index = pd.Series(np.arange(n_queries), index=queries)
+    labelled = qrels.assign(qi=qrels["query"].map(query_index).to_numpy())
+
+    hits = pd.DataFrame({
+        "qi": np.repeat(np.arange(n_queries), k),
+        "review_id": retrieved_ids.ravel(),
+    })
+    gains = (
+        hits.merge(labelled[["qi", "review_id", "relevance"]], on=["qi", "review_id"], how="left")["relevance"]
+        .fillna(0.0).to_numpy().reshape(n_queries, k)
+    )
+
+    ranked = labelled.sort_values(["qi", "relevance"], ascending=[True, False])
+    rank = ranked.groupby("qi").cumcount().to_numpy()
+    top = rank < k
+    ideal = np.zeros((n_queries, k))
+    ideal[ranked["qi"].to_numpy()[top], rank[top]] = ranked["relevance"].to_numpy()[top]
+    n_relevant = np.bincount(labelled["qi"], minlength=n_queries)
+    return gains, ideal, n_relevant
+
+
+def ir_metrics(gains, ideal, n_relevant, k_values=K_VALUES):
+    """
+    Per-query recall@k, precision@k, nDCG@k (exponential gain) and MRR, computed on whole
+    (Q x K) matrices at once.
+    """
+    relevant = gains > 0
+    discounts = 1.0 / np.log2(np.arange(2, gains.shape[1] + 2))
+    metrics = {}
+    for k in k_values:
+        kk = min(k, gains.shape[1])
+        found = relevant[:, :kk].sum(axis=1)
+        metrics[f"recall@{k}"] = found / np.maximum(n_relevant, 1)
+        metrics[f"precision@{k}"] = found / k
+        dcg = ((2 ** gains[:, :kk] - 1) * discounts[:kk]).sum(axis=1)
+        idcg = ((2 ** ideal[:, :kk] - 1) * discounts[:kk]).sum(axis=1)
+        metrics[f"ndcg@{k}"] = np.divide(dcg, idcg, out=np.zeros_like(dcg), where=idcg > 0)
+    first = relevant.argmax(axis=1)
+    metrics["mrr"] = np.where(relevant.any(axis=1), 1.0 / (first + 1), 0.0)
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate retrieval against labelled query -> relevant review ids.")
+    parser.add_argument("qrels", help="CSV with columns query, review_id[, relevance].")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default=None,
+                        help="Retrieval backend (default: RETRIEVAL_BACKEND).")
+    parser.add_argument("--k", default=",".join(str(k) for k in K_VALUES), help="Cut-offs, e.g. 1,5,10.")
+    args = parser.parse_args()
+    k_values = sorted(int(k) for k in args.k.split(","))
+
+    qrels = load_qrels(args.qrels)
+    queries = qrels["query"].drop_duplicates().tolist()
+    collection = create_or_load_chroma()
+    print(f"✅ {len(queries)} labelled queries, {len(qrels)} relevant pairs, {collection.count()} reviews indexed")
+
+    # ------------------------------------------------------------
+    # 1. One batched retrieval for all queries
+    # ------------------------------------------------------------
+    t0 = time.perf_counter()
+    query_vectors, retrieved_ids, hit_vectors = batch_retrieve(collection, queries, max(k_values), args.backend)
+    retrieval_s = time.perf_counter() - t0
+
+    # ------------------------------------------------------------
+    # 2. Vectorised metrics (+ query/hit similarity from stored vectors)
+    # ------------------------------------------------------------
+    t0 = time.perf_counter()
+    gains, ideal, n_relevant = relevance_matrices(qrels, queries, retrieved_ids)
+    metrics = ir_metrics(gains, ideal, n_relevant, k_values)
+    q_unit = query_vectors / np.maximum(np.linalg.norm(query_vectors, axis=1, keepdims=True), 1e-12)
+    h_norm = np.linalg.norm(hit_vectors, axis=2)
+    sims = np.einsum("qd,qkd->qk", q_unit, hit_vectors) / np.maximum(h_norm, 1e-12)
+    sims = np.where(h_norm > 0, sims, np.nan)
+    metrics_s = time.perf_counter() - t0
+
+    per_query = pd.DataFrame({"query": queries, "n_relevant": n_relevant, **metrics})
+    per_query["avg_similarity"] = np.nanmean(sims, axis=1).round(4)
+    per_query["top_similarity"] = np.nanmax(sims, axis=1).round(4)
+    summary = per_query.drop(columns=["query"]).mean().round(4).to_frame("mean").T
+    summary.insert(0, "queries", len(queries))
+    summary["retrieval_s"] = round(retrieval_s, 3)
+    summary["metrics_s"] = round(metrics_s, 4)
+
+    # ------------------------------------------------------------
+    # 3. Report + save
+    # ------------------------------------------------------------
+    print(f"\n⏱️ Retrieval: {retrieval_s:.2f}s for {len(queries)} queries · metrics: {metrics_s * 1000:.1f} ms")
+    print("\n📊 Mean metrics:\n")
+    print(summary.T.to_string(header=False))
+
+    os.makedirs("outputs", exist_ok=True)
+    per_query.round(4).to_csv("outputs/qrels_evaluation_per_query.csv", index=False)
+    summary.to_csv("outputs/qrels_evaluation_summary.csv", index=False)
+    print("\n✅ Saved:")
+    print("   - outputs/qrels_evaluation_per_query.csv")
+    print("   - outputs/qrels_evaluation_summary.csv")
+
+
+if __name__ == "__main__":
+    main()
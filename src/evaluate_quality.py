@@ -1,50 +1,32 @@
 import os
 import sys
+import argparse
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from sklearn.metrics.pairwise import cosine_similarity
-from textblob import TextBlob
 
 # Fix imports to src
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from src.embedding_utils import create_or_load_chroma, retrieve_similar
+from src.embedding_utils import content_hash, create_or_load_chroma, get_embedder, retrieve_similar, retrieve_similar_batch
+from src.sentiment import get_sentiment_cache, polarity, review_polarities
+from src.session_log import SessionLog
 
-# ============================================================
-# 1. Setup
-# ============================================================
-os.makedirs("outputs/metrics", exist_ok=True)
-session_log_path = "outputs/session_log.csv"
-
-if not os.path.exists(session_log_path):
-    raise FileNotFoundError("❌ No session_log.csv found. Run some queries first.")
-
-df_log = pd.read_csv(session_log_path)
-collection = create_or_load_chroma()
-
-print(f"✅ Loaded {len(df_log)} logged sessions for evaluation.")
+TOP_K = 5
+CURSOR_NAME = "evaluate_quality"
 
 # ============================================================
-# 2. Helper Functions
+# 1. Helper Functions
 # ============================================================
 
 def compute_relevance(response_text, retrieved_docs):
     """
     Measures cosine similarity between response and retrieved context.
     """
-    from chromadb.utils import embedding_functions
-    embedder = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
-
-    def flatten(vec):
-        arr = np.array(vec)
-        if arr.ndim == 3:
-            arr = arr.squeeze(0)
-        if arr.ndim == 1:
-            arr = arr.reshape(1, -1)
-        return arr
-
-    r_vec = flatten(embedder(response_text))
-    d_vecs = np.vstack([flatten(embedder(d)) for d in retrieved_docs])
+    from sklearn.metrics.pairwise import cosine_similarity
+    embedder = get_embedder()
+    r_vec = embedder.embed([response_text])
+    d_vecs = embedder.embed(retrieved_docs)
     sims = cosine_similarity(r_vec, d_vecs)[0]
     return float(np.mean(sims))
 
@@ -61,46 +43,160 @@ def compute_faithfulness(response_text, retrieved_docs):
 def compute_sentiment_alignment(response_text, retrieved_docs):
     """
     Compares sentiment polarity between response and retrieved context.
+    Review polarities come from the sentiment cache filled at ingest (TextBlob only on a miss).
     """
-    resp_polarity = TextBlob(response_text).sentiment.polarity
-    context_polarities = [TextBlob(doc).sentiment.polarity for doc in retrieved_docs]
+    resp_polarity = polarity(response_text)
+    context_polarities = review_polarities(retrieved_docs, [content_hash(d) for d in retrieved_docs],
+                                           get_sentiment_cache())
     avg_context_polarity = np.mean(context_polarities)
     diff = abs(resp_polarity - avg_context_polarity)
     return round(1 - diff, 3)  # higher = better alignment
 
+def _faithfulness_job(args):
+    return compute_faithfulness(*args)
+
+def _result_row(row, relevance, faithfulness, sentiment):
+    return {
+        "timestamp": row["timestamp"],
+        "query": row["query"],
+        "relevance": relevance,
+        "faithfulness": faithfulness,
+        "sentiment_alignment": sentiment,
+        "overall_quality": round(np.mean([relevance, faithfulness, sentiment]), 3)
+    }
+
 # ============================================================
-# 3. Evaluate Each Logged Response
+# 2. Per-row Evaluation (reference path)
 # ============================================================
 
-results = []
-for _, row in df_log.iterrows():
-    query = row["query"]
-    response = str(row["response"])
+def evaluate_per_row(df_log, collection):
+    """
+    Scores each logged response on its own: one retrieval, one embedding pass and
+    one TextBlob pass per row.
+    """
+    results = []
+    for _, row in df_log.iterrows():
+        query = row["query"]
+        response = str(row["response"])
 
-    # Retrieve docs to use as ground truth
-    retrieved = retrieve_similar(collection, query)[:5]
+        # Retrieve docs to use as ground truth
+        retrieved = retrieve_similar(collection, query)[:TOP_K]
 
-    relevance = compute_relevance(response, retrieved)
-    faithfulness = compute_faithfulness(response, retrieved)
-    sentiment = compute_sentiment_alignment(response, retrieved)
-    avg_score = round(np.mean([relevance, faithfulness, sentiment]), 3)
+        relevance = compute_relevance(response, retrieved)
+        faithfulness = compute_faithfulness(response, retrieved)
+        sentiment = compute_sentiment_alignment(response, retrieved)
+        results.append(_result_row(row, relevance, faithfulness, sentiment))
+    get_sentiment_cache().save()
+    return pd.DataFrame(results)
 
-    results.append({
-        "timestamp": row["timestamp"],
-        "query": query,
-        "relevance": relevance,
-        "faithfulness": faithfulness,
-        "sentiment_alignment": sentiment,
-        "overall_quality": avg_score
-    })
+# ============================================================
+# 3. Batched Evaluation
+# ============================================================
+
+def evaluate_batch(df_log, collection, workers=0):
+    """
+    Scores all logged responses at once and returns the same columns as evaluate_per_row():
+    - one multi-query retrieval for every logged query
+    - one embedding pass over the unique responses + documents
+    - relevance as a single (rows x top-k) cosine computation
+    - sentiment read from the ingest-time cache; misses and overlap scoring optionally
+      spread over `workers` processes
+    """
+    if df_log.empty:
+        return pd.DataFrame(columns=["timestamp", "query", "relevance", "faithfulness",
+                                     "sentiment_alignment", "overall_quality"])
+
+    queries = df_log["query"].tolist()
+    responses = df_log["response"].astype(str).tolist()
+
+    # --- One retrieval call for all queries (duplicate queries share a result) ---
+    unique_queries = list(dict.fromkeys(queries))
+    retrieved_by_query = dict(zip(unique_queries, retrieve_similar_batch(collection, unique_queries)))
+    retrieved = [retrieved_by_query[q][:TOP_K] for q in queries]
+
+    # --- One embedding pass over unique texts ---
+    unique_texts = list(dict.fromkeys(responses + [d for docs in retrieved for d in docs]))
+    position = {t: i for i, t in enumerate(unique_texts)}
+    vectors = get_embedder().embed(unique_texts)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+    # --- Relevance: (rows x k) cosine matrix, masked where a query returned fewer than k docs ---
+    doc_index = np.zeros((len(queries), TOP_K), dtype=np.int64)
+    mask = np.zeros((len(queries), TOP_K), dtype=bool)
+    for i, docs in enumerate(retrieved):
+        doc_index[i, :len(docs)] = [position[d] for d in docs]
+        mask[i, :len(docs)] = True
+    resp_unit = unit[[position[r] for r in responses]]
+    sims = np.einsum("nd,nkd->nk", resp_unit, unit[doc_index])
+    with np.errstate(invalid="ignore"):
+        relevance = np.where(mask, sims, 0.0).sum(axis=1) / mask.sum(axis=1)
+
+    # --- Sentiment (cached, TextBlob once per unseen text) + overlap, optionally in a process pool ---
+    faith_args = list(zip(responses, retrieved))
+    sentiment_cache = get_sentiment_cache()
+    keys = [content_hash(t) for t in unique_texts]
+    polarities = sentiment_cache.lookup(keys).astype(np.float64)
+    todo = np.flatnonzero(np.isnan(polarities))
+    todo_texts = [unique_texts[i] for i in todo]
+    if workers and workers > 1:
+        chunk = max(1, len(todo_texts) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            scored = list(pool.map(polarity, todo_texts, chunksize=chunk))
+            faithfulness = list(pool.map(_faithfulness_job, faith_args, chunksize=max(1, len(faith_args) // (workers * 4))))
+    else:
+        scored = [polarity(t) for t in todo_texts]
+        faithfulness = [_faithfulness_job(a) for a in faith_args]
+    if len(todo):
+        polarities[todo] = scored
+        sentiment_cache.put([keys[i] for i in todo], scored)
+        sentiment_cache.save()
+
+    results = []
+    for i, (_, row) in enumerate(df_log.iterrows()):
+        resp_polarity = polarities[position[responses[i]]]
+        context_polarity = np.mean(polarities[doc_index[i, mask[i]]])
+        sentiment = round(1 - abs(resp_polarity - context_polarity), 3)
+        results.append(_result_row(row, float(relevance[i]), faithfulness[i], sentiment))
+    return pd.DataFrame(results)
 
 # ============================================================
-# 4. Save Results
+# 4. Run + Save Results
 # ============================================================
-metrics_df = pd.DataFrame(results)
-output_file = f"outputs/metrics/quality_scores_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-metrics_df.to_csv(output_file, index=False)
 
-print("\n📊 Quality Evaluation Complete:")
-print(metrics_df.describe())
-print(f"\n✅ Saved metrics to: {output_file}")
+def main():
+    parser = argparse.ArgumentParser(description="Score logged RAG responses for relevance, faithfulness and sentiment.")
+    parser.add_argument("--per-row", action="store_true", help="Use the original one-row-at-a-time scorer.")
+    parser.add_argument("--workers", type=int, default=0, help="Process pool size for sentiment/overlap scoring (batch mode).")
+    parser.add_argument("--all", action="store_true", help="Re-score the whole log instead of only entries added since the last run.")
+    args = parser.parse_args()
+
+    os.makedirs("outputs/metrics", exist_ok=True)
+    session_log = SessionLog()
+    if not session_log.count():
+        raise FileNotFoundError("❌ No session log entries found. Run some queries first.")
+
+    df_log = session_log.read_since(CURSOR_NAME) if not args.all else session_log.tail(session_log.count())
+    if df_log.empty:
+        print("✅ No new logged sessions since the last evaluation.")
+        return
+    collection = create_or_load_chroma()
+    print(f"✅ Loaded {len(df_log)} logged sessions for evaluation.")
+
+    if args.per_row:
+        metrics_df = evaluate_per_row(df_log, collection)
+    else:
+        metrics_df = evaluate_batch(df_log, collection, workers=args.workers)
+
+    output_file = f"outputs/metrics/quality_scores_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    metrics_df.to_csv(output_file, index=False)
+    session_log.set_cursor(CURSOR_NAME, int(df_log["id"].max()))
+
+    print("\n📊 Quality Evaluation Complete:")
+    print(metrics_df.describe())
+    print(f"\n🧮 Embedder cache: {get_embedder().stats()}")
+    print(f"\n✅ Saved metrics to: {output_file}")
+
+
+if __name__ == "__main__":
+    main()
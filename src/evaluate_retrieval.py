@@ -6,7 +6,7 @@ from sklearn.metrics.pairwise import cosine_similarity
 
 # Ensure imports from src work
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from src.embedding_utils import create_or_load_chroma, load_and_embed_csv, retrieve_similar
+from src.embedding_utils import create_or_load_chroma, get_embedder, load_and_embed_csv, retrieve_similar
 
 # ------------------------------------------------------------
 # 1. Setup
@@ -33,25 +33,15 @@ queries = [
 k = 5  # top-k results
 scores = []
 
-from chromadb.utils import embedding_functions
-embedder = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
-
-def flatten(vec):
-    """Ensures embeddings are numpy arrays of shape (1, n_features)."""
-    arr = np.array(vec)
-    if arr.ndim == 3:
-        arr = arr.squeeze(0)
-    if arr.ndim == 1:
-        arr = arr.reshape(1, -1)
-    return arr
+embedder = get_embedder()
 
 for topic, example_text in queries:
     retrieved = retrieve_similar(collection, topic)
     retrieved_texts = [r for r in retrieved[:k]]
 
-    # Compute embedding similarity safely
-    q_vec = flatten(embedder(topic))
-    r_vecs = np.vstack([flatten(embedder(t)) for t in retrieved_texts])
+    # Compute embedding similarity (shared embedder caches query + review vectors)
+    q_vec = embedder.embed([topic])
+    r_vecs = embedder.embed(retrieved_texts)
 
     sims = cosine_similarity(q_vec, r_vecs)[0]
     avg_sim = float(np.mean(sims))
@@ -70,6 +60,7 @@ for topic, example_text in queries:
 results_df = pd.DataFrame(scores)
 print("\n📊 Retrieval Evaluation Summary:\n")
 print(results_df[["query", "avg_similarity", "top_similarity"]])
+print(f"\n🧮 Embedder cache: {embedder.stats()}")
 
 print("\n🔍 Example retrieved texts:")
 for _, row in results_df.iterrows():
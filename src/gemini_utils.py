@@ -0,0 +1,172 @@
+import json
+import os
+import random
+import threading
+import time
+
+PREFERRED_MODELS = [
+    "models/gemini-2.5-flash",
+    "models/gemini-2.5-pro",
+    "models/gemini-flash-latest",
+    "models/gemini-pro-latest",
+]
+MODELS_CACHE_PATH = "outputs/.gemini_models.json"
+MODELS_CACHE_TTL = 24 * 60 * 60  # seconds
+MAX_CONTEXT_DOCS = 10
+
+INSIGHT_PROMPT = """
+You are an AI analyst specializing in hospitality feedback.
+Summarize key insights and actionable recommendations based on the text below.
+Keep it concise (150–200 words) and professional.
+
+=== Customer Reviews ===
+{context}
+
+=== Query ===
+{query}
+"""
+
+_configured_key = None
+_models = {}
+_lock = threading.Lock()
+
+
+def _genai():
+    """
+    google.generativeai, imported on first use (it is slow to import and unused by the fake model).
+    """
+    import google.generativeai as genai
+    return genai
+
+
+def configure(api_key):
+    """
+    Calls genai.configure once per process (and again only if the key changes).
+    """
+    global _configured_key
+    with _lock:
+        if api_key != _configured_key:
+            _genai().configure(api_key=api_key)
+            _configured_key = api_key
+            _models.clear()
+
+
+def list_available_models(api_key, cache_path=MODELS_CACHE_PATH, ttl=MODELS_CACHE_TTL):
+    """
+    Returns the model names visible to this key. Results are cached on disk for `ttl` seconds
+    so restarts and reruns don't hit genai.list_models() over the network.
+    """
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, encoding="utf-8") as f:
+                cached = json.load(f)
+            if time.time() - cached.get("fetched_at", 0) < ttl:
+                return cached["models"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    configure(api_key)
+    models = [m.name for m in _genai().list_models()]
+    if not models:
+        return models
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    with open(cache_path, "w", encoding="utf-8") as f:
+        json.dump({"fetched_at": time.time(), "models": models}, f)
+    return models
+
+
+def select_model_name(available_models, preferred=PREFERRED_MODELS):
+    """
+    Picks the first preferred Gemini model that the key has access to (None if none match).
+    """
+    return next((m for m in preferred if m in available_models), None)
+
+
+def get_gemini_model(api_key, model_name=None):
+    """
+    Returns a process-wide GenerativeModel handle, resolving the model name on first use.
+    """
+    configure(api_key)
+    model_name = model_name or select_model_name(list_available_models(api_key))
+    if not model_name:
+        raise ValueError("❌ No supported Gemini models found in your API list.")
+    with _lock:
+        if model_name not in _models:
+            _models[model_name] = _genai().GenerativeModel(model_name)
+        return _models[model_name]
+
+
+def build_insight_prompt(query, docs, max_docs=MAX_CONTEXT_DOCS):
+    """
+    The analyst prompt shared by the Streamlit app and the batch runner.
+    """
+    context = "\n\n".join(docs[:max_docs])
+    return INSIGHT_PROMPT.format(context=context, query=query)
+
+
+def stream_generate(model, prompt, timings=None):
+    """
+    Streams a Gemini answer, yielding text chunks as they arrive.
+    When the stream completes, `timings` (if given) gets `ttft_s` (time to first token)
+    and `generation_s` (total generation time).
+    """
+    started = time.perf_counter()
+    first_token = None
+    for chunk in model.generate_content(prompt, stream=True):
+        text = getattr(chunk, "text", "") or ""
+        if not text:
+            continue
+        if first_token is None:
+            first_token = time.perf_counter()
+        yield text
+    if timings is not None:
+        finished = time.perf_counter()
+        timings["ttft_s"] = round((first_token or finished) - started, 3)
+        timings["generation_s"] = round(finished - started, 3)
+
+
+class _FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeRateLimitError(RuntimeError):
+    code = 429  # HTTP status, as on google.api_core.exceptions.ResourceExhausted
+
+
+class FakeGeminiModel:
+    """
+    Local stand-in for genai.GenerativeModel: answers with a canned summary of the prompt,
+    optionally streamed word by word with a fixed delay. No network or API key needed.
+    `error_rate` makes a fraction of calls raise a 429-style error to exercise retries;
+    `fail_after_chunks` makes streamed answers raise one after that many chunks.
+    """
+
+    def __init__(self, delay=0.0, words=40, error_rate=0.0, seed=0, fail_after_chunks=None):
+        self.delay = delay
+        self.words = words
+        self.error_rate = error_rate
+        self.fail_after_chunks = fail_after_chunks
+        self.calls = 0
+        self._rng = random.Random(seed)
+
+    def _answer(self, prompt):
+        tail = " ".join(str(prompt).split()[-self.words:])
+        return f"Fake insight: {tail}"
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        self.calls += 1
+        if self.error_rate and self._rng.random() < self.error_rate:
+            raise FakeRateLimitError("429 Resource has been exhausted (fake)")
+        answer = self._answer(prompt)
+        if not stream:
+            time.sleep(self.delay)
+            return _FakeChunk(answer)
+        return self._stream(answer)
+
+    def _stream(self, answer):
+        for i, word in enumerate(answer.split(" ")):
+            if i == self.fail_after_chunks:
+                raise FakeRateLimitError("503 The model is overloaded (fake, mid-stream)")
+            time.sleep(self.delay)
+            yield _FakeChunk(word + " ")
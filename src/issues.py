@@ -0,0 +1,279 @@
+import argparse
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.sentiment import NEGATIVE_BELOW
+from src.trends import LOW_RATING
+
+ISSUES_DIR = "data/issues"
+ISSUE_SCOPE = os.getenv("ISSUE_SCOPE", "negative")  # "negative" (complaints only) or "all"
+N_CLUSTERS = 20
+SAMPLES_PER_CLUSTER = 200
+PAGE_SIZE = 10_000
+TOP_KEYWORDS = 8
+TOP_REVIEWS = 3
+
+
+def is_complaint(meta):
+    """
+    True for reviews with negative sentiment or a low rating; reviews carrying neither
+    field can't be told apart and are kept.
+    """
+    sentiment, rating = meta.get("sentiment"), meta.get("rating")
+    if sentiment is None and rating is None:
+        return True
+    return (sentiment is not None and sentiment < NEGATIVE_BELOW) or (rating is not None and rating <= LOW_RATING)
+
+
+class IssueClusterer:
+    """
+    Online clustering of review embeddings into recurring issues with MiniBatchKMeans.partial_fit:
+    each batch of new reviews nudges the centroids, so the store is never reclustered from scratch.
+    Reviews are keyed by content hash (each distinct text counts once). Per cluster it keeps
+    the review count, rating/sentiment sums and a reservoir sample of reviews, from which
+    representative reviews and c-TF-IDF keywords are drawn when reporting.
+    """
+
+    def __init__(self, name, n_clusters=N_CLUSTERS, scope=ISSUE_SCOPE, samples_per_cluster=SAMPLES_PER_CLUSTER,
+                 issues_dir=ISSUES_DIR, seed=0):
+        from sklearn.cluster import MiniBatchKMeans
+        self.path = os.path.join(issues_dir, f"{name}_clusters.pkl")
+        self.n_clusters = n_clusters
+        self.scope = scope
+        self.samples_per_cluster = samples_per_cluster
+        self.model = MiniBatchKMeans(n_clusters=n_clusters, random_state=seed, n_init=3, batch_size=1024)
+        self.seen = np.empty(0, dtype="S40")
+        self.counts = np.zeros(n_clusters, dtype=np.int64)
+        self.sums = np.zeros((n_clusters, 4))  # rating_sum, rated, sentiment_sum, scored
+        self.sample_texts = [[] for _ in range(n_clusters)]
+        self.sample_vectors = [None] * n_clusters
+        self._buffer = None  # rows held back until there are enough to initialise the centroids
+        self._rng = np.random.default_rng(seed)
+
+    @classmethod
+    def open(cls, name, issues_dir=ISSUES_DIR, n_clusters=None, scope=None, **kwargs):
+        """
+        Loads the saved clusterer for collection `name`, or a fresh one. An explicit
+        `n_clusters` or `scope` that differs from the saved clusterer raises ValueError
+        (refit with a new IssueClusterer, i.e. --rebuild) rather than being ignored.
+        """
+        path = os.path.join(issues_dir, f"{name}_clusters.pkl")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                clusterer = pickle.load(f)
+            requested = {"n_clusters": n_clusters, "scope": scope}
+            mismatched = [key for key, value in requested.items() if value is not None and getattr(clusterer, key) != value]
+            if mismatched:
+                saved = ", ".join(f"{key}={getattr(clusterer, key)!r}" for key in mismatched)
+                wanted = ", ".join(f"{key}={requested[key]!r}" for key in mismatched)
+                raise ValueError(f"Issue clusters in {path} were built with {saved}, not {wanted}; rebuild them to change it.")
+            return clusterer
+        return cls(name, n_clusters=n_clusters or N_CLUSTERS, scope=scope or ISSUE_SCOPE, issues_dir=issues_dir, **kwargs)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.tmp", "wb") as f:
+            pickle.dump(self, f)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    @property
+    def fitted(self):
+        return hasattr(self.model, "cluster_centers_")
+
+    def is_new(self, hashes):
+        """
+        Boolean mask of content hashes not clustered yet.
+        """
+        wanted = np.asarray(hashes, dtype="S40")
+        if not len(self.seen):
+            return np.ones(len(wanted), dtype=bool)
+        pos = np.minimum(np.searchsorted(self.seen, wanted), len(self.seen) - 1)
+        return self.seen[pos] != wanted
+
+    def partial_fit(self, hashes, texts, vectors, metadatas):
+        """
+        Adds a batch of reviews: unseen, in-scope rows update the centroids, counts and samples.
+        Returns how many rows were added.
+        """
+        keep = self.is_new(hashes)
+        if self.scope == "negative":
+            keep &= np.array([is_complaint(m or {}) for m in metadatas], dtype=bool)
+        _, first = np.unique(np.asarray(hashes, dtype="S40"), return_index=True)
+        keep &= np.isin(np.arange(len(hashes)), first)  # identical texts in one batch count once
+        if self._buffer is not None:
+            keep &= ~np.isin(np.asarray(hashes, dtype="S40"), self._buffer[0])
+        rows = np.flatnonzero(keep)
+        if not len(rows):
+            return 0
+        batch = (
+            np.asarray(hashes, dtype="S40")[rows],
+            [str(texts[i]) for i in rows],
+            _unit(np.asarray(vectors, dtype=np.float32)[rows]),
+            [metadatas[i] or {} for i in rows],
+        )
+        if self._buffer is not None:
+            batch = _concat_batches(self._buffer, batch)
+            self._buffer = None
+        if not self.fitted and len(batch[0]) < self.n_clusters:
+            self._buffer = batch
+            return len(rows)
+
+        batch_hashes, batch_texts, unit, metas = batch
+        self.model.partial_fit(unit)
+        labels = self.model.predict(unit)
+        self._update_sums(labels, metas)
+        for cluster in np.unique(labels):
+            members = np.flatnonzero(labels == cluster)
+            self._sample(cluster, members, batch_texts, unit)
+        self.counts += np.bincount(labels, minlength=self.n_clusters)
+        self.seen = np.union1d(self.seen, batch_hashes)
+        return len(rows)
+
+    def _update_sums(self, labels, metas):
+        rating = pd.to_numeric(pd.Series([m.get("rating") for m in metas], dtype=object), errors="coerce").to_numpy()
+        sentiment = pd.to_numeric(pd.Series([m.get("sentiment") for m in metas], dtype=object), errors="coerce").to_numpy()
+        columns = np.column_stack([np.nan_to_num(rating), ~np.isnan(rating), np.nan_to_num(sentiment), ~np.isnan(sentiment)])
+        np.add.at(self.sums, labels, columns)
+
+    def _sample(self, cluster, members, texts, unit):
+        """
+        Reservoir-samples `members` into the cluster's sample (uniform over everything it has seen).
+        """
+        cap = self.samples_per_cluster
+        sample_texts = self.sample_texts[cluster]
+        sample_vectors = self.sample_vectors[cluster]
+        if sample_vectors is None:
+            sample_vectors = np.empty((0, unit.shape[1]), dtype=np.float32)
+        free = max(0, cap - len(sample_texts))
+        head, rest = members[:free], members[free:]
+        sample_texts.extend(texts[i] for i in head)
+        sample_vectors = np.concatenate([sample_vectors, unit[head]])
+        if len(rest):
+            seen_before = self.counts[cluster] + len(head)
+            slots = self._rng.integers(0, seen_before + np.arange(1, len(rest) + 1))
+            replace = slots < cap
+            for slot, i in zip(slots[replace], rest[replace]):
+                sample_texts[slot] = texts[i]
+                sample_vectors[slot] = unit[i]
+        self.sample_vectors[cluster] = sample_vectors
+
+    def report(self, top_keywords=TOP_KEYWORDS, top_reviews=TOP_REVIEWS):
+        """
+        One row per non-empty cluster, largest first: size, share, average rating/sentiment,
+        c-TF-IDF keywords and the sampled reviews closest to the centroid.
+        """
+        clusters = [c for c in range(self.n_clusters) if self.counts[c] and self.sample_texts[c]]
+        if not self.fitted or not clusters:
+            return pd.DataFrame(columns=["issue", "reviews", "share", "avg_rating", "avg_sentiment", "keywords"])
+
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        # c-TF-IDF: each cluster's sample is one document, so terms are weighted against the other clusters
+        vectorizer = TfidfVectorizer(stop_words="english", ngram_range=(1, 2), min_df=1, sublinear_tf=True)
+        tfidf = vectorizer.fit_transform([" ".join(self.sample_texts[c]) for c in clusters]).toarray()
+        terms = vectorizer.get_feature_names_out()
+        top_terms = np.argsort(-tfidf, axis=1)[:, :top_keywords]
+
+        centers = _unit(self.model.cluster_centers_)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            avg_rating = self.sums[:, 0] / self.sums[:, 1]
+            avg_sentiment = self.sums[:, 2] / self.sums[:, 3]
+        total = self.counts.sum()
+        rows = []
+        for position, c in enumerate(clusters):
+            closest = np.argsort(-(self.sample_vectors[c] @ centers[c]))[:top_reviews]
+            row = {
+                "issue": c,
+                "reviews": int(self.counts[c]),
+                "share": round(self.counts[c] / total, 3),
+                "avg_rating": round(float(avg_rating[c]), 2),
+                "avg_sentiment": round(float(avg_sentiment[c]), 3),
+                "keywords": ", ".join(terms[t] for t in top_terms[position] if tfidf[position, t] > 0),
+            }
+            for rank, i in enumerate(closest, start=1):
+                row[f"review_{rank}"] = self.sample_texts[c][i]
+            rows.append(row)
+        return pd.DataFrame(rows).sort_values("reviews", ascending=False).reset_index(drop=True)
+
+
+def _unit(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors, dtype=np.float32), where=norms > 0)
+
+
+def _concat_batches(a, b):
+    return np.concatenate([a[0], b[0]]), a[1] + b[1], np.concatenate([a[2], b[2]]), a[3] + b[3]
+
+
+def update_from_collection(clusterer, collection, page_size=PAGE_SIZE):
+    """
+    Feeds every stored review the clusterer hasn't seen yet, a page at a time. Pages are first
+    read without embeddings; vectors are only fetched for new rows that are in scope (with
+    scope="negative", other reviews are dropped on their metadata alone).
+    """
+    added = 0
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            return added
+        offset += len(page["ids"])
+        metas = [m or {} for m in page["metadatas"]]
+        new = clusterer.is_new([m.get("content_hash", "") for m in metas])
+        if clusterer.scope == "negative":
+            new &= np.array([is_complaint(m) for m in metas], dtype=bool)
+        new_ids = [doc_id for doc_id, is_new in zip(page["ids"], new) if is_new]
+        if not new_ids:
+            continue
+        rows = collection.get(ids=new_ids, include=["embeddings", "documents", "metadatas"])
+        rows_meta = [m or {} for m in rows["metadatas"]]
+        added += clusterer.partial_fit(
+            [m.get("content_hash", "") for m in rows_meta], rows["documents"], rows["embeddings"], rows_meta
+        )
+
+
+def save_issue_report(clusterer, output_dir="outputs"):
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, "top_issues.csv")
+    clusterer.report().to_csv(path, index=False)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster stored review embeddings into top issues.")
+    parser.add_argument("--clusters", type=int, default=None,
+                        help=f"Number of issue clusters (default {N_CLUSTERS}); changing it needs --rebuild.")
+    parser.add_argument("--scope", choices=["negative", "all"], default=None,
+                        help=f"Cluster only complaints (negative sentiment / low rating) or every review "
+                             f"(default {ISSUE_SCOPE}); changing it needs --rebuild.")
+    parser.add_argument("--rebuild", action="store_true", help="Discard the saved clusters and refit from the collection.")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    args = parser.parse_args()
+
+    from src.embedding_utils import create_or_load_chroma
+    collection = create_or_load_chroma()
+    if args.rebuild:
+        clusterer = IssueClusterer(collection.name, n_clusters=args.clusters or N_CLUSTERS, scope=args.scope or ISSUE_SCOPE)
+    else:
+        clusterer = IssueClusterer.open(collection.name, n_clusters=args.clusters, scope=args.scope)
+
+    started = time.perf_counter()
+    added = update_from_collection(clusterer, collection, args.page_size)
+    clusterer.save()
+    output_file = save_issue_report(clusterer)
+    elapsed = time.perf_counter() - started
+
+    report = pd.read_csv(output_file)
+    print(report[["issue", "reviews", "share", "avg_rating", "avg_sentiment", "keywords"]].head(10).to_string(index=False))
+    print(f"\n🧩 {added:,} new reviews clustered in {elapsed:.1f}s ({int(clusterer.counts.sum()):,} in total)")
+    print(f"✅ Saved top issues to: {output_file}")
+
+
+if __name__ == "__main__":
+    main()
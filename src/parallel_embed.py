@@ -0,0 +1,105 @@
+import os
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.embedding_utils import DEFAULT_BATCH_SIZE, EMBED_WORKERS, MODEL_NAME
+
+# Set inside each worker process by _init_worker()
+_worker_model = None
+
+
+def _init_worker(model_name, threads):
+    """
+    Runs once per worker: pins the BLAS/OpenMP and torch intra-op pools to `threads` (so N workers
+    don't oversubscribe the cores) and loads one model instance for the worker's lifetime.
+    """
+    global _worker_model
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    except (ImportError, RuntimeError):
+        pass
+    from chromadb.utils import embedding_functions
+    _worker_model = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name)
+
+
+def _encode(texts):
+    return np.asarray(_worker_model(texts), dtype=np.float32)
+
+
+class ParallelEmbedder:
+    """
+    Process-pool embedding engine for CPU-only hosts. Texts are cut into shards, encoded by
+    `workers` processes (one model each, `threads_per_worker` intra-op threads), and yielded
+    back in input order so the writer sees the same stream as single-process embedding.
+    Workers are spawned, so scripts using this need an `if __name__ == "__main__":` guard.
+    """
+
+    def __init__(self, workers=EMBED_WORKERS, model_name=MODEL_NAME, threads_per_worker=None, max_in_flight=None):
+        self.workers = max(1, workers)
+        self.model_name = model_name
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers)
+        self.max_in_flight = max_in_flight or 2 * self.workers  # bounds memory held by finished shards
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name, self.threads_per_worker),
+            )
+        return self._pool
+
+    def warm_up(self):
+        """
+        Starts every worker and loads its model (so timings exclude process start-up).
+        """
+        list(self._get_pool().map(_encode, [["warm up"]] * self.workers))
+
+    def iter_embed(self, texts, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Yields (start, end, vectors) per shard of `batch_size` texts, in order, while keeping
+        at most `max_in_flight` shards queued or finished-but-unconsumed.
+        """
+        texts = [str(t) for t in texts]
+        pool = self._get_pool()
+        shards = iter(range(0, len(texts), batch_size))
+        in_flight = deque()
+        for start in shards:
+            in_flight.append((start, pool.submit(_encode, texts[start:start + batch_size])))
+            if len(in_flight) >= self.max_in_flight:
+                break
+        while in_flight:
+            start, future = in_flight.popleft()
+            vectors = future.result()
+            next_start = next(shards, None)
+            if next_start is not None:
+                in_flight.append((next_start, pool.submit(_encode, texts[next_start:next_start + batch_size])))
+            yield start, start + len(vectors), vectors
+
+    def embed(self, texts, batch_size=DEFAULT_BATCH_SIZE):
+        parts = [vectors for _, _, vectors in self.iter_embed(texts, batch_size)]
+        return np.vstack(parts) if parts else np.empty((0, 0), dtype=np.float32)
+
+    def __call__(self, input):
+        return self.embed(input).tolist()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
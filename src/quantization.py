@@ -0,0 +1,39 @@
+import numpy as np
+
+QUANTIZATION_LEVELS = ("float32", "float16", "int8")
+
+
+def quantize(vectors, level="float32"):
+    """
+    Scalar-quantizes a (rows, dim) float matrix for storage.
+    Returns (data, scales): `scales` is a per-row float32 array for int8 (symmetric,
+    max-abs / 127) and None for the float levels.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if level == "float32":
+        return vectors, None
+    if level == "float16":
+        return vectors.astype(np.float16), None
+    if level == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0 if len(vectors) else np.empty(0, dtype=np.float32)
+        scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+        data = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return data, scales
+    raise ValueError(f"Unknown quantization level '{level}'. Expected one of {QUANTIZATION_LEVELS}.")
+
+
+def dequantize(data, scales=None):
+    """
+    Inverse of quantize(): returns float32 vectors (a copy only when a conversion is needed).
+    """
+    out = np.asarray(data, dtype=np.float32)
+    if scales is not None:
+        out = out * np.asarray(scales, dtype=np.float32).reshape(-1, 1)
+    return out
+
+
+def level_of(dtype):
+    """
+    Quantization level name for a stored array dtype.
+    """
+    return np.dtype(dtype).name
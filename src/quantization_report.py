@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Make sure src imports work
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.embedding_utils import detect_text_column, embed_in_batches, get_embedder
+from src.quantization import QUANTIZATION_LEVELS, dequantize, quantize
+
+# ------------------------------------------------------------
+# 1. Freshly encoded float32 embeddings (the baseline: vectors read back
+#    from Chroma or the embedding cache may already carry quantization error)
+# ------------------------------------------------------------
+csv_path = "data/customer_reviews.csv"
+reviews = pd.read_csv(csv_path)
+texts = reviews[detect_text_column(reviews.columns)].dropna().astype(str).tolist()
+vectors = np.vstack([batch for _, _, batch in embed_in_batches(texts, get_embedder())]).astype(np.float32)
+vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+print(f"✅ Encoded {len(vectors)} reviews as float32 (dim {vectors.shape[1]})")
+
+# Queries: a sample of the reviews themselves, each excluded from its own results
+rng = np.random.default_rng(42)
+n_queries = min(1000, len(vectors))
+query_rows = rng.choice(len(vectors), n_queries, replace=False)
+queries = vectors[query_rows]
+k_values = [1, 5, 10]
+
+def top_k(matrix, k):
+    scores = queries @ matrix.T
+    scores[np.arange(n_queries), query_rows] = -np.inf
+    k = min(k, matrix.shape[0] - 1)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return part
+
+baseline = {k: top_k(vectors, k) for k in k_values}
+
+# ------------------------------------------------------------
+# 2. Recall + storage per quantization level
+# ------------------------------------------------------------
+rows = []
+with tempfile.TemporaryDirectory() as tmp:
+    for level in QUANTIZATION_LEVELS:
+        data, scales = quantize(vectors, level)
+        path = os.path.join(tmp, f"{level}.npy")
+        np.save(path, data)
+        size = os.path.getsize(path) + (scales.nbytes if scales is not None else 0)
+
+        t0 = time.perf_counter()
+        loaded = np.load(path, mmap_mode="r")
+        load_ms = (time.perf_counter() - t0) * 1000
+
+        restored = dequantize(loaded, scales)
+        row = {
+            "quantization": level,
+            "bytes_per_vector": round(size / len(vectors), 1),
+            "total_mb": round(size / 1e6, 3),
+            "mmap_load_ms": round(load_ms, 3),
+            "max_abs_error": round(float(np.abs(restored - vectors).max()), 5),
+        }
+        for k in k_values:
+            found = top_k(restored, k)
+            hits = [len(set(a) & set(b)) / len(a) for a, b in zip(found, baseline[k])]
+            row[f"recall@{k}"] = round(float(np.mean(hits)), 4)
+        rows.append(row)
+
+# ------------------------------------------------------------
+# 3. Report + save
+# ------------------------------------------------------------
+report_df = pd.DataFrame(rows)
+print("\n📉 Recall vs float32 (exact search over freshly encoded review embeddings):\n")
+print(report_df.to_string(index=False))
+
+os.makedirs("outputs", exist_ok=True)
+report_df.to_csv("outputs/quantization_recall.csv", index=False)
+print("\n✅ Saved metrics to outputs/quantization_recall.csv")
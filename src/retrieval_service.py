@@ -0,0 +1,374 @@
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import argparse
+import threading
+import http.client
+import socketserver
+import numpy as np
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+
+# Make sure src imports work
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.context_builder import build_context
+from src.embedding_utils import build_where, create_or_load_chroma, get_embedder, get_retrieval_backend, warm_up
+from src.gemini_utils import FakeGeminiModel, get_gemini_model
+from src.tracing import record, span
+
+BATCH_WINDOW_MS = 5.0
+MAX_BATCH = 64
+REQUEST_TIMEOUT_S = 30.0
+LATENCY_WINDOW = 10_000  # recent requests kept for the queue-latency percentiles
+FILTER_FIELDS = ("min_rating", "max_rating", "start_date", "end_date", "property_name")
+
+# ============================================================
+# 1. Micro-batching
+# ============================================================
+
+class ServiceStats:
+    """
+    Request / batch counters plus queue-wait and end-to-end latency over the most recent requests.
+    """
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.batches = 0
+        self.batched = 0
+        self.errors = 0
+        self._queue_ms = deque(maxlen=window)
+        self._total_ms = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record_batch(self, queue_waits_s):
+        with self._lock:
+            self.batches += 1
+            self.batched += len(queue_waits_s)
+            self._queue_ms.extend(w * 1000 for w in queue_waits_s)
+
+    def record_request(self, seconds, ok=True):
+        with self._lock:
+            self.requests += 1
+            self.errors += 0 if ok else 1
+            self._total_ms.append(seconds * 1000)
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = time.perf_counter() - self.started
+            out = {
+                "uptime_s": round(elapsed, 1),
+                "requests": self.requests,
+                "errors": self.errors,
+                "batches": self.batches,
+                "throughput_rps": round(self.requests / elapsed, 2) if elapsed else 0.0,
+                "mean_batch_size": round(self.batched / self.batches, 2) if self.batches else 0.0,
+            }
+            for name, values in (("queue", self._queue_ms), ("latency", self._total_ms)):
+                if values:
+                    arr = np.fromiter(values, dtype=np.float64)
+                    out.update({f"{name}_p{q}_ms": round(float(np.percentile(arr, q)), 3) for q in (50, 95, 99)})
+            return out
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent requests: the first request to arrive opens a `window_ms` window,
+    everything queued before it closes (up to `max_batch`) is handed to `handler(items)` as
+    one batch, and each caller gets its own element of the returned list.
+    """
+
+    def __init__(self, handler, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH, stats=None):
+        self.handler = handler
+        self.window_s = window_ms / 1000
+        self.max_batch = max_batch
+        self.stats = stats or ServiceStats()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item, timeout=REQUEST_TIMEOUT_S):
+        future = Future()
+        self._queue.put((time.perf_counter(), item, future))
+        return future.result(timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            dispatched = time.perf_counter()
+            waits = [dispatched - enqueued for enqueued, _, _ in batch]
+            self.stats.record_batch(waits)
+            for wait in waits:
+                record("queue_wait", wait)
+            try:
+                results = self.handler([item for _, item, _ in batch])
+                for (_, _, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+
+
+def batched_retrieve(collection, items, backend=None):
+    """
+    Batch handler for retrieval requests: requests sharing a filter are embedded in one pass
+    and answered by one index query (with the largest n_results among them).
+    Each result is {"docs", "vectors", "query_vector"}.
+    """
+    results = [None] * len(items)
+    groups = {}
+    for i, item in enumerate(items):
+        where = build_where(**{f: item.get(f) for f in FILTER_FIELDS})
+        groups.setdefault(json.dumps(where, sort_keys=True, default=str), (where, []))[1].append(i)
+
+    index = get_retrieval_backend(collection, backend)
+    for where, members in groups.values():
+        n_results = max(int(items[i].get("n_results", 10)) for i in members)
+        with span("embed_query"):
+            query_vectors = get_embedder().embed([items[i]["query"] for i in members])
+        with span("retrieve"):
+            found = index.query(query_embeddings=query_vectors.tolist(), n_results=n_results, where=where,
+                                include=["documents", "embeddings"])
+        documents = found["documents"] or [[] for _ in members]
+        embeddings = found.get("embeddings") or [[] for _ in members]
+        for row, i in enumerate(members):
+            k = int(items[i].get("n_results", 10))
+            results[i] = {
+                "docs": documents[row][:k],
+                "vectors": np.asarray(embeddings[row], dtype=np.float32)[:k],
+                "query_vector": query_vectors[row:row + 1],
+            }
+    return results
+
+# ============================================================
+# 2. HTTP service
+# ============================================================
+
+class RetrievalService:
+    """
+    Headless wrapper around retrieval and the insight prompt, shared by every request thread.
+    """
+
+    def __init__(self, collection, model=None, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH, backend=None):
+        self.model = model
+        self.stats = ServiceStats()
+        self.batcher = MicroBatcher(lambda items: batched_retrieve(collection, items, backend),
+                                    window_ms, max_batch, self.stats)
+
+    def retrieve(self, payload):
+        result = self.batcher.submit(payload)
+        return {"docs": result["docs"]}
+
+    def insight(self, payload):
+        if self.model is None:
+            raise ValueError("No Gemini model configured (start the service with --fake-model or GOOGLE_API_KEY).")
+        result = self.batcher.submit(payload)
+        context = build_context(payload["query"], result["docs"], result["vectors"], result["query_vector"])
+        with span("generate"):
+            response = self.model.generate_content(context["prompt"])
+        return {
+            "answer": (getattr(response, "text", "") or "").strip(),
+            "docs": context["docs"],
+            "prompt_tokens": context["prompt_tokens"],
+            "prompt_tokens_saved": context["tokens_saved"],
+        }
+
+
+def make_handler(service):
+    routes = {"/retrieve": service.retrieve, "/insight": service.insight}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def address_string(self):
+            return self.client_address[0] if self.client_address else "unix"
+
+        def log_message(self, format, *args):
+            pass  # one line per request would dominate a load test
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, {"status": "ok"})
+            elif self.path == "/stats":
+                self._send(200, service.stats.snapshot())
+            else:
+                self._send(404, {"error": f"unknown path {self.path}"})
+
+        def do_POST(self):
+            route = routes.get(self.path)
+            if route is None:
+                self._send(404, {"error": f"unknown path {self.path}"})
+                return
+            started = time.perf_counter()
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not str(payload.get("query", "")).strip():
+                    raise ValueError("'query' is required")
+                # Validate here so one malformed request can't fail the whole micro-batch
+                payload["n_results"] = int(payload.get("n_results", 10))
+                build_where(**{f: payload.get(f) for f in FILTER_FIELDS})
+                body, status = route(payload), 200
+            except (ValueError, KeyError) as e:
+                body, status = {"error": str(e)}, 400
+            except Exception as e:
+                body, status = {"error": str(e)}, 500
+            body["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            service.stats.record_request(time.perf_counter() - started, ok=status == 200)
+            self._send(status, body)
+
+    return Handler
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(service, host="127.0.0.1", port=8765, unix_socket=None):
+    handler = make_handler(service)
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = ThreadingUnixHTTPServer(unix_socket, handler)
+        print(f"🛰️ Retrieval service listening on unix:{unix_socket}")
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+        print(f"🛰️ Retrieval service listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"📊 {service.stats.snapshot()}")
+
+# ============================================================
+# 3. Local load test
+# ============================================================
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=REQUEST_TIMEOUT_S):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.unix_path)
+
+
+def load_test(queries, concurrency=32, host="127.0.0.1", port=8765, unix_socket=None, path="/retrieve"):
+    """
+    Fires every query at a running service from `concurrency` client threads (one keep-alive
+    connection each) and returns client-side throughput and latency plus the service's /stats.
+    """
+    local = threading.local()
+
+    def connection():
+        if not hasattr(local, "conn"):
+            local.conn = (UnixHTTPConnection(unix_socket) if unix_socket
+                          else http.client.HTTPConnection(host, port, timeout=REQUEST_TIMEOUT_S))
+        return local.conn
+
+    def call(method, url, body=None):
+        conn = connection()
+        conn.request(method, url, body=json.dumps(body) if body is not None else None,
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+
+    def one(query):
+        t0 = time.perf_counter()
+        status, _ = call("POST", path, {"query": query})
+        return status, (time.perf_counter() - t0) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, queries))
+    elapsed = time.perf_counter() - started
+    latencies = np.array([ms for _, ms in outcomes])
+    summary = {
+        "requests": len(outcomes),
+        "failed": sum(1 for status, _ in outcomes if status != 200),
+        "concurrency": concurrency,
+        "throughput_rps": round(len(outcomes) / elapsed, 2),
+        **{f"client_p{q}_ms": round(float(np.percentile(latencies, q)), 3) for q in (50, 95, 99)},
+    }
+    summary["service"] = call("GET", "/stats")[1]
+    return summary
+
+# ============================================================
+# 4. CLI
+# ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Local retrieval/insight service with request micro-batching.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("serve", "loadtest"):
+        p = sub.add_parser(name)
+        p.add_argument("--host", default="127.0.0.1")
+        p.add_argument("--port", type=int, default=8765)
+        p.add_argument("--unix-socket", default=None, help="Listen on / connect to a Unix socket instead of TCP.")
+    serve_args = sub.choices["serve"]
+    serve_args.add_argument("--window-ms", type=float, default=BATCH_WINDOW_MS, help="Micro-batch window.")
+    serve_args.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    serve_args.add_argument("--backend", choices=["chroma", "numpy"], default=None)
+    serve_args.add_argument("--fake-model", action="store_true", help="Answer /insight with the local FakeGeminiModel.")
+    serve_args.add_argument("--sharded", action="store_true",
+                            help="Serve the per-property shards (property_name routes to one shard, else fan-out).")
+    load_args = sub.choices["loadtest"]
+    load_args.add_argument("--requests", type=int, default=1_000)
+    load_args.add_argument("--concurrency", type=int, default=32)
+    load_args.add_argument("--path", choices=["/retrieve", "/insight"], default="/retrieve")
+    args = parser.parse_args()
+
+    if args.command == "loadtest":
+        from src.benchmark import bench_queries
+        summary = load_test(bench_queries(args.requests), args.concurrency, args.host, args.port,
+                            args.unix_socket, args.path)
+        print(json.dumps(summary, indent=2))
+        return
+
+    model = None
+    if args.fake_model:
+        model = FakeGeminiModel()
+    else:
+        load_dotenv()
+        api_key = os.getenv("GOOGLE_API_KEY")
+        model = get_gemini_model(api_key) if api_key else None
+    warm_up()
+    if args.sharded:
+        from src.sharding import open_sharded_collection
+        collection = open_sharded_collection(backend=args.backend)
+    else:
+        collection = create_or_load_chroma()
+    service = RetrievalService(collection, model, args.window_ms, args.max_batch, args.backend)
+    serve(service, args.host, args.port, args.unix_socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from src.embedding_utils import get_embedder
+
+CACHE_PATH = "outputs/semantic_cache.sqlite"
+SIMILARITY_THRESHOLD = 0.92
+MAX_ENTRIES = 2_000
+TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+class SemanticCache:
+    """
+    Persistent query -> (retrieved docs, answer) cache matched by embedding similarity.
+    Entries are tied to the collection version they were computed against, so embedding
+    new reviews (which bumps the version) invalidates them. Evicts by TTL and, past
+    `max_entries`, by least recent use.
+    """
+
+    def __init__(self, path=CACHE_PATH, threshold=SIMILARITY_THRESHOLD,
+                 max_entries=MAX_ENTRIES, ttl=TTL_SECONDS, embedder=None):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embedder = embedder or get_embedder()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                query TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                embedding BLOB NOT NULL,
+                docs TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_version ON entries(version)")
+        self._conn.commit()
+        self._loaded_version = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+
+    # --- internal helpers ---
+
+    def _unit(self, query):
+        vec = self.embedder.embed([query])[0]
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def _load_version(self, version):
+        """
+        Keeps an in-memory matrix of unit embeddings for the current version's entries.
+        """
+        if self._loaded_version == version:
+            return
+        rows = self._conn.execute(
+            "SELECT id, embedding FROM entries WHERE version = ? AND created_at >= ?",
+            (version, time.time() - self.ttl),
+        ).fetchall()
+        self._ids = np.array([r[0] for r in rows], dtype=np.int64)
+        self._matrix = (
+            np.vstack([np.frombuffer(r[1], dtype=np.float32) for r in rows])
+            if rows else np.empty((0, 0), dtype=np.float32)
+        )
+        self._loaded_version = version
+
+    # --- public API ---
+
+    def lookup(self, query, version):
+        """
+        Returns {"query", "docs", "answer", "similarity"} for the closest cached query at
+        `version` if it clears the threshold and hasn't expired, else None.
+        """
+        unit = self._unit(query)
+        with self._lock:
+            self._load_version(version)
+            if not len(self._ids):
+                self.misses += 1
+                return None
+            sims = self._matrix @ unit
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                self.misses += 1
+                return None
+            entry_id = int(self._ids[best])
+            row = self._conn.execute(
+                "SELECT query, docs, answer, created_at FROM entries WHERE id = ?", (entry_id,)
+            ).fetchone()
+            if row is None or time.time() - row[3] > self.ttl:
+                self._loaded_version = None
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE entries SET last_used = ?, hit_count = hit_count + 1 WHERE id = ?",
+                (time.time(), entry_id),
+            )
+            self._conn.commit()
+            self.hits += 1
+            return {"query": row[0], "docs": json.loads(row[1]), "answer": row[2], "similarity": float(sims[best])}
+
+    def store(self, query, version, docs, answer):
+        """
+        Caches the retrieved docs + answer for `query` at `version`, then applies eviction.
+        """
+        unit = self._unit(query).astype(np.float32)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO entries (query, version, embedding, docs, answer, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (query, int(version), unit.tobytes(), json.dumps(list(docs)), answer, now, now),
+            )
+            self._evict(version)
+            self._conn.commit()
+            self._loaded_version = None
+
+    def _evict(self, current_version):
+        self._conn.execute("DELETE FROM entries WHERE version != ?", (int(current_version),))
+        self._conn.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM entries WHERE id NOT IN (SELECT id FROM entries ORDER BY last_used DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+
+    def invalidate(self, current_version=None):
+        """
+        Drops every entry (or, with `current_version`, every entry from an older version).
+        """
+        with self._lock:
+            if current_version is None:
+                self._conn.execute("DELETE FROM entries")
+            else:
+                self._conn.execute("DELETE FROM entries WHERE version != ?", (int(current_version),))
+            self._conn.commit()
+            self._loaded_version = None
+
+    def stats(self):
+        with self._lock:
+            entries, lifetime_hits = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hit_count), 0) FROM entries"
+            ).fetchone()
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "lifetime_hits": lifetime_hits,
+            "threshold": self.threshold,
+        }
@@ -0,0 +1,185 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+SENTIMENT_AT_INGEST = os.getenv("SENTIMENT_AT_INGEST", "1") != "0"
+SENTIMENT_CACHE_DIR = "data/embedding_cache/sentiment"
+SENTIMENT_MAX_SEGMENTS = 64  # saved segments before they are compacted into one
+NEGATIVE_BELOW = -0.05
+POSITIVE_ABOVE = 0.05
+
+
+def polarity(text):
+    """
+    TextBlob polarity in [-1, 1] (TextBlob is imported on first use; it pulls in NLTK).
+    """
+    from textblob import TextBlob
+    return TextBlob(str(text)).sentiment.polarity
+
+
+class SentimentCache:
+    """
+    content_hash -> polarity, so each distinct review is scored once ever.
+    Append-only and segmented like EmbeddingCache: each save() writes only the new scores as
+    one more pair of sorted .npy arrays (hashes, polarities), committed in meta.json, so saving
+    after every ingest chunk stays O(new rows). Segments are memory-mapped on load and looked
+    up with a vectorised searchsorted; past SENTIMENT_MAX_SEGMENTS they are merged into one.
+    """
+
+    def __init__(self, cache_dir=SENTIMENT_CACHE_DIR):
+        self.path = cache_dir
+        self._segments = []  # (name, sorted hashes, polarities) per segment, memory-mapped
+        self._next_segment = 0
+        self._pending = {}
+        self._load()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        if os.path.exists(self._file("meta.json")):
+            with open(self._file("meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        elif os.path.exists(self._file("hashes.npy")):
+            meta = self._migrate_single_file()
+        else:
+            return
+        self._next_segment = meta["next_segment"]
+        for name in meta["segments"]:
+            self._map_segment(name)
+
+    def _migrate_single_file(self):
+        """
+        Earlier versions kept one sorted hashes/polarity pair: it becomes segment 0.
+        """
+        for part in ("hashes", "polarity"):
+            os.replace(self._file(f"{part}.npy"), self._file(f"seg_000000.{part}.npy"))
+        self._write_meta(["seg_000000"], next_segment=1)
+        return {"segments": ["seg_000000"], "next_segment": 1}
+
+    def _write_meta(self, segments, next_segment):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file("meta.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump({"next_segment": next_segment, "segments": segments}, f)
+        os.replace(self._file("meta.json.tmp"), self._file("meta.json"))
+
+    def _map_segment(self, name):
+        hashes = np.load(self._file(f"{name}.hashes.npy"), mmap_mode="r")
+        values = np.load(self._file(f"{name}.polarity.npy"), mmap_mode="r")
+        self._segments.append((name, hashes, values))
+
+    def __len__(self):
+        return sum(len(hashes) for _, hashes, _ in self._segments) + len(self._pending)
+
+    def lookup(self, keys):
+        """
+        Float32 polarity per key, NaN where the key has not been scored yet.
+        """
+        out = np.full(len(keys), np.nan, dtype=np.float32)
+        if not len(keys):
+            return out
+        wanted = np.asarray(keys, dtype="S40")
+        for _, hashes, values in self._segments:  # oldest first, so the newest score wins
+            if not len(hashes):
+                continue
+            pos = np.minimum(np.searchsorted(hashes, wanted), len(hashes) - 1)
+            found = hashes[pos] == wanted
+            out[found] = values[pos[found]]
+        if self._pending:
+            for i, key in enumerate(keys):
+                if key in self._pending:
+                    out[i] = self._pending[key]
+        return out
+
+    def put(self, keys, values):
+        self._pending.update(zip(keys, (float(v) for v in values)))
+
+    def save(self):
+        """
+        Appends the pending scores as a new sorted segment; earlier segments are never rewritten.
+        """
+        if not self._pending:
+            return
+        hashes = np.array(list(self._pending), dtype="S40")
+        values = np.array(list(self._pending.values()), dtype=np.float32)
+        order = np.argsort(hashes)
+        name = f"seg_{self._next_segment:06d}"
+        os.makedirs(self.path, exist_ok=True)
+        np.save(self._file(f"{name}.hashes.npy"), hashes[order])
+        np.save(self._file(f"{name}.polarity.npy"), values[order])
+        self._next_segment += 1
+        self._write_meta([s[0] for s in self._segments] + [name], self._next_segment)
+        self._map_segment(name)
+        self._pending = {}
+        if len(self._segments) > SENTIMENT_MAX_SEGMENTS:
+            self.compact()
+
+    def compact(self):
+        """
+        Merges all segments into one (newest score wins on repeated hashes) and deletes the old
+        segment files once their memory maps are dropped.
+        """
+        if len(self._segments) < 2:
+            return
+        hashes = np.concatenate([s[1] for s in self._segments])
+        values = np.concatenate([s[2] for s in self._segments])
+        hashes, first = np.unique(hashes[::-1], return_index=True)
+        values = values[::-1][first]
+        name = f"seg_{self._next_segment:06d}"
+        np.save(self._file(f"{name}.hashes.npy"), hashes)
+        np.save(self._file(f"{name}.polarity.npy"), values)
+        self._next_segment += 1
+        self._write_meta([name], self._next_segment)
+
+        old = [s[0] for s in self._segments]
+        self._segments = []  # drop the old memmaps before deleting their files (Windows can't delete mapped files)
+        for old_name in old:
+            for part in ("hashes", "polarity"):
+                if os.path.exists(self._file(f"{old_name}.{part}.npy")):
+                    os.remove(self._file(f"{old_name}.{part}.npy"))
+        self._map_segment(name)
+
+
+def review_polarities(texts, keys, cache):
+    """
+    Polarity per text: cached scores where available, TextBlob (once per distinct key)
+    for the rest, which are added to `cache`. Call cache.save() to persist them.
+    """
+    values = cache.lookup(keys)
+    missing = {}
+    for i in np.flatnonzero(np.isnan(values)):
+        missing.setdefault(keys[i], texts[i])
+    if missing:
+        scored = {key: polarity(text) for key, text in missing.items()}
+        cache.put(list(scored), list(scored.values()))
+        values = np.where(np.isnan(values), [scored.get(k, np.nan) for k in keys], values).astype(np.float32)
+    return values
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_sentiment_cache():
+    """
+    Returns the process-wide SentimentCache, opening it on first use.
+    """
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = SentimentCache()
+        return _CACHE
+
+
+def add_sentiment(metadatas, texts, keys, cache=None):
+    """
+    Stores each review's polarity (rounded to 4 decimals) as `sentiment` in its metadata
+    dict, scoring only reviews missing from the cache, and persists the new scores.
+    """
+    if cache is None:  # not `cache or ...`: an empty SentimentCache is falsy (it defines __len__)
+        cache = get_sentiment_cache()
+    for meta, value in zip(metadatas, review_polarities(texts, keys, cache)):
+        meta["sentiment"] = round(float(value), 4)
+    cache.save()
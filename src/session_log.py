@@ -0,0 +1,174 @@
+import csv
+import io
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+LOG_DB_PATH = "outputs/session_log.sqlite"
+LEGACY_CSV_PATH = "outputs/session_log.csv"
+BASE_COLUMNS = {
+    "timestamp": "TEXT NOT NULL",
+    "query": "TEXT NOT NULL",
+    "response": "TEXT NOT NULL",
+    "ttft_s": "REAL",
+    "generation_s": "REAL",
+}
+
+
+class SessionLog:
+    """
+    Append-only session log in SQLite. Appends are single-row inserts, the tail and
+    time-range views use indexes, CSV export streams in chunks, and named cursors let
+    consumers (e.g. evaluate_quality) read only entries they haven't seen yet.
+    """
+
+    def __init__(self, path=LOG_DB_PATH, legacy_csv=LEGACY_CSV_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        is_new = not os.path.exists(path)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        columns = ", ".join(f'"{name}" {kind}' for name, kind in BASE_COLUMNS.items())
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY AUTOINCREMENT, {columns})")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_timestamp ON entries(timestamp)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cursors (name TEXT PRIMARY KEY, last_id INTEGER NOT NULL)")
+        self._conn.commit()
+        self.columns = self._table_columns()
+        if is_new and legacy_csv and os.path.exists(legacy_csv):
+            self.import_csv(legacy_csv)
+
+    def _table_columns(self):
+        return [row[1] for row in self._conn.execute("PRAGMA table_info(entries)") if row[1] != "id"]
+
+    def _ensure_columns(self, names):
+        """
+        Adds any new fields as nullable REAL columns so older logs keep working.
+        """
+        missing = [n for n in names if n not in self.columns]
+        for name in missing:
+            self._conn.execute(f'ALTER TABLE entries ADD COLUMN "{name}" REAL')
+        if missing:
+            self.columns = self._table_columns()
+
+    # --- writes ---
+
+    def append(self, query, response, timestamp=None, **fields):
+        """
+        Inserts one entry and returns its id.
+        """
+        row = {
+            "timestamp": timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "query": query,
+            "response": response,
+            **fields,
+        }
+        with self._lock:
+            self._ensure_columns(row)
+            names = ", ".join(f'"{n}"' for n in row)
+            marks = ", ".join("?" for _ in row)
+            cur = self._conn.execute(f"INSERT INTO entries ({names}) VALUES ({marks})", list(row.values()))
+            self._conn.commit()
+            return cur.lastrowid
+
+    def import_csv(self, csv_path, chunksize=10_000):
+        """
+        One-off migration of an existing session_log.csv into the store.
+        """
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            with self._lock:
+                self._ensure_columns(chunk.columns)
+                names = ", ".join(f'"{n}"' for n in chunk.columns)
+                marks = ", ".join("?" for _ in chunk.columns)
+                self._conn.executemany(
+                    f"INSERT INTO entries ({names}) VALUES ({marks})",
+                    chunk.itertuples(index=False, name=None),
+                )
+                self._conn.commit()
+
+    # --- reads ---
+
+    def _frame(self, sql, params=()):
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=params)
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def tail(self, n=10):
+        """
+        Last `n` entries, oldest first (walks the primary key backwards, no full scan).
+        """
+        df = self._frame("SELECT * FROM entries ORDER BY id DESC LIMIT ?", (int(n),))
+        return df.iloc[::-1].reset_index(drop=True)
+
+    def between(self, start, end):
+        """
+        Entries with start <= timestamp < end ("YYYY-MM-DD[ HH:MM:SS]" strings or datetimes).
+        """
+        start, end = (v.strftime("%Y-%m-%d %H:%M:%S") if isinstance(v, datetime) else str(v) for v in (start, end))
+        return self._frame(
+            "SELECT * FROM entries WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp, id", (start, end)
+        )
+
+    def iter_csv(self, chunk_size=5_000):
+        """
+        Yields the whole log as CSV text in chunks of `chunk_size` rows (header first).
+        """
+        last_id = 0
+        header_done = False
+        while True:
+            with self._lock:
+                cur = self._conn.execute(
+                    "SELECT * FROM entries WHERE id > ? ORDER BY id LIMIT ?", (last_id, chunk_size)
+                )
+                names = [d[0] for d in cur.description]
+                rows = cur.fetchall()
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            if not header_done:
+                writer.writerow(names[1:])
+                header_done = True
+            if not rows:
+                yield buf.getvalue()
+                return
+            writer.writerows(r[1:] for r in rows)
+            yield buf.getvalue()
+            last_id = rows[-1][0]
+
+    def export_csv(self, out_path, chunk_size=5_000):
+        """
+        Streams the log to `out_path` without holding it in memory; returns the path.
+        """
+        with open(out_path, "w", encoding="utf-8", newline="") as f:
+            for part in self.iter_csv(chunk_size):
+                f.write(part)
+        return out_path
+
+    # --- incremental consumers ---
+
+    def get_cursor(self, name):
+        with self._lock:
+            row = self._conn.execute("SELECT last_id FROM cursors WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def set_cursor(self, name, last_id):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO cursors (name, last_id) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET last_id = excluded.last_id",
+                (name, int(last_id)),
+            )
+            self._conn.commit()
+
+    def read_since(self, cursor_name):
+        """
+        Entries added after the named cursor's position. Call set_cursor() with the
+        max id once they've been processed.
+        """
+        return self._frame("SELECT * FROM entries WHERE id > ? ORDER BY id", (self.get_cursor(cursor_name),))
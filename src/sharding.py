@@ -0,0 +1,279 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.embedding_utils import (
+    CHROMA_PATH,
+    COLLECTION_NAME,
+    DEFAULT_CHUNK_ROWS,
+    VERSIONS_PATH,
+    bump_collection_version,
+    create_or_load_chroma,
+    detect_metadata_columns,
+    detect_text_column,
+    get_embedder,
+    get_retrieval_backend,
+    stream_embed_csv,
+    _file_fingerprint,
+    _read_versions,
+)
+from src.trends import open_trend_store
+
+SHARD_BY_PROPERTY = os.getenv("SHARD_BY_PROPERTY", "0") != "0"  # one collection per property
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "8"))  # threads for fan-out queries
+SHARD_REGISTRY_PATH = "data/property_shards.json"
+PARTITION_DIR = "data/shard_partitions"
+UNASSIGNED = "unassigned"  # shard for reviews without a property
+
+
+def shard_name(property_name, base=COLLECTION_NAME):
+    """
+    Chroma-safe collection name for a property: readable slug plus a short hash, so properties
+    that slug the same still get separate shards (and the name stays under Chroma's 63 chars).
+    """
+    slug = re.sub(r"[^a-z0-9]+", "_", str(property_name).lower()).strip("_")[:32] or "property"
+    digest = hashlib.sha1(str(property_name).encode("utf-8")).hexdigest()[:8]
+    return f"{base}__{slug}_{digest}"
+
+
+def read_registry(path=SHARD_REGISTRY_PATH):
+    """
+    {property: collection name} for every shard created so far.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _register(properties, path=SHARD_REGISTRY_PATH):
+    registry = read_registry(path)
+    new = {p: shard_name(p) for p in properties if p not in registry}
+    if new:
+        registry.update(new)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(registry, f, indent=2, sort_keys=True)
+        os.replace(f"{path}.tmp", path)
+    return registry
+
+
+def get_property_shard(property_name, path=CHROMA_PATH):
+    """
+    The collection holding one property's reviews (created on first use).
+    """
+    return create_or_load_chroma(path, shard_name(property_name))
+
+# ------------------------------------------------------------
+# Ingest routing
+# ------------------------------------------------------------
+
+def _partition_file(source, property_name):
+    # Named after the uploaded file too, so two uploads never share a `source` inside a shard
+    return f"{os.path.splitext(source)[0]}__{shard_name(property_name, base='p')}.csv"
+
+
+def partition_csv(csv_path, chunk_rows=DEFAULT_CHUNK_ROWS, partition_dir=PARTITION_DIR):
+    """
+    Splits a review CSV into one CSV per property (streamed `chunk_rows` at a time) and returns
+    {property: partition path}. Rows keep their global `review_id` (the row number when the
+    file has none). Partitions are reused while the source file is unchanged, so an
+    interrupted sharded ingest can resume.
+    """
+    source = os.path.basename(csv_path)
+    out_dir = os.path.join(partition_dir, source)
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest["fingerprint"] == _file_fingerprint(csv_path):
+            return manifest["partitions"]
+
+    columns = pd.read_csv(csv_path, nrows=0).columns
+    property_col = detect_metadata_columns(columns, detect_text_column(columns))["property"]
+    tmp_dir = f"{out_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    partitions = {}
+    row_offset = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+        if "review_id" not in chunk.columns:
+            chunk.insert(0, "review_id", range(row_offset, row_offset + len(chunk)))
+        row_offset += len(chunk)
+        if property_col:
+            keys = chunk[property_col].astype("string").str.strip().fillna(UNASSIGNED).replace("", UNASSIGNED)
+        else:
+            keys = pd.Series(UNASSIGNED, index=chunk.index)
+        for property_name, rows in chunk.groupby(keys, sort=False):
+            name = _partition_file(source, property_name)
+            rows.to_csv(os.path.join(tmp_dir, name), mode="a", header=property_name not in partitions, index=False)
+            partitions[property_name] = os.path.join(out_dir, name)
+
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": _file_fingerprint(csv_path), "partitions": partitions}, f)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    return partitions
+
+
+def _drop_source(collection, source, page_size=DEFAULT_CHUNK_ROWS):
+    """
+    Deletes everything ingested into `collection` from `source` (keeping its trends in step).
+    """
+    trends = open_trend_store(collection)
+    deleted = 0
+    while True:
+        page = collection.get(where={"source": source}, include=["metadatas"], limit=page_size)
+        if not page["ids"]:
+            break
+        trends.apply(removed=[m or {} for m in page["metadatas"]])
+        collection.delete(ids=page["ids"])
+        deleted += len(page["ids"])
+    if deleted:
+        trends.save()
+        bump_collection_version(collection)
+    return deleted
+
+
+def shard_embed_csv(csv_path, path=CHROMA_PATH, chunk_rows=DEFAULT_CHUNK_ROWS, progress=None, **stream_kwargs):
+    """
+    Routes a review CSV into per-property shards: partitions it by property, then runs
+    stream_embed_csv() on each partition against that property's collection (so checkpoints,
+    dedup, sentiment and trends all work per shard). Properties that were in an earlier
+    version of the file but no longer are have that file's rows removed from their shard.
+    Returns a summary dict with totals and a per-property breakdown.
+    """
+    source = os.path.basename(csv_path)
+    partitions = partition_csv(csv_path, chunk_rows)
+    registry = _register(partitions)
+    summary = {"text_col": None, "rows": 0, "embedded": 0, "upserted": 0, "deleted": 0, "shards": {}}
+
+    for property_name, partition_path in partitions.items():
+        print(f"🏨 {property_name} → {registry[property_name]}")
+        done = summary["rows"]
+        shard_summary = stream_embed_csv(
+            partition_path, get_property_shard(property_name, path), chunk_rows=chunk_rows,
+            progress=(lambda rows, done=done: progress(done + rows)) if progress else None, **stream_kwargs
+        )
+        summary["text_col"] = shard_summary["text_col"]
+        summary["shards"][property_name] = shard_summary
+        for key in ("rows", "embedded", "upserted", "deleted"):
+            summary[key] += shard_summary[key]
+        for key in ("duplicates", "embed_calls_saved"):
+            if key in shard_summary:
+                summary[key] = summary.get(key, 0) + shard_summary[key]
+
+    for property_name in registry.keys() - partitions.keys():
+        summary["deleted"] += _drop_source(get_property_shard(property_name, path), _partition_file(source, property_name))
+    print(f"✅ Routed {summary['rows']:,} rows from {source} into {len(partitions)} property shards")
+    return summary
+
+# ------------------------------------------------------------
+# Fan-out search
+# ------------------------------------------------------------
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def _pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ThreadPoolExecutor(max_workers=SHARD_WORKERS, thread_name_prefix="shard-search")
+        return _POOL
+
+
+def _where_property(where):
+    """
+    The property a `where` clause pins with `$eq` (None if it doesn't).
+    """
+    if not where:
+        return None
+    for clause in where.get("$and", [where]):
+        cond = clause.get("property")
+        if cond is not None:
+            return str(cond["$eq"] if isinstance(cond, dict) else cond)
+    return None
+
+
+class ShardedCollection:
+    """
+    Chroma-style query() over a set of property shards, so retrieve_similar() and friends work
+    against it unchanged. A query pinned to one property (property_name filter) only touches
+    that shard; otherwise every shard is searched in parallel on a shared thread pool and the
+    per-shard top-k lists are merged by distance. Each shard is served by the configured
+    retrieval backend (Chroma or its NumPy index). Empty shards are skipped using row counts
+    cached per collection version, so a query doesn't count() every shard.
+    """
+
+    def __init__(self, shards, backend=None):
+        self.shards = dict(shards)
+        self.name = f"{COLLECTION_NAME}__sharded"
+        self.backend = backend
+        self._counts = {}  # shard name -> (collection version, row count)
+
+    def _shard_counts(self, collections):
+        versions = _read_versions(VERSIONS_PATH)
+        counts = []
+        for collection in collections:
+            version = int(versions.get(collection.name, 0))
+            cached = self._counts.get(collection.name)
+            if cached is None or cached[0] != version:
+                cached = self._counts[collection.name] = (version, collection.count())
+            counts.append(cached[1])
+        return counts
+
+    def count(self):
+        return sum(self._shard_counts(self.shards.values()))
+
+    def _search(self, collection, query_embeddings, n_results, where, include):
+        return get_retrieval_backend(collection, self.backend).query(
+            query_embeddings=query_embeddings, n_results=n_results, where=where, include=include
+        )
+
+    def query(self, query_texts=None, query_embeddings=None, n_results=10, where=None,
+              include=("documents", "distances")):
+        if query_embeddings is None:
+            query_embeddings = get_embedder().embed(query_texts).tolist()
+        include = list(dict.fromkeys([*include, "distances"]))
+        pinned = _where_property(where)
+        targets = [self.shards[pinned]] if pinned in self.shards else [] if pinned else list(self.shards.values())
+        targets = [c for c, rows in zip(targets, self._shard_counts(targets)) if rows]
+
+        def search(collection):
+            return self._search(collection, query_embeddings, n_results, where, include)
+
+        if len(targets) > 1:
+            results = list(_pool().map(search, targets))
+        else:
+            results = list(map(search, targets))
+
+        merged = {key: [] for key in ["ids", *include]}
+        for q in range(len(query_embeddings)):
+            distances = np.concatenate([np.asarray(r["distances"][q], dtype=np.float64) for r in results]) \
+                if results else np.empty(0)
+            order = np.argsort(distances, kind="stable")[:n_results]
+            for key in merged:
+                if key == "distances":
+                    merged[key].append(distances[order].tolist())
+                else:
+                    flat = [item for r in results for item in r[key][q]]
+                    merged[key].append([flat[i] for i in order])
+        return merged
+
+
+def open_sharded_collection(properties=None, path=CHROMA_PATH, backend=None):
+    """
+    ShardedCollection over the given properties' shards (all registered shards by default).
+    """
+    registry = read_registry()
+    properties = list(registry) if properties is None else [p for p in properties if p in registry]
+    return ShardedCollection({p: create_or_load_chroma(path, registry[p]) for p in properties}, backend)
@@ -0,0 +1,147 @@
+import os
+import sys
+import argparse
+import subprocess
+import numpy as np
+import pandas as pd
+
+# Make sure src imports work
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+from src.benchmark import app_import_statements
+
+OUTPUT_DIR = "outputs/startup"
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1500"))
+HEAVY_MODULES = ["torch", "sentence_transformers", "chromadb", "google.generativeai", "sklearn", "textblob"]
+APP_TARGET = "ui/rag_app.py"
+# Importable modules (scripts that run on import, e.g. chroma_stats.py, are not profiled)
+DEFAULT_TARGETS = [
+    APP_TARGET,
+    "src.embedding_utils",
+    "src.gemini_utils",
+    "src.context_builder",
+    "src.semantic_cache",
+    "src.sharding",
+    "src.session_log",
+    "src.sentiment",
+    "src.trends",
+    "src.issues",
+    "src.evaluate_quality",
+    "src.evaluate_qrels",
+    "src.batch_insights",
+    "src.retrieval_service",
+    "src.vector_index",
+]
+
+# ============================================================
+# 1. Measurement
+# ============================================================
+
+def _import_code(target):
+    if target == APP_TARGET:
+        return "\n".join(app_import_statements())
+    return f"import {target}"
+
+
+def parse_importtime(stderr):
+    """
+    `python -X importtime` lines -> DataFrame(module, self_us, cumulative_us, depth).
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us), (len(name) - len(name.lstrip()) - 1) // 2))
+    return pd.DataFrame(rows, columns=["module", "self_us", "cumulative_us", "depth"])
+
+
+def profile_target(target, repeats=3):
+    """
+    Cold-start cost of importing `target` in fresh interpreters: median wall time over
+    `repeats` runs, the per-package import cost (from the last run's -X importtime trace)
+    and which heavy backends got loaded.
+    """
+    code = "import sys, time; sys.path.insert(0, %r); t = time.perf_counter()\n" % ROOT
+    code += _import_code(target)
+    code += "\nprint((time.perf_counter() - t) * 1000)"
+    code += "\nprint(','.join(m for m in %r if m in sys.modules))" % HEAVY_MODULES
+    timings = []
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, cwd=ROOT)
+        if out.returncode != 0:
+            error = [l for l in out.stderr.splitlines() if not l.startswith("import time:")]
+            raise RuntimeError(f"Importing {target} failed: {error[-1] if error else out.returncode}")
+        lines = out.stdout.strip().splitlines()
+        timings.append(float(lines[-2]))
+    heavy = [m for m in lines[-1].split(",") if m]
+
+    trace = parse_importtime(out.stderr)
+    trace["package"] = trace["module"].str.split(".").str[0]
+    packages = (trace.groupby("package")["self_us"].sum() / 1000).sort_values(ascending=False)
+    summary = {
+        "target": target,
+        "wall_ms": round(float(np.median(timings)), 1),
+        "min_ms": round(min(timings), 1),
+        "max_ms": round(max(timings), 1),
+        "modules_imported": len(trace),
+        "heavy_loaded": ",".join(heavy),
+    }
+    breakdown = pd.DataFrame({"target": target, "package": packages.index, "self_ms": packages.round(2).to_numpy()})
+    return summary, breakdown
+
+
+def check_budget(summaries, budget_ms=STARTUP_BUDGET_MS):
+    """
+    Regression check: every target must import within `budget_ms` without loading a heavy backend.
+    Returns a list of failure messages (empty when everything passes).
+    """
+    failures = []
+    for s in summaries:
+        if s["wall_ms"] > budget_ms:
+            failures.append(f"{s['target']}: cold start {s['wall_ms']:.0f} ms > budget {budget_ms:.0f} ms")
+        if s["heavy_loaded"]:
+            failures.append(f"{s['target']}: eagerly imports {s['heavy_loaded']}")
+    return failures
+
+# ============================================================
+# 2. CLI
+# ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-module import cost of the app and src modules.")
+    parser.add_argument("targets", nargs="*", default=DEFAULT_TARGETS,
+                        help=f"Modules to profile (dotted names, or {APP_TARGET} for the app's imports).")
+    parser.add_argument("--repeats", type=int, default=3, help="Fresh interpreters per target (median is reported).")
+    parser.add_argument("--top", type=int, default=8, help="Most expensive packages shown per target.")
+    parser.add_argument("--check", action="store_true",
+                        help="Exit non-zero if a target exceeds the budget or loads a heavy backend at import.")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    args = parser.parse_args()
+
+    summaries, breakdowns = [], []
+    for target in args.targets:
+        summary, breakdown = profile_target(target, args.repeats)
+        summaries.append(summary)
+        breakdowns.append(breakdown)
+        print(f"⏱️ {target}: {summary['wall_ms']:.0f} ms, {summary['modules_imported']} modules"
+              + (f" (heavy: {summary['heavy_loaded']})" if summary["heavy_loaded"] else ""))
+        for row in breakdown.head(args.top).itertuples():
+            print(f"     {row.self_ms:8.1f} ms  {row.package}")
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    pd.DataFrame(summaries).to_csv(os.path.join(OUTPUT_DIR, "startup_summary.csv"), index=False)
+    pd.concat(breakdowns, ignore_index=True).to_csv(os.path.join(OUTPUT_DIR, "startup_by_package.csv"), index=False)
+    print(f"\n✅ Saved {OUTPUT_DIR}/startup_summary.csv and startup_by_package.csv")
+
+    if args.check:
+        failures = check_budget(summaries, args.budget_ms)
+        for failure in failures:
+            print(f"❌ {failure}")
+        if failures:
+            sys.exit(1)
+        print(f"🎉 All {len(summaries)} targets start within {args.budget_ms:.0f} ms without heavy backends")
+
+
+if __name__ == "__main__":
+    main()
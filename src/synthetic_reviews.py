@@ -0,0 +1,108 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+# ------------------------------------------------------------
+# Deterministic synthetic reviews in the data/customer_reviews.csv schema:
+# review_id, customer_name, rating, review_text, date
+# ------------------------------------------------------------
+FIRST_NAMES = ["Emily", "Michael", "Sarah", "David", "Laura", "James", "Olivia", "Daniel", "Sophia", "Lucas",
+               "Ana", "Kenji", "Priya", "Mateo", "Chloe", "Omar", "Hannah", "Ivan", "Grace", "Noah"]
+LAST_NAMES = ["Jones", "Lee", "Chen", "Brown", "Garcia", "Smith", "Patel", "Kim", "Silva", "Müller",
+              "Rossi", "Nguyen", "Martin", "Costa", "Walker", "Sato", "Khan", "Lopez", "Wilson", "Dubois"]
+
+ASPECTS = {
+    "room": (["The room was spotless and spacious.", "Our room had a lovely view and a comfy bed."],
+             ["The room smelled musty and the bathroom was not clean.", "The room was tiny and the carpet was stained."]),
+    "staff": (["The staff were super friendly and helpful.", "Reception went out of their way to help us."],
+              ["The receptionist was rude and unhelpful.", "Customer service didn't seem to care about our issue."]),
+    "breakfast": (["The breakfast buffet had great variety.", "Loved the breakfast pancakes and fresh coffee!"],
+                  ["Breakfast was cold and the coffee was terrible.", "Poor breakfast variety, same food every day."]),
+    "checkin": (["Check-in was smooth and fast.", "Early check-in was no problem at all."],
+                ["Our room wasn't ready until 6 pm.", "Check-in took over an hour with a long queue."]),
+    "noise": (["Very quiet at night, we slept well.", "Soundproofing was excellent."],
+              ["The air conditioner was noisy all night.", "Terrible noise from the street and the bar."]),
+    "location": (["Great location close to the beach.", "Convenient location near the old town."],
+                 ["Far from the city centre and hard to reach.", "The neighbourhood felt unsafe at night."]),
+    "wifi": (["Fast Wi-Fi everywhere in the hotel.", "Wi-Fi worked perfectly for video calls."],
+             ["Wi-Fi kept disconnecting.", "The Wi-Fi was unusable in the rooms."]),
+    "pool": (["The pool area was relaxing.", "Lovely pool with plenty of loungers."],
+             ["The pool was closed for maintenance.", "The pool area was overcrowded and dirty."]),
+}
+OPENERS = {1: "Terrible experience.", 2: "Disappointing stay.", 3: "Okay experience.",
+           4: "Overall very good.", 5: "Amazing stay!"}
+CLOSERS = {1: "Would not recommend.", 2: "Not worth the price.", 3: "Could improve a few things.",
+           4: "Would come back.", 5: "Highly recommended!"}
+RATING_WEIGHTS = [0.10, 0.12, 0.18, 0.30, 0.30]
+NIGHTS = ["one night", "two nights", "three nights", "a long weekend", "a week", "ten days"]
+GENERATOR_VERSION = 2  # bump when the generated text changes, so cached benchmark CSVs are regenerated
+
+
+def generate_reviews(n_rows, seed=42, start_date="2024-01-01", days=730, start_id=1):
+    """
+    Returns `n_rows` deterministic synthetic reviews (same seed -> same data).
+    Ratings skew positive; text mixes positive/negative aspect sentences by rating.
+    Every text ends with a clause naming its booking number, so no two reviews in a file are
+    identical (content-hash caching would otherwise skip most of them when embedding).
+    """
+    rng = np.random.default_rng(seed)
+    ratings = rng.choice([1, 2, 3, 4, 5], size=n_rows, p=RATING_WEIGHTS)
+    first = rng.integers(0, len(FIRST_NAMES), n_rows)
+    last = rng.integers(0, len(LAST_NAMES), n_rows)
+    day_offsets = np.sort(rng.integers(0, days, n_rows))
+    aspect_names = list(ASPECTS)
+    n_aspects = rng.integers(1, 4, n_rows)
+    aspect_picks = rng.integers(0, len(aspect_names), (n_rows, 3))
+    variant = rng.integers(0, 2, (n_rows, 3))
+    positive_roll = rng.random((n_rows, 3))
+    nights = rng.integers(0, len(NIGHTS), n_rows)
+
+    texts = []
+    for i in range(n_rows):
+        rating = int(ratings[i])
+        parts = [OPENERS[rating]]
+        for j in range(n_aspects[i]):
+            good, bad = ASPECTS[aspect_names[aspect_picks[i, j]]]
+            positive = positive_roll[i, j] < (rating - 1) / 4
+            parts.append((good if positive else bad)[variant[i, j]])
+        parts.append(CLOSERS[rating])
+        parts.append(f"Stayed {NIGHTS[nights[i]]}, booking #{start_id + i}.")
+        texts.append(" ".join(parts))
+
+    dates = pd.Timestamp(start_date) + pd.to_timedelta(day_offsets, unit="D")
+    return pd.DataFrame({
+        "review_id": np.arange(start_id, start_id + n_rows),
+        "customer_name": [f"{FIRST_NAMES[a]} {LAST_NAMES[b]}" for a, b in zip(first, last)],
+        "rating": ratings,
+        "review_text": texts,
+        "date": dates.strftime("%Y-%m-%d"),
+    })
+
+
+def write_reviews_csv(path, n_rows, seed=42, chunk_rows=100_000):
+    """
+    Writes `n_rows` synthetic reviews to `path` in chunks (bounded memory for 1M+ rows).
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    written = 0
+    chunk_no = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        while written < n_rows:
+            size = min(chunk_rows, n_rows - written)
+            chunk = generate_reviews(size, seed=seed + chunk_no, start_id=written + 1)
+            chunk.to_csv(f, index=False, header=(written == 0))
+            written += size
+            chunk_no += 1
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic review CSV.")
+    parser.add_argument("rows", type=int, help="Number of reviews, e.g. 10000, 100000, 1000000.")
+    parser.add_argument("--out", default=None, help="Output CSV (default data/synthetic_reviews_<rows>.csv).")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    out = args.out or f"data/synthetic_reviews_{args.rows}.csv"
+    write_reviews_csv(out, args.rows, seed=args.seed)
+    print(f"✅ Wrote {args.rows:,} synthetic reviews to {out}")
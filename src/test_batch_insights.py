@@ -0,0 +1,70 @@
+import os
+import sys
+import asyncio
+import tempfile
+import numpy as np
+
+# Add the project root (one level above /src) to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import batch_insights
+from src.batch_insights import completed_keys, is_retryable, run_batch
+from src.gemini_utils import FakeGeminiModel, FakeRateLimitError
+
+# Retrieval is replaced by canned reviews so only the scheduling/retry/resume logic runs
+# (no Chroma, no embedding model, no API key)
+retrieved_for = []
+
+
+def fake_retrieve(collection, query, n_results=10, property_name=None, **filters):
+    retrieved_for.append(property_name)
+    docs = [f"Review {i} about {query}" for i in range(3)]
+    vectors = np.eye(3, 4, dtype=np.float32)
+    return docs, vectors, np.ones((1, 4), dtype=np.float32)
+
+
+batch_insights.retrieve_similar_with_vectors = fake_retrieve
+questions = [{"question": f"What do guests say about topic {i}?", "property": "Hotel A" if i % 2 else ""}
+             for i in range(12)]
+
+
+def run(model, results_path, retries):
+    return asyncio.run(run_batch(questions, None, model, results_path, concurrency=4, rate=1000,
+                                 retries=retries, base_delay=0.001))
+
+
+def test_is_retryable():
+    assert is_retryable(FakeRateLimitError("429 Resource has been exhausted (fake)"))
+    assert is_retryable(TimeoutError())
+    assert not is_retryable(ValueError("generateContent failed: invalid rate argument"))
+    assert not is_retryable(RuntimeError("404 Requested resource not found"))
+
+
+def test_retries_and_property_filter():
+    retrieved_for.clear()
+    model = FakeGeminiModel(error_rate=0.4, seed=1)
+    with tempfile.TemporaryDirectory() as tmp:
+        summary = run(model, os.path.join(tmp, "run.jsonl"), retries=20)
+    assert summary["ok"] == len(questions) and summary["failed"] == 0
+    assert summary["retries"] > 0 and model.calls == len(questions) + summary["retries"]
+    assert sorted(retrieved_for, key=str) == sorted([q["property"] or None for q in questions], key=str)
+
+
+def test_resume():
+    with tempfile.TemporaryDirectory() as tmp:
+        results_path = os.path.join(tmp, "run.jsonl")
+        first = run(FakeGeminiModel(error_rate=0.5, seed=2), results_path, retries=0)
+        assert first["failed"] > 0 and first["ok"] > 0
+        assert len(completed_keys(results_path)) == first["ok"]
+
+        # A second run only asks the questions that failed
+        model = FakeGeminiModel()
+        second = run(model, results_path, retries=0)
+        assert model.calls == first["failed"] and second["ok"] == first["failed"]
+        assert len(completed_keys(results_path)) == len(questions)
+
+
+if __name__ == "__main__":
+    for test in (test_is_retryable, test_retries_and_property_filter, test_resume):
+        test()
+        print(f"✅ {test.__name__}")
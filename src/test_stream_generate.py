@@ -0,0 +1,39 @@
+import os
+import sys
+
+# Add the project root (one level above /src) to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.gemini_utils import FakeGeminiModel, FakeRateLimitError, stream_generate
+
+PROMPT = "Summarise what guests say about breakfast and the pool area."
+
+
+def test_chunks_make_up_the_full_answer():
+    model = FakeGeminiModel(delay=0.005, words=12)
+    timings = {}
+    chunks = list(stream_generate(model, PROMPT, timings))
+    assert len(chunks) > 1
+    assert "".join(chunks).strip() == model.generate_content(PROMPT).text
+    assert 0 <= timings["ttft_s"] <= timings["generation_s"]
+
+
+def test_mid_stream_error_reaches_the_caller():
+    model = FakeGeminiModel(fail_after_chunks=3)
+    timings = {}
+    received = []
+    try:
+        for chunk in stream_generate(model, PROMPT, timings):
+            received.append(chunk)
+    except FakeRateLimitError:
+        pass
+    else:
+        raise AssertionError("the mid-stream error was swallowed")
+    assert len(received) == 3
+    assert not timings  # timings are only filled when the stream completes
+
+
+if __name__ == "__main__":
+    for test in (test_chunks_make_up_the_full_answer, test_mid_stream_error_reaches_the_caller):
+        test()
+        print(f"✅ {test.__name__}")
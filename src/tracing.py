@@ -0,0 +1,175 @@
+import contextvars
+import json
+import os
+import threading
+import time
+
+TRACING_ENABLED = os.getenv("RAG_TRACING", "1") != "0"  # set RAG_TRACING=0 to turn spans into no-ops
+METRICS_DIR = "outputs/metrics"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_trace = contextvars.ContextVar("rag_trace", default=None)
+
+
+class StageMetrics:
+    """
+    Process-wide latency aggregates per pipeline stage (count, sum, max and
+    cumulative histogram buckets), exportable as Prometheus text or JSON.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            s = self._stages.get(stage)
+            if s is None:
+                s = self._stages[stage] = {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * len(self.buckets)}
+            s["count"] += 1
+            s["sum"] += seconds
+            s["max"] = max(s["max"], seconds)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    s["buckets"][i] += 1
+
+    def snapshot(self):
+        """
+        {stage: {count, sum_s, mean_s, max_s, buckets}} (buckets are cumulative, keyed by upper bound).
+        """
+        with self._lock:
+            return {
+                stage: {
+                    "count": s["count"],
+                    "sum_s": round(s["sum"], 6),
+                    "mean_s": round(s["sum"] / s["count"], 6),
+                    "max_s": round(s["max"], 6),
+                    "buckets": {str(b): n for b, n in zip(self.buckets, s["buckets"])},
+                }
+                for stage, s in sorted(self._stages.items())
+            }
+
+    def to_prometheus(self):
+        lines = [
+            "# HELP rag_stage_duration_seconds Duration of RAG pipeline stages.",
+            "# TYPE rag_stage_duration_seconds histogram",
+        ]
+        for stage, s in self.snapshot().items():
+            for bound, n in s["buckets"].items():
+                lines.append(f'rag_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {n}')
+            lines.append(f'rag_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {s["count"]}')
+            lines.append(f'rag_stage_duration_seconds_sum{{stage="{stage}"}} {s["sum_s"]}')
+            lines.append(f'rag_stage_duration_seconds_count{{stage="{stage}"}} {s["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+
+METRICS = StageMetrics()
+
+
+class Trace:
+    """
+    Span durations for one request (e.g. one question in the app). Repeated spans with
+    the same name are summed.
+    """
+
+    def __init__(self):
+        self.spans = {}
+        self.started = time.perf_counter()
+
+    def record(self, stage, seconds):
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+    def durations(self):
+        """
+        {"<stage>_s": seconds} plus total_s, ready to pass to SessionLog.append(**fields).
+        Empty when tracing is disabled.
+        """
+        if not TRACING_ENABLED:
+            return {}
+        out = {f"{stage}_s": round(seconds, 4) for stage, seconds in self.spans.items()}
+        out["total_s"] = round(time.perf_counter() - self.started, 4)
+        return out
+
+    def __enter__(self):
+        self._token = _current_trace.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _current_trace.reset(self._token)
+        return False
+
+
+class _Span:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(stage):
+    """
+    Times a block:  `with span("retrieve"): ...`. The duration goes to the active Trace
+    (if any) and to the process-wide METRICS. A shared no-op when tracing is disabled.
+    """
+    return _Span(stage) if TRACING_ENABLED else _NO_SPAN
+
+
+def record(stage, seconds):
+    """
+    Records a duration measured elsewhere (e.g. time-to-first-token from a stream).
+    """
+    if not TRACING_ENABLED:
+        return
+    METRICS.record(stage, seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(stage, seconds)
+
+
+def set_enabled(enabled):
+    global TRACING_ENABLED
+    TRACING_ENABLED = bool(enabled)
+
+
+def export_metrics(metrics_dir=METRICS_DIR, metrics=METRICS):
+    """
+    Writes rag_stages.prom (Prometheus text exposition format) and rag_stages.json into
+    `metrics_dir`, replacing each file atomically so dashboards never read a partial file.
+    """
+    os.makedirs(metrics_dir, exist_ok=True)
+    outputs = {
+        "rag_stages.prom": metrics.to_prometheus(),
+        "rag_stages.json": json.dumps({"updated": time.time(), "stages": metrics.snapshot()}, indent=2),
+    }
+    for name, content in outputs.items():
+        path = os.path.join(metrics_dir, name)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(f"{path}.tmp", path)
+    return metrics_dir
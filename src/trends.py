@@ -0,0 +1,158 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.sentiment import NEGATIVE_BELOW, POSITIVE_ABOVE
+
+TRENDS_DIR = "data/trends"
+LOW_RATING = 2.0
+PAGE_SIZE = 10_000
+FREQUENCIES = {"day": "D", "week": "W", "month": "MS"}
+KEYS = ["date", "property"]
+COUNTS = ["reviews", "rated", "rating_sum", "low_rating", "scored", "sentiment_sum", "negative", "positive"]
+
+
+def daily_aggregates(metadatas):
+    """
+    Per (day, property) sums over review metadata dicts (rows without a date are left out).
+    Only additive columns are kept, so aggregates from different batches can simply be added.
+    """
+    df = pd.DataFrame.from_records(list(metadatas), columns=["date", "property", "rating", "sentiment"])
+    dates = pd.to_datetime(df["date"], errors="coerce")
+    rating = pd.to_numeric(df["rating"], errors="coerce")
+    sentiment = pd.to_numeric(df["sentiment"], errors="coerce")
+    frame = pd.DataFrame({
+        "date": dates.dt.normalize(),
+        "property": df["property"].fillna("").astype(str),
+        "reviews": 1,
+        "rated": rating.notna().astype(np.int64),
+        "rating_sum": rating.fillna(0.0),
+        "low_rating": (rating <= LOW_RATING).astype(np.int64),
+        "scored": sentiment.notna().astype(np.int64),
+        "sentiment_sum": sentiment.fillna(0.0),
+        "negative": (sentiment < NEGATIVE_BELOW).astype(np.int64),
+        "positive": (sentiment > POSITIVE_ABOVE).astype(np.int64),
+    })
+    frame = frame[frame["date"].notna()]
+    return frame.groupby(KEYS, as_index=False)[COUNTS].sum()
+
+
+def trend_series(daily, freq="week", property_name=None, by_property=False):
+    """
+    Weekly/monthly (or daily) series from daily aggregates: review volume, average rating,
+    share of low ratings, average sentiment and negative/positive shares per period.
+    """
+    if property_name is not None:
+        daily = daily[daily["property"] == str(property_name)]
+    keys = [pd.Grouper(key="date", freq=FREQUENCIES.get(freq, freq))] + (["property"] if by_property else [])
+    grouped = daily.groupby(keys)[COUNTS].sum()
+    grouped = grouped[grouped["reviews"] > 0]
+    rated = grouped["rated"].replace(0, np.nan)
+    scored = grouped["scored"].replace(0, np.nan)
+    series = pd.DataFrame({
+        "reviews": grouped["reviews"],
+        "avg_rating": grouped["rating_sum"] / rated,
+        "low_rating_share": grouped["low_rating"] / rated,
+        "avg_sentiment": grouped["sentiment_sum"] / scored,
+        "negative_share": grouped["negative"] / scored,
+        "positive_share": grouped["positive"] / scored,
+    })
+    return series.round(3).reset_index()
+
+
+class TrendStore:
+    """
+    Daily aggregates for one collection, kept as a small CSV and updated incrementally:
+    ingest adds the metadata of upserted rows and subtracts what they (or deleted rows)
+    contributed before, so nothing is ever recomputed from the full collection.
+    """
+
+    def __init__(self, name, trends_dir=TRENDS_DIR):
+        self.path = os.path.join(trends_dir, f"{name}_daily.csv")
+        self.daily = daily_aggregates([])
+        if os.path.exists(self.path):
+            self.daily = pd.read_csv(self.path, parse_dates=["date"], keep_default_na=False,
+                                     dtype={"property": str})
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def apply(self, added=(), removed=()):
+        """
+        Adds the `added` metadata dicts and subtracts the `removed` ones.
+        """
+        added, removed = daily_aggregates(added), daily_aggregates(removed)
+        if added.empty and removed.empty:
+            return
+        removed[COUNTS] = -removed[COUNTS]
+        parts = [part for part in (self.daily, added, removed) if not part.empty]
+        merged = pd.concat(parts, ignore_index=True).groupby(KEYS, as_index=False)[COUNTS].sum()
+        self.daily = merged[merged["reviews"] > 0].reset_index(drop=True)
+
+    def rebuild(self, collection, page_size=PAGE_SIZE):
+        """
+        Recomputes the aggregates from every review stored in `collection` (paged).
+        """
+        self.daily = daily_aggregates([])
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            self.apply(added=[m or {} for m in page["metadatas"]])
+            offset += len(page["ids"])
+        return self
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.daily.to_csv(f"{self.path}.tmp", index=False, date_format="%Y-%m-%d")
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def series(self, freq="week", property_name=None, by_property=False):
+        return trend_series(self.daily, freq, property_name, by_property)
+
+
+def open_trend_store(collection, trends_dir=TRENDS_DIR):
+    """
+    TrendStore for `collection`, backfilled from the collection the first time it is opened
+    (call it before changing the collection, so later deltas apply to matching totals).
+    """
+    store = TrendStore(collection.name, trends_dir)
+    if not store.exists():
+        store.rebuild(collection).save()
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Review volume, rating and sentiment trends per period.")
+    parser.add_argument("--freq", choices=sorted(FREQUENCIES), default="week")
+    parser.add_argument("--property", default=None, help="Only reviews for this property.")
+    parser.add_argument("--by-property", action="store_true", help="One series per property.")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the aggregates from the collection.")
+    args = parser.parse_args()
+
+    from src.embedding_utils import create_or_load_chroma
+    collection = create_or_load_chroma()
+    store = open_trend_store(collection)
+    if args.rebuild:
+        store.rebuild(collection).save()
+
+    started = time.perf_counter()
+    series = store.series(args.freq, args.property, args.by_property)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    os.makedirs("outputs", exist_ok=True)
+    output_file = f"outputs/trends_{args.freq}.csv"
+    series.to_csv(output_file, index=False)
+    print(series.tail(12).to_string(index=False))
+    print(f"\n📈 {len(series)} periods ({args.freq}) from {len(store.daily):,} daily aggregates in {elapsed_ms:.1f} ms")
+    print(f"✅ Saved trends to: {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+from src.embedding_utils import get_collection_version, get_embedder
+from src.quantization import dequantize, quantize
+
+INDEX_DIR = "data/vector_index"
+INDEX_QUANTIZATION = os.getenv("VECTOR_INDEX_QUANTIZATION", "float32")  # float32 | float16 | int8
+BUILD_PAGE_SIZE = 10_000
+SEARCH_BLOCK_ROWS = 65_536
+
+
+class NumpyIndex:
+    """
+    In-process exact vector index: unit-normalised embeddings in one contiguous
+    memory-mapped matrix, scored with a dot product and top-k'd with argpartition.
+    The matrix can be stored as float32, float16 or int8 (per-row scales); blocks are
+    dequantized on the fly while scanning.
+    Exposes a Chroma-style query() so retrieve_similar() works against it unchanged.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.name = self.meta["name"]
+        self.version = self.meta["version"]
+        rows, dim = self.meta["rows"], self.meta["dim"]
+        self.quantization = self.meta.get("quantization", "float32")
+        self.matrix = (
+            np.memmap(os.path.join(path, "embeddings.bin"), dtype=self.quantization, mode="r", shape=(rows, dim))
+            if rows else np.empty((0, dim), dtype=self.quantization)
+        )
+        scales_path = os.path.join(path, "scales.npy")
+        self.scales = np.load(scales_path, mmap_mode="r") if os.path.exists(scales_path) else None
+        rows_df = pd.read_parquet(os.path.join(path, "rows.parquet"))
+        self.ids = rows_df["id"].tolist()
+        self.documents = rows_df["document"].tolist()
+        self._build_filter_indexes(rows_df)
+
+    def _build_filter_indexes(self, rows_df):
+        """
+        Precomputed filter indexes so narrow filters only touch matching rows:
+        - rating / property: value -> sorted row numbers (bucket per distinct value)
+        - date: row numbers sorted by date_num, so a date range is one searchsorted slice
+        """
+        self.rating_buckets = {}
+        self.property_buckets = {}
+        if "rating" in rows_df.columns:
+            ratings = rows_df["rating"].to_numpy(dtype=np.float64)
+            for value in np.unique(ratings[~np.isnan(ratings)]):
+                self.rating_buckets[float(value)] = np.flatnonzero(ratings == value)
+        if "property" in rows_df.columns:
+            for value, rows in rows_df.groupby("property", dropna=True).indices.items():
+                self.property_buckets[str(value)] = np.sort(rows)
+        date_num = rows_df["date_num"].to_numpy(dtype=np.float64) if "date_num" in rows_df.columns else np.empty(0)
+        dated = np.flatnonzero(~np.isnan(date_num))
+        order = np.argsort(date_num[dated], kind="stable")
+        self.date_rows = dated[order]
+        self.date_sorted = date_num[dated][order]
+
+    def candidate_rows(self, where):
+        """
+        Row numbers matching a `where` clause from embedding_utils.build_where(), or None
+        when there is no filter (search everything).
+        """
+        if not where:
+            return None
+        clauses = where["$and"] if "$and" in where else [where]
+        ranges = {"rating": [-np.inf, np.inf], "date_num": [-np.inf, np.inf]}
+        property_name = None
+        for clause in clauses:
+            (field, cond), = clause.items()
+            cond = cond if isinstance(cond, dict) else {"$eq": cond}
+            for op, value in cond.items():
+                if field == "property" and op == "$eq":
+                    property_name = str(value)
+                elif field in ranges and op in ("$gte", "$lte", "$eq"):
+                    if op in ("$gte", "$eq"):
+                        ranges[field][0] = max(ranges[field][0], value)
+                    if op in ("$lte", "$eq"):
+                        ranges[field][1] = min(ranges[field][1], value)
+                else:
+                    raise ValueError(f"Unsupported filter for NumPy index: {field} {op}")
+
+        selected = None
+
+        def narrow(rows):
+            return rows if selected is None else np.intersect1d(selected, rows, assume_unique=True)
+
+        if property_name is not None:
+            selected = narrow(self.property_buckets.get(property_name, np.empty(0, dtype=np.int64)))
+        low, high = ranges["rating"]
+        if (low, high) != (-np.inf, np.inf):
+            buckets = [rows for value, rows in self.rating_buckets.items() if low <= value <= high]
+            selected = narrow(np.sort(np.concatenate(buckets)) if buckets else np.empty(0, dtype=np.int64))
+        low, high = ranges["date_num"]
+        if (low, high) != (-np.inf, np.inf):
+            lo = np.searchsorted(self.date_sorted, low, side="left")
+            hi = np.searchsorted(self.date_sorted, high, side="right")
+            selected = narrow(np.sort(self.date_rows[lo:hi]))
+        return selected
+
+    # --- building ---
+
+    @classmethod
+    def build_from_collection(cls, collection, path=None, page_size=BUILD_PAGE_SIZE,
+                              quantization=INDEX_QUANTIZATION, replacing=None):
+        """
+        Copies every stored embedding out of a Chroma collection into a new index at `path`.
+        `replacing` (the index currently loaded from `path`, if any) is closed just before the
+        new files are swapped in.
+        """
+        path = path or os.path.join(INDEX_DIR, collection.name)
+        tmp_path = f"{path}.building"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        total = collection.count()
+        matrix, dim = None, 0
+        ids, documents, scales, metadatas = [], [], [], []
+        offset = 0
+        while offset < total:
+            page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            vectors = np.asarray(page["embeddings"], dtype=np.float32)
+            if matrix is None:
+                dim = vectors.shape[1]
+                matrix = np.memmap(os.path.join(tmp_path, "embeddings.bin"), dtype=quantization,
+                                   mode="w+", shape=(total, dim))
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            unit = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+            data, page_scales = quantize(unit, quantization)
+            matrix[offset:offset + len(vectors)] = data
+            if page_scales is not None:
+                scales.append(page_scales)
+            ids.extend(page["ids"])
+            documents.extend(page["documents"])
+            metadatas.extend(m or {} for m in page["metadatas"])
+            offset += len(page["ids"])
+        if matrix is not None:
+            matrix.flush()
+            del matrix
+
+        if scales:
+            np.save(os.path.join(tmp_path, "scales.npy"), np.concatenate(scales))
+        meta_df = pd.DataFrame(metadatas, index=range(len(ids)))
+        rows_df = pd.DataFrame({
+            "id": ids,
+            "document": documents,
+            "rating": pd.to_numeric(meta_df.get("rating"), errors="coerce") if "rating" in meta_df else np.nan,
+            "date_num": pd.to_numeric(meta_df.get("date_num"), errors="coerce") if "date_num" in meta_df else np.nan,
+            "property": meta_df["property"] if "property" in meta_df else None,
+        })
+        rows_df.to_parquet(os.path.join(tmp_path, "rows.parquet"), index=False)
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "name": collection.name,
+                "version": get_collection_version(collection),
+                "rows": len(ids),
+                "dim": dim,
+                "quantization": quantization,
+            }, f)
+        if replacing is not None:
+            replacing.close()
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        return cls(path)
+
+    def close(self):
+        """
+        Releases the memory-mapped files (Windows can't delete or replace a file that is still
+        mapped). The index is empty afterwards.
+        """
+        self.matrix = np.empty((0, self.meta["dim"]), dtype=self.quantization)
+        self.scales = None
+        self.ids, self.documents = [], []
+
+    # --- searching ---
+
+    def count(self):
+        return len(self.ids)
+
+    def _block(self, start, stop, candidates=None):
+        if candidates is None:
+            rows = slice(start, stop)
+        else:
+            rows = candidates[start:stop]
+        scales = None if self.scales is None else self.scales[rows]
+        return dequantize(self.matrix[rows], scales)
+
+    def search(self, query_vectors, k=10, block_rows=SEARCH_BLOCK_ROWS, candidates=None):
+        """
+        Exact top-k by cosine similarity for a batch of queries.
+        Returns (indices, scores), each of shape (n_queries, min(k, rows)), best first.
+        The matrix is scanned in blocks so memory stays bounded for very large indexes;
+        with `candidates` (row numbers from candidate_rows()) only those rows are scored.
+        """
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = np.divide(queries, norms, out=np.zeros_like(queries), where=norms > 0)
+        rows = len(self.ids) if candidates is None else len(candidates)
+        k = min(k, rows)
+        if k == 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+
+        best_idx = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, rows, block_rows):
+            block = self._block(start, start + block_rows, candidates)
+            scores = queries @ block.T
+            kk = min(k, scores.shape[1])
+            part = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+            best_idx = np.hstack([best_idx, part + start])
+            best_scores = np.hstack([best_scores, np.take_along_axis(scores, part, axis=1)])
+            if best_idx.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_idx = np.take_along_axis(best_idx, keep, axis=1)
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_idx = np.take_along_axis(best_idx, order, axis=1)
+        if candidates is not None:
+            best_idx = candidates[best_idx]
+        return best_idx, np.take_along_axis(best_scores, order, axis=1)
+
+    def query(self, query_texts=None, query_embeddings=None, n_results=10, where=None,
+              include=("documents", "distances")):
+        """
+        Chroma-compatible subset of Collection.query(): ids/documents/distances per query,
+        with cosine distance (1 - similarity), plus the stored (unit) vectors of the hits when
+        "embeddings" is in `include`. `where` takes the clauses built by
+        embedding_utils.build_where() and is applied before scoring.
+        """
+        if query_embeddings is None:
+            query_embeddings = get_embedder().embed(query_texts)
+        indices, scores = self.search(query_embeddings, n_results, candidates=self.candidate_rows(where))
+        results = {
+            "ids": [[self.ids[i] for i in row] for row in indices],
+            "documents": [[self.documents[i] for i in row] for row in indices],
+            "distances": (1 - scores).tolist(),
+        }
+        if "embeddings" in include:
+            results["embeddings"] = [self._block(0, len(row), row) for row in indices]
+        return results
+
+
+_INDEXES = {}
+_BUILD_LOCKS = {}
+_BUILD_LOCKS_GUARD = threading.Lock()
+
+
+def _build_lock(path):
+    with _BUILD_LOCKS_GUARD:
+        return _BUILD_LOCKS.setdefault(path, threading.Lock())
+
+
+def _is_current(index, version):
+    return index is not None and index.version == version and index.quantization == INDEX_QUANTIZATION
+
+
+def get_numpy_index(collection, index_dir=INDEX_DIR):
+    """
+    NumPy index mirroring `collection`, loaded once per process and rebuilt whenever the
+    collection version moves on (i.e. after new reviews were embedded). Loads and rebuilds
+    are serialised per index path, so concurrent callers never build into <path>.building at once.
+    """
+    path = os.path.join(index_dir, collection.name)
+    index = _INDEXES.get(path)
+    if _is_current(index, get_collection_version(collection)):
+        return index
+    with _build_lock(path):
+        # Re-checked under the lock: another caller may have rebuilt it while this one waited
+        version = get_collection_version(collection)
+        index = _INDEXES.get(path)
+        if index is None and os.path.exists(os.path.join(path, "meta.json")):
+            index = NumpyIndex(path)
+        if not _is_current(index, version):
+            print(f"🧮 Building NumPy index for '{collection.name}' (version {version})")
+            index = NumpyIndex.build_from_collection(collection, path, replacing=index)
+        _INDEXES[path] = index
+        return index
@@ -0,0 +1,163 @@
+import numpy as np
+
+from src.quantization import dequantize
+
+STATS_CHUNK_ROWS = 10_000
+SAMPLE_SIZE = 5_000
+DUPLICATE_THRESHOLD = 0.95
+NORM_BINS = np.linspace(0.0, 2.0, 201)
+SIMILARITY_BINS = np.linspace(-1.0, 1.0, 401)
+
+
+# ------------------------------------------------------------
+# Sources: stored vectors in chunks (never the embedding model)
+# ------------------------------------------------------------
+def iter_collection_vectors(collection, chunk_rows=STATS_CHUNK_ROWS):
+    """
+    Yields (ids, float32 vectors) pages of the embeddings already stored in a Chroma collection.
+    """
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings"], limit=chunk_rows, offset=offset)
+        if not page["ids"]:
+            return
+        yield page["ids"], np.asarray(page["embeddings"], dtype=np.float32)
+        offset += len(page["ids"])
+
+
+def iter_cache_vectors(cache, chunk_rows=STATS_CHUNK_ROWS):
+    """
+    Yields (content hashes, float32 vectors) slices of a saved EmbeddingCache, read segment
+    by segment from its memory-mapped arrays (only one chunk is dequantized at a time).
+    """
+    for hashes, data, scales in cache.segments():
+        for start in range(0, len(data), chunk_rows):
+            stop = start + chunk_rows
+            chunk_scales = None if scales is None else scales[start:stop]
+            yield [h.decode() for h in hashes[start:stop]], dequantize(data[start:stop], chunk_scales)
+
+
+# ------------------------------------------------------------
+# Streaming statistics
+# ------------------------------------------------------------
+def _quantile_from_histogram(counts, bins, q):
+    cumulative = np.cumsum(counts)
+    if not cumulative.size or cumulative[-1] == 0:
+        return float("nan")
+    i = int(np.searchsorted(cumulative, q * cumulative[-1]))
+    return float((bins[i] + bins[i + 1]) / 2)
+
+
+def _vector_digests(unit):
+    """
+    64-bit digest per row of the vector rounded to 3 decimals (exact-duplicate detection).
+    """
+    rounded = np.ascontiguousarray(np.round(unit, 3).astype(np.float32) + 0.0)  # +0.0 folds -0.0 into 0.0
+    return np.array([hash(row.tobytes()) for row in rounded], dtype=np.int64)
+
+
+def vector_health_stats(chunks, sample_size=SAMPLE_SIZE, duplicate_threshold=DUPLICATE_THRESHOLD,
+                        block_rows=1_000, seed=42):
+    """
+    One pass over (ids, vectors) chunks from iter_collection_vectors()/iter_cache_vectors().
+    Memory stays bounded by the chunk size, the reservoir sample (`sample_size` vectors)
+    and one 8-byte digest per row:
+    - norm distribution: streaming histogram -> mean/std/min/max/percentiles, zero-vector count
+    - exact duplicates over the whole scan (rounded-vector digests)
+    - pairwise cosine similarity over a uniform reservoir sample, scored in blocks
+    - near-duplicates (cosine >= `duplicate_threshold`) within the sample, extrapolated to the collection
+    Returns (report dict, norm histogram DataFrame-ready dict).
+    """
+    rng = np.random.default_rng(seed)
+    norm_counts = np.zeros(len(NORM_BINS) - 1, dtype=np.int64)
+    total, dim = 0, None
+    norm_sum = norm_sq = 0.0
+    norm_min, norm_max = np.inf, -np.inf
+    zero_vectors = 0
+    digests = []
+    sample, sample_ids = None, []
+
+    for ids, vectors in chunks:
+        if not len(vectors):
+            continue
+        if dim is None:
+            dim = vectors.shape[1]
+            sample = np.empty((sample_size, dim), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1)
+        norm_counts += np.histogram(np.clip(norms, NORM_BINS[0], NORM_BINS[-1]), NORM_BINS)[0]
+        norm_sum += float(norms.sum())
+        norm_sq += float(np.square(norms, dtype=np.float64).sum())
+        norm_min, norm_max = min(norm_min, float(norms.min())), max(norm_max, float(norms.max()))
+        zero_vectors += int((norms == 0).sum())
+        unit = np.divide(vectors, norms[:, None], out=np.zeros_like(vectors), where=norms[:, None] > 0)
+        digests.append(_vector_digests(unit))
+
+        # Reservoir sampling (Algorithm R), vectorised per chunk
+        positions = total + np.arange(len(unit))
+        fill = positions < sample_size
+        for row in np.flatnonzero(fill):
+            sample[positions[row]] = unit[row]
+            sample_ids.append(ids[row])
+        if (~fill).any():
+            slots = rng.integers(0, positions[~fill] + 1)
+            for row, slot in zip(np.flatnonzero(~fill), slots):
+                if slot < sample_size:
+                    sample[slot] = unit[row]
+                    sample_ids[slot] = ids[row]
+        total += len(unit)
+
+    if not total:
+        return {"vectors": 0}, {"bin_low": [], "bin_high": [], "count": []}
+
+    sample = sample[:min(total, sample_size)]
+    n = len(sample)
+    sim_counts = np.zeros(len(SIMILARITY_BINS) - 1, dtype=np.int64)
+    sim_sum = sim_sq = 0.0
+    near_pairs = 0
+    has_near = np.zeros(n, dtype=bool)
+    for start in range(0, n, block_rows):
+        block = sample[start:start + block_rows]
+        sims = block @ sample.T
+        # upper triangle only: pairs (i, j) with j > i
+        mask = np.arange(n)[None, :] > (start + np.arange(len(block)))[:, None]
+        values = sims[mask]
+        sim_counts += np.histogram(np.clip(values, -1.0, 1.0), SIMILARITY_BINS)[0]
+        sim_sum += float(values.sum())
+        sim_sq += float(np.square(values, dtype=np.float64).sum())
+        near = (sims >= duplicate_threshold) & mask
+        near_pairs += int(near.sum())
+        rows, cols = np.nonzero(near)
+        has_near[rows + start] = True
+        has_near[cols] = True
+
+    pairs = n * (n - 1) // 2
+    all_digests = np.concatenate(digests)
+    exact_duplicates = int(len(all_digests) - len(np.unique(all_digests)))
+    norm_mean = norm_sum / total
+    sim_mean = sim_sum / pairs if pairs else float("nan")
+    report = {
+        "vectors": total,
+        "dimension": dim,
+        "norm_mean": round(norm_mean, 4),
+        "norm_std": round(float(np.sqrt(max(norm_sq / total - norm_mean ** 2, 0.0))), 4),
+        "norm_min": round(norm_min, 4),
+        "norm_max": round(norm_max, 4),
+        "norm_p01": round(_quantile_from_histogram(norm_counts, NORM_BINS, 0.01), 3),
+        "norm_p50": round(_quantile_from_histogram(norm_counts, NORM_BINS, 0.50), 3),
+        "norm_p99": round(_quantile_from_histogram(norm_counts, NORM_BINS, 0.99), 3),
+        "zero_vectors": zero_vectors,
+        "exact_duplicate_vectors": exact_duplicates,
+        "sample_size": n,
+        "sampled_pairs": pairs,
+        "avg_similarity": round(sim_mean, 4),
+        "std_similarity": round(float(np.sqrt(max(sim_sq / pairs - sim_mean ** 2, 0.0))), 4) if pairs else float("nan"),
+        "similarity_p05": round(_quantile_from_histogram(sim_counts, SIMILARITY_BINS, 0.05), 3),
+        "similarity_p50": round(_quantile_from_histogram(sim_counts, SIMILARITY_BINS, 0.50), 3),
+        "similarity_p95": round(_quantile_from_histogram(sim_counts, SIMILARITY_BINS, 0.95), 3),
+        "duplicate_threshold": duplicate_threshold,
+        "near_duplicate_pairs_in_sample": near_pairs,
+        "near_duplicate_rows_in_sample": int(has_near.sum()),
+        "est_near_duplicate_rows": int(round(has_near.mean() * total)),
+    }
+    histogram = {"bin_low": NORM_BINS[:-1].round(3), "bin_high": NORM_BINS[1:].round(3), "count": norm_counts}
+    return report, histogram
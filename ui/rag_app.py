@@ -1,14 +1,34 @@
 import os
 import sys
+import shutil
+import threading
+import time
 import streamlit as st
 import pandas as pd
-import google.generativeai as genai
-from datetime import datetime
 from dotenv import load_dotenv
 
 # --- Make sure src folder is visible ---
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from src.embedding_utils import create_or_load_chroma, load_and_embed_csv, retrieve_similar
+from src.embedding_utils import (
+    create_or_load_chroma,
+    get_collection_version,
+    get_embedder,
+    retrieve_similar_with_vectors,
+    stream_embed_csv,
+    warm_up,
+)
+from src.context_builder import build_context
+from src.gemini_utils import (
+    FakeGeminiModel,
+    get_gemini_model,
+    list_available_models,
+    select_model_name,
+    stream_generate,
+)
+from src.semantic_cache import SemanticCache
+from src.sharding import SHARD_BY_PROPERTY, open_sharded_collection, read_registry, shard_embed_csv
+from src.session_log import SessionLog
+from src.tracing import METRICS, TRACING_ENABLED, Trace, export_metrics, record, span
 
 # ============================================================
 # 1. PAGE CONFIGURATION
@@ -22,30 +42,79 @@ st.caption("AI-powered feedback intelligence using ChromaDB + Gemini 2.5 🚀")
 # ============================================================
 load_dotenv()
 api_key = os.getenv("GOOGLE_API_KEY")
-if not api_key:
+USE_FAKE_MODEL = os.getenv("GEMINI_FAKE_MODEL") == "1"  # local stand-in model, no API calls
+if not api_key and not USE_FAKE_MODEL:
     st.error("❌ Google API key not found in .env.")
     st.stop()
-genai.configure(api_key=api_key)
-
-# Auto-select current Gemini 2.5 model
-available_models = [m.name for m in genai.list_models()]
-preferred_models = [
-    "models/gemini-2.5-flash",
-    "models/gemini-2.5-pro",
-    "models/gemini-flash-latest",
-    "models/gemini-pro-latest",
-]
-MODEL_NAME = next((m for m in preferred_models if m in available_models), None)
+
+# ============================================================
+# 3. CACHED RESOURCES (built once per server process)
+# ============================================================
+@st.cache_resource(show_spinner=False)
+def load_resources(api_key, use_fake_model=False):
+    """
+    Chroma collection, shared embedder and Gemini model handle. Model discovery is cached
+    on disk with a TTL (see gemini_utils), so reruns never call genai.list_models().
+    """
+    if use_fake_model:
+        return create_or_load_chroma(), get_embedder(), "fake-gemini", FakeGeminiModel(delay=0.02)
+    model_name = select_model_name(list_available_models(api_key))
+    model = get_gemini_model(api_key, model_name) if model_name else None
+    return create_or_load_chroma(), get_embedder(), model_name, model
+
+
+@st.cache_resource(show_spinner=False)
+def load_sharded_collection(properties):
+    """
+    Fan-out view over the given properties' shards (all shards when empty), opened once per
+    selection. Cleared after an ingest, which can add shards.
+    """
+    return open_sharded_collection(list(properties) or None)
+
+
+@st.cache_resource(show_spinner=False)
+def load_semantic_cache():
+    """
+    One persistent query/answer cache per server process.
+    """
+    return SemanticCache()
+
+
+@st.cache_resource(show_spinner=False)
+def start_warm_up():
+    """
+    Loads the embedding model in the background once per process so the first query is fast.
+    """
+    thread = threading.Thread(target=warm_up, name="embedder-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+@st.cache_resource(show_spinner=False)
+def load_session_log():
+    """
+    Append-only SQLite session log (imports an existing session_log.csv on first run).
+    """
+    return SessionLog()
+
+
+@st.cache_data(show_spinner=False)
+def export_session_log(row_count):
+    """
+    Streams the log to a CSV file for download; re-exported only when new rows were added.
+    """
+    return session_log.export_csv("outputs/session_log_export.csv")
+
+
+start_warm_up()
+collection, embedder, MODEL_NAME, model = load_resources(api_key, USE_FAKE_MODEL)
+semantic_cache = load_semantic_cache()
 if not MODEL_NAME:
     st.error("❌ No Gemini model found.")
     st.stop()
 
-# ============================================================
-# 3. INITIALIZE DATABASE + LOG FILE
-# ============================================================
-collection = create_or_load_chroma()
 os.makedirs("outputs", exist_ok=True)
-LOG_PATH = "outputs/session_log.csv"
+session_log = load_session_log()
 
 # ============================================================
 # 4. STEP 1 – UPLOAD CSV
@@ -55,19 +124,40 @@ uploaded_file = st.file_uploader("Upload your `customer_reviews.csv`", type=["cs
 
 if uploaded_file is not None:
     csv_path = os.path.join("data", uploaded_file.name)
-    os.makedirs("data", exist_ok=True)
-    with open(csv_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
+    upload_key = uploaded_file.file_id  # new for every upload, even of an edited file with the same name and size
+    if st.session_state.get("upload_key") != upload_key:
+        # Copy in 1 MB blocks (once per upload, so reruns don't touch the file and resume still works)
+        os.makedirs("data", exist_ok=True)
+        uploaded_file.seek(0)
+        with open(csv_path, "wb") as f:
+            shutil.copyfileobj(uploaded_file, f, length=1 << 20)
+        st.session_state["upload_key"] = upload_key
     st.session_state["csv_path"] = csv_path
     st.success(f"✅ File `{uploaded_file.name}` uploaded successfully.")
 
     if st.button("📊 Embed Uploaded Dataset"):
         try:
-            df, text_col = load_and_embed_csv(csv_path, collection)
+            status = st.empty()
+            show_progress = lambda rows: status.caption(f"⏳ {rows:,} rows processed…")
+            if SHARD_BY_PROPERTY:
+                # One collection per property (see src/sharding.py)
+                summary = shard_embed_csv(csv_path, progress=show_progress)
+                load_sharded_collection.clear()
+                semantic_cache.invalidate(get_collection_version(load_sharded_collection(())))
+                st.caption(f"🏨 Routed into {len(summary['shards'])} property shards")
+            else:
+                summary = stream_embed_csv(csv_path, collection, progress=show_progress)
+                semantic_cache.invalidate(get_collection_version(collection))  # drop answers built on old data
+            text_col = summary["text_col"]
             st.session_state["text_col"] = text_col
-            st.success(f"✅ {len(df)} rows embedded.")
+            st.success(f"✅ {summary['rows']:,} rows processed ({summary['embedded']:,} newly embedded).")
+            if summary.get("duplicates"):
+                st.caption(
+                    f"🪞 {summary['duplicates']:,} near-duplicate reviews linked to canonical ids "
+                    f"({summary['embed_calls_saved']:,} embed calls saved)"
+                )
             st.caption(f"Detected text column: **{text_col}**")
-            st.dataframe(df.head())
+            st.dataframe(pd.read_csv(csv_path, nrows=5))
         except Exception as e:
             st.error(f"⚠️ Embedding failed: {e}")
 else:
@@ -79,67 +169,145 @@ else:
 st.markdown("---")
 st.markdown("### 💬 Step 2: Ask a Question")
 query = st.text_input("Type your question based on the dataset 👇")
+stream_answer = st.checkbox("⚡ Stream the answer as it is generated", value=True)
+
+with st.expander("🎚️ Filter reviews (rating / date)"):
+    use_filters = st.checkbox("Only search reviews matching these filters", value=False)
+    rating_range = st.slider("Star rating", 1, 5, (1, 5))
+    date_range = st.date_input("Review date range", value=())
+    selected_properties = []
+    if SHARD_BY_PROPERTY:
+        selected_properties = st.multiselect("Properties (all when empty)", sorted(read_registry()))
+filters = {}
+if use_filters:
+    filters = {"min_rating": rating_range[0], "max_rating": rating_range[1]}
+    if len(date_range) == 2:
+        filters.update(start_date=date_range[0], end_date=date_range[1])
+# Sharded stores search the selected properties' shards in parallel (a single property is one shard)
+search_collection = load_sharded_collection(tuple(sorted(selected_properties))) if SHARD_BY_PROPERTY else collection
+use_semantic_cache = not filters and not selected_properties
 
 if st.button("🚀 Analyze"):
     if not query.strip():
         st.warning("Please enter a question before analyzing.")
     else:
-        try:
-            with st.spinner("🔍 Retrieving relevant reviews..."):
-                similar_docs = retrieve_similar(collection, query)
-
-            if not similar_docs:
-                st.info("No relevant results found.")
-            else:
-                st.success("✅ Top reviews retrieved.")
-                st.markdown("### 🔎 Top Retrieved Reviews (Expandable)")
-                for i, doc in enumerate(similar_docs[:5], 1):
-                    with st.expander(f"Review {i}"):
-                        st.write(doc)
-
-                # ====================================================
-                # 6. HYBRID RAG – GEMINI ANALYSIS
-                # ====================================================
-                st.markdown("---")
-                st.markdown("### 🤖 AI-Generated Insights (Gemini 2.5)")
-                context = "\n\n".join(similar_docs[:10])
-                prompt = f"""
-                You are an AI analyst specializing in hospitality feedback.
-                Summarize key insights and actionable recommendations based on the text below.
-                Keep it concise (150–200 words) and professional.
-
-                === Customer Reviews ===
-                {context}
-
-                === Query ===
-                {query}
-                """
-
-                try:
-                    model = genai.GenerativeModel(MODEL_NAME)
-                    response = model.generate_content(prompt)
-                    ai_text = response.text.strip() if hasattr(response, "text") else ""
-
-                    if ai_text:
-                        st.markdown(ai_text)
-
-                        # Save to session log
-                        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        entry = pd.DataFrame(
-                            [[timestamp, query, ai_text]],
-                            columns=["timestamp", "query", "response"]
+        with Trace() as trace:
+            try:
+                version = get_collection_version(search_collection)
+                # The semantic cache only holds unfiltered answers
+                with span("cache_lookup"):
+                    cached = semantic_cache.lookup(query, version) if use_semantic_cache else None
+                doc_vectors = query_vector = None
+                if cached:
+                    similar_docs = cached["docs"]
+                    st.info(
+                        f"⚡ Served from semantic cache — matched “{cached['query']}” "
+                        f"(similarity {cached['similarity']:.2f})"
+                    )
+                else:
+                    with st.spinner("🔍 Retrieving relevant reviews..."):
+                        similar_docs, doc_vectors, query_vector = retrieve_similar_with_vectors(
+                            search_collection, query, **filters
                         )
-                        if os.path.exists(LOG_PATH):
-                            entry.to_csv(LOG_PATH, mode="a", header=False, index=False)
+
+                if not similar_docs:
+                    st.info("No relevant results found.")
+                else:
+                    st.success("✅ Top reviews retrieved.")
+                    st.markdown("### 🔎 Top Retrieved Reviews (Expandable)")
+                    for i, doc in enumerate(similar_docs[:5], 1):
+                        with st.expander(f"Review {i}"):
+                            st.write(doc)
+
+                    # ====================================================
+                    # 6. HYBRID RAG – GEMINI ANALYSIS
+                    # ====================================================
+                    st.markdown("---")
+                    st.markdown("### 🤖 AI-Generated Insights (Gemini 2.5)")
+                    context = None
+                    if not cached:
+                        # MMR rerank + near-duplicate drop + token budget (see src/context_builder.py)
+                        with span("prompt"):
+                            context = build_context(query, similar_docs, doc_vectors, query_vector)
+                        prompt = context["prompt"]
+
+                    try:
+                        timings = {}
+                        if cached:
+                            ai_text = cached["answer"]
+                            timings["ttft_s"] = timings["generation_s"] = 0.0
+                            st.markdown(ai_text)
+                        elif stream_answer:
+                            # Render tokens as they arrive; timings are filled once the stream ends
+                            streamed = st.write_stream(stream_generate(model, prompt, timings))
+                            ai_text = (streamed if isinstance(streamed, str) else "".join(streamed)).strip()
                         else:
-                            entry.to_csv(LOG_PATH, index=False)
-                        st.success("💾 Response saved to session log.")
-                    else:
-                        st.info("Gemini returned no text.")
-                except Exception as e:
-                    st.error(f"Gemini generation failed: {e}")
-        except Exception as e:
-            st.error(f"⚠️ Retrieval or analysis failed: {e}")
+                            started = time.perf_counter()
+                            response = model.generate_content(prompt)
+                            ai_text = response.text.strip() if hasattr(response, "text") else ""
+                            timings["generation_s"] = round(time.perf_counter() - started, 3)
+                            timings["ttft_s"] = timings["generation_s"]
+                            if ai_text:
+                                st.markdown(ai_text)
+
+                        if ai_text:
+                            if not cached:
+                                record("ttft", timings["ttft_s"])
+                                record("generation", timings["generation_s"])
+                                if use_semantic_cache:
+                                    semantic_cache.store(query, version, similar_docs, ai_text)
+                                st.caption(
+                                    f"⏱️ First token after {timings['ttft_s']:.2f}s · "
+                                    f"full answer in {timings['generation_s']:.2f}s"
+                                )
+                                st.caption(
+                                    f"🧾 Prompt ~{context['prompt_tokens']:,} tokens from {len(context['docs'])} reviews · "
+                                    f"{context['tokens_saved']:,} tokens saved "
+                                    f"({context['duplicates_dropped']} near-duplicates, "
+                                    f"{context['over_budget_dropped']} over budget dropped)"
+                                )
+
+                            # Save to session log (once the full answer is in), with per-stage durations
+                            # and prompt token counts (kept apart: last_trace is plotted as seconds)
+                            stage_timings = {**timings, **trace.durations()}
+                            token_counts = {}
+                            if context:
+                                token_counts = {
+                                    "prompt_tokens": context["prompt_tokens"],
+                                    "prompt_tokens_saved": context["tokens_saved"],
+                                }
+                            session_log.append(query, ai_text, **stage_timings, **token_counts)
+                            st.session_state["last_trace"] = stage_timings
+                            if TRACING_ENABLED:
+                                export_metrics()
+                            st.success("💾 Response saved to session log.")
+                        else:
+                            st.info("Gemini returned no text.")
+                    except Exception as e:
+                        st.error(f"Gemini generation failed: {e}")
+            except Exception as e:
+                st.error(f"⚠️ Retrieval or analysis failed: {e}")
+
+cache_stats = semantic_cache.stats()
+st.caption(
+    f"🧠 Semantic cache: {cache_stats['entries']} answers stored · "
+    f"hit rate {cache_stats['hit_rate']:.0%} this session ({cache_stats['hits']} hits / {cache_stats['misses']} misses)"
+)
+
+if st.sidebar.checkbox("🩺 Show diagnostics", value=False):
+    with st.expander("🩺 Pipeline diagnostics", expanded=True):
+        if not TRACING_ENABLED:
+            st.info("Tracing is disabled (RAG_TRACING=0).")
+        last_trace = st.session_state.get("last_trace")
+        if last_trace:
+            st.markdown("**Last question** (seconds per stage)")
+            st.bar_chart(pd.Series({k[:-2]: v for k, v in last_trace.items() if k != "total_s"}, name="seconds"))
+            st.caption(f"Total: {last_trace.get('total_s', 0):.3f}s")
+        stage_stats = METRICS.snapshot()
+        if stage_stats:
+            st.markdown("**All questions this process**")
+            st.dataframe(pd.DataFrame(stage_stats).T.drop(columns="buckets"))
+            st.caption("Exported to outputs/metrics/rag_stages.prom and rag_stages.json")
 
 # ============================================================
 # 7. SESSION LOG TOOLS
@@ -147,15 +315,16 @@ if st.button("🚀 Analyze"):
 st.markdown("---")
 st.markdown("### 📜 Session Log Viewer & Export")
 
-if os.path.exists(LOG_PATH):
-    df_log = pd.read_csv(LOG_PATH)
-    st.dataframe(df_log.tail(10))
-    st.download_button(
-        label="⬇️ Download Full Log as CSV",
-        data=df_log.to_csv(index=False),
-        file_name="session_log.csv",
-        mime="text/csv"
-    )
+log_rows = session_log.count()
+if log_rows:
+    st.dataframe(session_log.tail(10))
+    with open(export_session_log(log_rows), "rb") as export_file:
+        st.download_button(
+            label="⬇️ Download Full Log as CSV",
+            data=export_file,
+            file_name="session_log.csv",
+            mime="text/csv"
+        )
 else:
     st.info("No session log found yet.")
 